@@ -2,7 +2,7 @@ import os
 import sys
 import traceback
 import json
-import asyncio
+import tempfile
 import concurrent
 import threading
 from typing import Optional
@@ -40,6 +40,7 @@ import cm_global
 import manager_core as core
 from manager_core import unified_manager
 import cnr_utils
+import install_pipeline
 
 comfyui_manager_path = os.path.abspath(os.path.dirname(__file__))
 
@@ -128,8 +129,8 @@ class Ctx:
         if channel is not None:
             self.channel = channel
 
-        asyncio.run(unified_manager.reload(cache_mode=self.mode, dont_wait=False))
-        asyncio.run(unified_manager.load_nightly(self.channel, self.mode))
+        manager_util.run_async(unified_manager.reload(cache_mode=self.mode, dont_wait=False))
+        manager_util.run_async(unified_manager.load_nightly(self.channel, self.mode))
 
     def set_no_deps(self, no_deps):
         self.no_deps = no_deps
@@ -184,29 +185,50 @@ class Ctx:
 cmd_ctx = Ctx()
 
 
-def install_node(node_spec_str, is_all=False, cnt_msg=''):
+def fetch_node(node_spec_str):
+    """
+    stage 1 of `install_node`: clone/download the node pack. The dependencies are installed by `postinstall` of the result.
+
+    :return: (node name, ManagedResult), or None if the node spec cannot be resolved
+    """
     if core.is_valid_url(node_spec_str):
         # install via urls
-        res = asyncio.run(core.gitclone_install(node_spec_str, no_deps=cmd_ctx.no_deps))
+        res = manager_util.run_async(core.gitclone_install(node_spec_str, no_deps=cmd_ctx.no_deps, return_postinstall=True))
+        return node_spec_str, res
+
+    node_spec = unified_manager.resolve_node_spec(node_spec_str)
+
+    if node_spec is None:
+        return None
+
+    node_name, version_spec, is_specified = node_spec
+
+    # NOTE: install node doesn't allow update if version is not specified
+    if not is_specified:
+        version_spec = None
+
+    res = manager_util.run_async(unified_manager.install_by_id(node_name, version_spec, cmd_ctx.channel, cmd_ctx.mode, instant_execution=True, no_deps=cmd_ctx.no_deps, return_postinstall=True))
+    return node_name, res
+
+
+def install_fetched_node(node_spec_str, fetched, cnt_msg=''):
+    """
+    stage 2 of `install_node`: install the dependencies and report the result
+    """
+    if fetched is None:
+        return
+
+    node_name, res = fetched
+    if res.result and not res.postinstall():
+        res.fail(f"Failed to execute install script: {node_name}")
+
+    if core.is_valid_url(node_spec_str):
         if not res.result:
             print(res.msg)
             print(f"[bold red]ERROR: An error occurred while installing '{node_spec_str}'.[/bold red]")
         else:
             print(f"{cnt_msg} [INSTALLED] {node_spec_str:50}")
     else:
-        node_spec = unified_manager.resolve_node_spec(node_spec_str)
-
-        if node_spec is None:
-            return
-
-        node_name, version_spec, is_specified = node_spec
-
-        # NOTE: install node doesn't allow update if version is not specified
-        if not is_specified:
-            version_spec = None
-
-        res = asyncio.run(unified_manager.install_by_id(node_name, version_spec, cmd_ctx.channel, cmd_ctx.mode, instant_execution=True, no_deps=cmd_ctx.no_deps))
-
         if res.action == 'skip':
             print(f"{cnt_msg} [   SKIP  ] {node_name:50} => Already installed")
         elif res.action == 'enable':
@@ -227,6 +249,51 @@ def install_node(node_spec_str, is_all=False, cnt_msg=''):
             print(f"[bold red]ERROR: An error occurred while installing '{node_name}'.\n{res.msg}[/bold red]")
 
 
+def install_node(node_spec_str, is_all=False, cnt_msg=''):
+    install_fetched_node(node_spec_str, fetch_node(node_spec_str), cnt_msg=cnt_msg)
+
+
+def install_nodes_pipelined(nodes, lookahead, prefetch_wheels=False):
+    """
+    Install node packs with `install_pipeline`: the next `lookahead` packs are cloned/downloaded
+    while the dependencies of the current pack are being installed.
+    """
+    _, nodes = get_target_nodes(nodes)
+    nodes = list(dict.fromkeys(nodes))  # the same pack must not be fetched concurrently
+    total = len(nodes)
+
+    def install(item, fetched, error):
+        i, x = item
+        if error is not None:
+            print(f"ERROR: {error}")
+            return
+
+        try:
+            install_fetched_node(x, fetched, cnt_msg=f'{i}/{total}')
+        except Exception as e:
+            print(f"ERROR: {e}")
+            traceback.print_exc()
+
+    def prefetch(item, fetched):
+        if fetched is not None and fetched[1].result and fetched[1].to_path is not None:
+            core.prefetch_requirements(fetched[1].to_path, manager_util.pip_wheelhouse)
+
+    use_wheelhouse = prefetch_wheels and not cmd_ctx.no_deps
+    if use_wheelhouse and manager_util.use_uv:
+        print("[ComfyUI-Manager] `--prefetch-wheels` is ignored: `pip download` isn't available with uv.")
+        use_wheelhouse = False
+
+    with tempfile.TemporaryDirectory(prefix='cm-wheelhouse-') as wheelhouse:
+        if use_wheelhouse:
+            manager_util.pip_wheelhouse = wheelhouse
+
+        try:
+            install_pipeline.run(list(enumerate(nodes, 1)), fetch=lambda item: fetch_node(item[1]), install=install,
+                                 prefetch=prefetch if use_wheelhouse else None, lookahead=lookahead)
+        finally:
+            manager_util.pip_wheelhouse = None
+
+
 def reinstall_node(node_spec_str, is_all=False, cnt_msg=''):
     node_spec = unified_manager.resolve_node_spec(node_spec_str)
 
@@ -409,7 +476,7 @@ def disable_node(node_spec_str: str, is_all=False, cnt_msg=''):
 
 
 def show_list(kind, simple=False):
-    custom_nodes = asyncio.run(unified_manager.get_custom_nodes(channel=cmd_ctx.channel, mode=cmd_ctx.mode))
+    custom_nodes = manager_util.run_async(unified_manager.get_custom_nodes(channel=cmd_ctx.channel, mode=cmd_ctx.mode))
 
     # collect not-installed unknown nodes
     not_installed_unknown_nodes = []
@@ -586,13 +653,18 @@ def get_all_installed_node_specs():
     return res
 
 
-def for_each_nodes(nodes, act, allow_all=True):
-    is_all = False
+def get_target_nodes(nodes, allow_all=True):
+    """
+    :return: (is_all, node specs)
+    """
     if allow_all and 'all' in nodes:
-        is_all = True
-        nodes = get_all_installed_node_specs()
+        return True, get_all_installed_node_specs()
     else:
-        nodes = [x for x in nodes if x.lower() not in ['comfy', 'comfyui', 'all']]
+        return False, [x for x in nodes if x.lower() not in ['comfy', 'comfyui', 'all']]
+
+
+def for_each_nodes(nodes, act, allow_all=True):
+    is_all, nodes = get_target_nodes(nodes, allow_all)
 
     total = len(nodes)
     i = 1
@@ -638,6 +710,18 @@ def install(
                 help="Skip installing any Python dependencies",
             ),
         ] = False,
+        lookahead: int = typer.Option(
+            3,
+            help="Number of node packs which are cloned/downloaded ahead while dependencies are installed (0: one by one)"
+        ),
+        prefetch_wheels: Annotated[
+            Optional[bool],
+            typer.Option(
+                "--prefetch-wheels",
+                show_default=False,
+                help="Download the pip packages of the fetched node packs into a temporary wheelhouse in parallel",
+            ),
+        ] = False,
         user_directory: str = typer.Option(
             None,
             help="user directory"
@@ -647,8 +731,12 @@ def install(
     cmd_ctx.set_channel_mode(channel, mode)
     cmd_ctx.set_no_deps(no_deps)
 
+    manager_util.refresh_pip_constraints(core.manager_files_path)
     pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, core.manager_files_path)
-    for_each_nodes(nodes, act=install_node)
+    if lookahead > 0:
+        install_nodes_pipelined(nodes, lookahead, prefetch_wheels)
+    else:
+        for_each_nodes(nodes, act=install_node)
     pip_fixer.fix_broken()
 
 
@@ -685,6 +773,7 @@ def reinstall(
     cmd_ctx.set_channel_mode(channel, mode)
     cmd_ctx.set_no_deps(no_deps)
 
+    manager_util.refresh_pip_constraints(core.manager_files_path)
     pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, core.manager_files_path)
     for_each_nodes(nodes, act=reinstall_node)
     pip_fixer.fix_broken()
@@ -737,8 +826,9 @@ def update(
     cmd_ctx.set_channel_mode(channel, mode)
 
     if 'all' in nodes:
-        asyncio.run(auto_save_snapshot())
+        manager_util.run_async(auto_save_snapshot())
 
+    manager_util.refresh_pip_constraints(core.manager_files_path)
     pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, core.manager_files_path)
 
     for x in nodes:
@@ -776,7 +866,7 @@ def disable(
     cmd_ctx.set_channel_mode(channel, mode)
 
     if 'all' in nodes:
-        asyncio.run(auto_save_snapshot())
+        manager_util.run_async(auto_save_snapshot())
 
     for_each_nodes(nodes, disable_node, allow_all=True)
 
@@ -807,7 +897,7 @@ def enable(
     cmd_ctx.set_channel_mode(channel, mode)
 
     if 'all' in nodes:
-        asyncio.run(auto_save_snapshot())
+        manager_util.run_async(auto_save_snapshot())
 
     for_each_nodes(nodes, enable_node, allow_all=True)
 
@@ -838,8 +928,9 @@ def fix(
     cmd_ctx.set_channel_mode(channel, mode)
 
     if 'all' in nodes:
-        asyncio.run(auto_save_snapshot())
+        manager_util.run_async(auto_save_snapshot())
 
+    manager_util.refresh_pip_constraints(core.manager_files_path)
     pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, core.manager_files_path)
     for_each_nodes(nodes, fix_node, allow_all=True)
     pip_fixer.fix_broken()
@@ -1007,7 +1098,7 @@ def deps_in_workflow(
         print(f"[bold red]File not found: {input_path}[/bold red]")
         exit(1)
 
-    used_exts, unknown_nodes = asyncio.run(core.extract_nodes_from_workflow(input_path, mode=cmd_ctx.mode, channel_url=cmd_ctx.channel))
+    used_exts, unknown_nodes = manager_util.run_async(core.extract_nodes_from_workflow(input_path, mode=cmd_ctx.mode, channel_url=cmd_ctx.channel))
 
     custom_nodes = {}
     for x in used_exts:
@@ -1058,7 +1149,7 @@ def save_snapshot(
             print(f"[bold red]ERROR: {output} path not exists.[/bold red]")
             raise typer.Exit(code=1)
         
-    path = asyncio.run(core.save_snapshot_with_postfix('snapshot', output, not full_snapshot))
+    path = manager_util.run_async(core.save_snapshot_with_postfix('snapshot', output, not full_snapshot))
     print(f"Current snapshot is saved as `{path}`")
 
 
@@ -1090,13 +1181,21 @@ def restore_snapshot(
         restore_to: Optional[str] = typer.Option(
             None,
             help="Manually specify the installation path for the custom node. Ignore user directory."
-        )
+        ),
+        pip_lock: Optional[str] = typer.Option(
+            None,
+            help="Install the pip packages from the lockfile (see `lock`) instead of the dependencies of each node pack."
+        ),
 ):
     cmd_ctx.set_user_directory(user_directory)
 
     if restore_to:
         cmd_ctx.update_custom_nodes_dir(restore_to)
 
+    if pip_lock is not None and not os.path.exists(pip_lock):
+        print(f"[bold red]ERROR: `{pip_lock}` is not exists.[/bold red]")
+        exit(1)
+
     extras = []
     if pip_non_url:
         extras.append('--pip-non-url')
@@ -1117,9 +1216,10 @@ def restore_snapshot(
             print(f"[bold red]ERROR: `{snapshot_path}` is not exists.[/bold red]")
             exit(1)
 
+    manager_util.refresh_pip_constraints(core.manager_files_path)
     pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, core.manager_files_path)
     try:
-        asyncio.run(core.restore_snapshot(snapshot_path, extras))
+        manager_util.run_async(core.restore_snapshot(snapshot_path, extras, pip_lock_path=os.path.abspath(pip_lock) if pip_lock else None))
     except Exception:
         print("[bold red]ERROR: Failed to restore snapshot.[/bold red]")
         traceback.print_exc()
@@ -1149,6 +1249,7 @@ def restore_dependencies(
     total = len(node_paths)
     i = 1
 
+    manager_util.refresh_pip_constraints(core.manager_files_path)
     pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, core.manager_files_path)
     for x in node_paths:
         print("----------------------------------------------------------------------------------------------------")
@@ -1168,6 +1269,7 @@ def post_install(
 ):
     path = os.path.expanduser(path)
 
+    manager_util.refresh_pip_constraints(core.manager_files_path)
     pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, core.manager_files_path)
     unified_manager.execute_install_script('', path, instant_execution=True)
     pip_fixer.fix_broken()
@@ -1199,7 +1301,7 @@ def install_deps(
 ):
     cmd_ctx.set_user_directory(user_directory)
     cmd_ctx.set_channel_mode(channel, mode)
-    asyncio.run(auto_save_snapshot())
+    manager_util.run_async(auto_save_snapshot())
 
     if not os.path.exists(deps):
         print(f"[bold red]File not found: {deps}[/bold red]")
@@ -1212,13 +1314,14 @@ def install_deps(
                 print(f"[bold red]Invalid json file: {deps}[/bold red]")
                 exit(1)
 
+            manager_util.refresh_pip_constraints(core.manager_files_path)
             pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, core.manager_files_path)
             for k in json_obj['custom_nodes'].keys():
                 state = core.simple_check_custom_node(k)
                 if state == 'installed':
                     continue
                 elif state == 'not-installed':
-                    asyncio.run(core.gitclone_install(k, instant_execution=True))
+                    manager_util.run_async(core.gitclone_install(k, instant_execution=True))
                 else:  # disabled
                     core.gitclone_set_active([k], False)
             pip_fixer.fix_broken()
@@ -1231,6 +1334,104 @@ def clear():
     cancel()
 
 
+@app.command("lock", help="Generate a resolved lockfile of the pip packages required by ComfyUI and the enabled custom nodes")
+def lock(
+        output: Optional[str] = typer.Option(
+            None,
+            help="Path of the lockfile. (default: requirements.lock in the ComfyUI-Manager user directory)"
+        ),
+        user_directory: str = typer.Option(
+            None,
+            help="user directory"
+        ),
+):
+    cmd_ctx.set_user_directory(user_directory)
+
+    if output is None:
+        output = os.path.join(core.manager_files_path, "requirements.lock")
+
+    manager_util.refresh_pip_constraints(core.manager_files_path)
+    if not manager_util.run_async(core.generate_pip_lock(os.path.abspath(output))):
+        print("[bold red]ERROR: Failed to generate the lockfile.[/bold red]")
+        raise typer.Exit(code=1)
+
+
+@app.command("sync-lock", help="Install exactly the pip packages of the lockfile without resolving dependencies")
+def sync_lock(
+        path: Optional[str] = typer.Argument(
+            None,
+            help="Path of the lockfile. (default: requirements.lock in the ComfyUI-Manager user directory)"
+        ),
+        user_directory: str = typer.Option(
+            None,
+            help="user directory"
+        ),
+):
+    import pip_lock
+
+    cmd_ctx.set_user_directory(user_directory)
+
+    if path is None:
+        path = os.path.join(core.manager_files_path, "requirements.lock")
+
+    if not os.path.exists(path):
+        print(f"[bold red]ERROR: `{path}` is not exists.[/bold red]")
+        exit(1)
+
+    if not pip_lock.sync_lock(path):
+        raise typer.Exit(code=1)
+
+
+@app.command("git-mirror", help="Manage the shared git mirrors (`git_mirror_path`)")
+def git_mirror_command(
+        action: str = typer.Argument(
+            help="[list|prune|prune-unused|dissociate]"
+        ),
+        user_directory: str = typer.Option(
+            None,
+            help="user directory"
+        ),
+):
+    import git_mirror
+
+    cmd_ctx.set_user_directory(user_directory)
+
+    root = core.get_git_mirror_path()
+    if root is None:
+        print("[bold red]`git_mirror_path` is not configured.[/bold red]")
+        exit(1)
+
+    engine = core.get_git_engine()
+
+    if action == 'list':
+        for x in git_mirror.list_mirrors(root):
+            print(f"{x}  (used by {len(git_mirror.get_users(x))} node packs)")
+
+    elif action in ['prune', 'prune-unused']:
+        removed = manager_util.run_async(git_mirror.prune(engine, root, unused_only=action == 'prune-unused'))
+        for x in removed:
+            print(f"REMOVED: {x}")
+        print(f"{len(removed)} mirrors are removed.")
+
+    elif action == 'dissociate':
+        # make the node packs of this installation independent of the mirrors
+        failed = False
+        for mirror_dir in git_mirror.list_mirrors(root):
+            for custom_nodes_dir in core.get_custom_nodes_paths():
+                custom_nodes_dir = os.path.abspath(custom_nodes_dir) + os.sep
+                for x in git_mirror.get_users(mirror_dir):
+                    if x.startswith(custom_nodes_dir):
+                        print(f"Dissociate '{x}'")
+                        if not manager_util.run_async(git_mirror.dissociate(engine, x)):
+                            failed = True
+        if failed:
+            exit(1)
+
+    else:
+        typer.echo(f"Invalid command: `git-mirror {action}`", err=True)
+        exit(1)
+
+
 @app.command("export-custom-node-ids", help="Export custom node ids")
 def export_custom_node_ids(
         path: str,
@@ -1257,7 +1458,7 @@ def export_custom_node_ids(
         for x in unified_manager.cnr_map.keys():
             print(x, file=output_file)
 
-        custom_nodes = asyncio.run(unified_manager.get_custom_nodes(channel=cmd_ctx.channel, mode=cmd_ctx.mode))
+        custom_nodes = manager_util.run_async(unified_manager.get_custom_nodes(channel=cmd_ctx.channel, mode=cmd_ctx.mode))
         for x in custom_nodes.values():
             if 'cnr_latest' not in x:
                 if len(x['files']) == 1:
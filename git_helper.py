@@ -1,3 +1,4 @@
+import asyncio
 import subprocess
 import sys
 import os
@@ -10,9 +11,18 @@ import requests
 from tqdm.auto import tqdm
 from git.remote import RemoteProgress
 
+sys.path.append(os.path.join(os.path.dirname(__file__), "glob"))
+import git_engine  # noqa: E402
+import git_mirror  # noqa: E402
+import manager_util  # noqa: E402
+import pip_lock  # noqa: E402
+
 
 comfy_path = os.environ.get('COMFYUI_PATH')
 git_exe_path = os.environ.get('GIT_EXE_PATH')
+clone_strategy = os.environ.get('CLONE_STRATEGY', 'full')
+git_mirror_path = os.environ.get('GIT_MIRROR_PATH')
+manager_util.use_uv = os.environ.get('USE_UV', 'False').lower() == 'true'
 
 if comfy_path is None:
     print("\nWARN: The `COMFYUI_PATH` environment variable is not set. Assuming `custom_nodes/ComfyUI-Manager/../../` as the ComfyUI path.", file=sys.stderr)
@@ -64,17 +74,66 @@ class GitProgress(RemoteProgress):
         self.pbar.refresh()
 
 
-def gitclone(custom_nodes_path, url, target_hash=None, repo_path=None):
+def get_clone_options():
+    """ clone options of `CLONE_STRATEGY` (full | shallow | partial) """
+    if clone_strategy == 'shallow':
+        return dict(depth=1, shallow_submodules=True)
+    elif clone_strategy == 'partial':
+        return dict(filter='blob:none')
+    return {}
+
+
+def ensure_commit_available(repo, commit_hash):
+    """ deepen a shallow clone on demand """
+    try:
+        repo.git.cat_file('-e', f'{commit_hash}^{{commit}}')
+        return
+    except git.GitCommandError:
+        pass
+
+    remote_name = get_remote_name(repo)
+    if remote_name is None:
+        return
+
+    is_shallow = os.path.exists(os.path.join(repo.git_dir, 'shallow'))
+    try:
+        if is_shallow:
+            repo.git.fetch('--depth=1', remote_name, commit_hash)
+        else:
+            repo.git.fetch(remote_name, commit_hash)
+    except git.GitCommandError:
+        if is_shallow:
+            repo.git.fetch('--unshallow', remote_name)
+        else:
+            repo.git.fetch(remote_name)
+
+
+def prepare_git_reference(url):
+    """ refresh the shared mirror of `url` if `GIT_MIRROR_PATH` is set (see glob/git_mirror.py) """
+    if not git_mirror_path:
+        return None
+
+    git_engine.engine.git_exe = git_exe_path or 'git'
+    return asyncio.run(git_mirror.ensure_mirror(git_engine.engine, git_mirror_path, url))
+
+
+def gitclone(custom_nodes_path, url, target_hash=None, repo_path=None, reference=None):
     repo_name = os.path.splitext(os.path.basename(url))[0]
 
     if repo_path is None:
         repo_path = os.path.join(custom_nodes_path, repo_name)
 
+    options = get_clone_options()
+    if reference is not None:
+        # borrow objects from the shared mirror
+        options['reference_if_able'] = reference
+
     # Clone the repository from the remote URL
-    repo = git.Repo.clone_from(url, repo_path, recursive=True, progress=GitProgress())
+    repo = git.Repo.clone_from(url, repo_path, recursive=True, progress=GitProgress(), **options)
 
     if target_hash is not None:
         print(f"CHECKOUT: {repo_name} [{target_hash}]")
+        ensure_commit_available(repo, target_hash)
         repo.git.checkout(target_hash)
             
     repo.git.clear_cache()
@@ -311,6 +370,7 @@ def checkout_custom_node_hash(git_custom_node_infos):
 
                     if commit_hash != item['hash']:
                         print(f"CHECKOUT: {repo_name} [{item['hash']}]")
+                        ensure_commit_available(repo, item['hash'])
                         repo.git.checkout(item['hash'])
 
             except Exception:
@@ -329,7 +389,11 @@ def checkout_custom_node_hash(git_custom_node_infos):
             path = os.path.join(working_directory, repo_name)
             if not os.path.exists(path):
                 print(f"CLONE: {path}")
-                gitclone(working_directory, k, target_hash=v['hash'])
+                reference = prepare_git_reference(k)
+                gitclone(working_directory, k, target_hash=v['hash'], reference=reference)
+
+                if reference is not None and git_mirror.uses_mirror(path, reference):
+                    asyncio.run(git_mirror.register_user(reference, path))
 
 
 def invalidate_custom_node_file(file_custom_node_infos):
@@ -425,7 +489,18 @@ def apply_snapshot(path):
         return None
 
 
-def restore_pip_snapshot(pips, options):
+def sync_pip_lock(lock_path):
+    """ install the lockfile of `cm-cli lock` in one pass, without resolving dependencies """
+    print(f"SYNC PIP LOCK: {lock_path}")
+    if not pip_lock.sync_lock(lock_path):
+        print(f"Installation failed for pip lockfile: {lock_path}")
+
+
+def restore_pip_snapshot(pips, options, lock_path=None):
+    if lock_path is not None:
+        sync_pip_lock(lock_path)
+        return
+
     non_url = []
     local_url = []
     non_local_url = []
@@ -495,10 +570,17 @@ setup_environment()
 try:
     if sys.argv[1] == "--clone":
         repo_path = None
-        if len(sys.argv) > 4:
-            repo_path = sys.argv[4]
+        reference = None
+        args = sys.argv[2:]
+        if '--reference' in args:
+            i = args.index('--reference')
+            reference = args[i+1]
+            del args[i:i+2]
 
-        gitclone(sys.argv[2], sys.argv[3], repo_path=repo_path)
+        if len(args) > 2:
+            repo_path = args[2]
+
+        gitclone(args[0], args[1], repo_path=repo_path, reference=reference)
     elif sys.argv[1] == "--check":
         gitcheck(sys.argv[2], False)
     elif sys.argv[1] == "--fetch":
@@ -511,9 +593,15 @@ try:
             if x in ['--pip-non-url', '--pip-local-url', '--pip-non-local-url']:
                 options.add(x)
 
+        lock_path = None
+        if '--pip-lock' in sys.argv:
+            lock_path = sys.argv[sys.argv.index('--pip-lock') + 1]
+
         pips = apply_snapshot(sys.argv[2])
 
-        if pips and len(options) > 0:
+        if lock_path is not None:
+            restore_pip_snapshot(pips, options, lock_path)
+        elif pips and len(options) > 0:
             restore_pip_snapshot(pips, options)
     sys.exit(0)
 except Exception as e:
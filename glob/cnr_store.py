@@ -0,0 +1,278 @@
+"""
+SQLite-backed local store of ComfyRegistry node information.
+
+The registry catalog is kept in `<cache_dir>/registry.db` and indexed by node id,
+normalized repository url and publisher, so lookups don't require loading the
+whole catalog into memory. Bulk readers (e.g. the node pack list) use `get_index`, which is
+loaded once per version of the store.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+
+import git_utils
+import manager_util
+
+
+SCHEMA_VERSION = 2
+
+
+def get_store_path():
+    return os.path.join(manager_util.cache_dir, 'registry.db')
+
+
+def get_source_id(cache_path):
+    try:
+        return json.dumps([cache_path, manager_util.ParsedJsonCache.file_identity(cache_path)])
+    except OSError:
+        return None
+
+
+def node_digest(data):
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class RegistryStore:
+    def __init__(self, db_path=None):
+        self.db_path = db_path  # None: resolved from `manager_util.cache_dir` on first use
+        self.lock = threading.RLock()
+        self.conn = None
+        self.version = 0    # incremented by every `sync` which changes the rows
+        self.index = None   # (version, id -> info, repository -> info) of `get_index`
+
+    def _connect(self):
+        if self.conn is not None:
+            return self.conn
+
+        db_path = self.db_path or get_store_path()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass  # e.g. network filesystem
+
+        ver = conn.execute("PRAGMA user_version").fetchone()[0]
+        if ver != SCHEMA_VERSION:
+            conn.executescript("""
+                DROP TABLE IF EXISTS nodes;
+                DROP TABLE IF EXISTS meta;
+            """)
+
+        conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS nodes (
+                id TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                repository TEXT,
+                publisher TEXT,
+                digest TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS nodes_repository ON nodes(repository, seq);
+            CREATE INDEX IF NOT EXISTS nodes_publisher ON nodes(publisher);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            PRAGMA user_version={SCHEMA_VERSION};
+        """)
+        conn.commit()
+
+        self.conn = conn
+        return conn
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            self.index = None
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def get_meta(self, key):
+        rows = self._query("SELECT value FROM meta WHERE key=?", (key,))
+        return rows[0][0] if rows else None
+
+    def is_synced_with(self, cache_path):
+        """
+        True if the store was last synchronized from `cache_path` and the file hasn't changed since.
+        """
+        source = get_source_id(cache_path)
+        return source is not None and self.get_meta('source') == source
+
+    def sync(self, nodes, cache_path=None):
+        """
+        Make the store match `nodes` (the full registry node list).
+        Only the rows whose content (or position in the list) changed are written.
+
+        :return: (upserted, deleted)
+        """
+        existing = {k: (seq, digest) for k, seq, digest in self._query("SELECT id, seq, digest FROM nodes")}
+
+        upserts = []
+        seen = set()
+        for seq, x in enumerate(nodes):
+            node_id = x['id']
+            seen.add(node_id)
+
+            data = json.dumps(x, separators=(',', ':'), sort_keys=True)
+            digest = node_digest(data)
+            if existing.get(node_id) == (seq, digest):
+                continue
+
+            repository = git_utils.normalize_url(x['repository']) if x.get('repository') else None
+            publisher = (x.get('publisher') or {}).get('id')
+            upserts.append((node_id, seq, repository, publisher, digest, data))
+
+        deletes = [(k,) for k in existing.keys() if k not in seen]
+
+        source = get_source_id(cache_path) if cache_path is not None else None
+
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO nodes(id, seq, repository, publisher, digest, data) VALUES (?, ?, ?, ?, ?, ?)", upserts)
+                conn.executemany("DELETE FROM nodes WHERE id=?", deletes)
+                conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('source', ?)", (source,))
+
+            if upserts or deletes:
+                self.version += 1
+
+        if upserts or deletes:
+            logging.debug(f"[ComfyUI-Manager] registry store: {len(upserts)} upserted, {len(deletes)} deleted")
+
+        return len(upserts), len(deletes)
+
+    def get(self, node_id):
+        rows = self._query("SELECT data FROM nodes WHERE id=?", (node_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def get_by_repo(self, normalized_url):
+        # the last one in the registry node list. (same as building a dict from the list)
+        rows = self._query("SELECT data FROM nodes WHERE repository=? ORDER BY seq DESC LIMIT 1", (normalized_url,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def get_by_publisher(self, publisher_id):
+        return [json.loads(x[0]) for x in self._query("SELECT data FROM nodes WHERE publisher=? ORDER BY id", (publisher_id,))]
+
+    def contains(self, node_id):
+        return bool(self._query("SELECT 1 FROM nodes WHERE id=?", (node_id,)))
+
+    def contains_repo(self, normalized_url):
+        return bool(self._query("SELECT 1 FROM nodes WHERE repository=?", (normalized_url,)))
+
+    def ids(self):
+        return [x[0] for x in self._query("SELECT id FROM nodes ORDER BY id")]
+
+    def repos(self):
+        return [x[0] for x in self._query("SELECT DISTINCT repository FROM nodes WHERE repository IS NOT NULL ORDER BY repository")]
+
+    def count(self):
+        return self._query("SELECT COUNT(*) FROM nodes")[0][0]
+
+    def count_repos(self):
+        return self._query("SELECT COUNT(DISTINCT repository) FROM nodes")[0][0]
+
+    def iter_nodes(self, key='id'):
+        """
+        yields (key, node info). rows are read at once, the JSON of a row is decoded when it is yielded.
+        for a duplicated key, the last node in the registry node list comes last.
+        """
+        rows = self._query(f"SELECT {key}, data FROM nodes WHERE {key} IS NOT NULL ORDER BY {key}, seq")
+        for k, data in rows:
+            yield k, json.loads(data)
+
+    def get_index(self):
+        """
+        Whole catalog in memory, for the callers which look up every node. (one query instead of a query per node)
+        The result is cached until the store is changed by `sync` of this or another process.
+
+        NOTE: the returned dicts are shared. don't modify them.
+
+        :return: (node_id -> info, normalized repository url -> info)
+        """
+        with self.lock:
+            conn = self._connect()
+            version = self.version, conn.execute("PRAGMA data_version").fetchone()[0]
+            if self.index is None or self.index[0] != version:
+                by_id = {}
+                by_repo = {}
+                for node_id, repository, data in conn.execute("SELECT id, repository, data FROM nodes ORDER BY seq"):
+                    info = json.loads(data)
+                    by_id[node_id] = info
+                    if repository is not None:
+                        by_repo[repository] = info
+                self.index = version, by_id, by_repo
+
+            return self.index[1], self.index[2]
+
+
+class NodeIdMap(Mapping):
+    """
+    read-only `node_id -> cnr info` view of RegistryStore
+    """
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, node_id):
+        res = self.store.get(node_id)
+        if res is None:
+            raise KeyError(node_id)
+        return res
+
+    def get(self, node_id, default=None):
+        res = self.store.get(node_id)
+        return default if res is None else res
+
+    def __contains__(self, node_id):
+        return self.store.contains(node_id)
+
+    def __iter__(self):
+        return iter(self.store.ids())
+
+    def __len__(self):
+        return self.store.count()
+
+    def items(self):
+        return self.store.iter_nodes('id')
+
+    def values(self):
+        return (v for _, v in self.store.iter_nodes('id'))
+
+
+class RepoMap(Mapping):
+    """
+    read-only `normalized repo url -> cnr info` view of RegistryStore
+    """
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, url):
+        res = self.store.get_by_repo(url)
+        if res is None:
+            raise KeyError(url)
+        return res
+
+    def get(self, url, default=None):
+        res = self.store.get_by_repo(url)
+        return default if res is None else res
+
+    def __contains__(self, url):
+        return self.store.contains_repo(url)
+
+    def __iter__(self):
+        return iter(self.store.repos())
+
+    def __len__(self):
+        return self.store.count_repos()
+
+    def items(self):
+        return self.store.iter_nodes('repository')
+
+    def values(self):
+        return (v for _, v in self.store.iter_nodes('repository'))
@@ -1,11 +1,17 @@
 import asyncio
 import json
+import logging
 import os
 import platform
+import random
+import threading
 import time
+import urllib.parse
+from datetime import datetime, timezone
 from dataclasses import dataclass
 from typing import List
 
+import aiohttp
 import manager_core
 import manager_util
 import requests
@@ -18,78 +24,251 @@ lock = asyncio.Lock()
 
 is_cache_loading = False
 
-async def get_cnr_data(cache_mode=True, dont_wait=True):
-    try:
-        return await _get_cnr_data(cache_mode, dont_wait)
-    except asyncio.TimeoutError:
-        print("A timeout occurred during the fetch process from ComfyRegistry.")
-        return await _get_cnr_data(cache_mode=True, dont_wait=True)  # timeout fallback
+# registry sync options
+page_size = 100              # nodes per page of `/nodes`
+max_concurrent_pages = 8     # pages fetched in parallel
+max_page_retries = 4         # retries per page on 429/5xx/network errors
+page_timeout = 30            # seconds per page request
+retry_backoff = 0.5          # base delay (seconds) of exponential backoff
 
-async def _get_cnr_data(cache_mode=True, dont_wait=True):
-    global is_cache_loading
+incremental_sync = True          # request only the nodes updated since the last sync
+full_sync_interval = 7 * 86400   # seconds between full syncs
+watermark_overlap = 600          # seconds
+removed_node_statuses = {'NodeStatusDeleted', 'NodeStatusBanned'}
+
+# version resolution options
+response_cache_ttl = 300         # seconds to keep `/install` and `/versions` responses
+max_concurrent_resolves = 16
+
+response_cache = {}              # url -> (expire time, json or None)
+response_cache_lock = threading.Lock()
 
-    uri = f'{base_url}/nodes'
 
-    async def fetch_all():
-        remained = True
-        page = 1
+class RetryablePageError(Exception):
+    def __init__(self, status, retry_after=None):
+        self.status = status
+        self.retry_after = retry_after
+        super().__init__(f"HTTP {status}")
 
-        full_nodes = {}
 
-        
-        # Determine form factor based on environment and platform
-        is_desktop = bool(os.environ.get('__COMFYUI_DESKTOP_VERSION__'))
-        system = platform.system().lower()
-        is_windows = system == 'windows'
-        is_mac = system == 'darwin'
-        is_linux = system == 'linux'
+def get_registry_query_params():
+    """
+    comfyui_version and form_factor sent along with the registry queries
+    """
+    # Determine form factor based on environment and platform
+    is_desktop = bool(os.environ.get('__COMFYUI_DESKTOP_VERSION__'))
+    system = platform.system().lower()
+    is_windows = system == 'windows'
+    is_mac = system == 'darwin'
+    is_linux = system == 'linux'
+
+    # Get ComfyUI version tag
+    if is_desktop:
+        # extract version from pyproject.toml instead of git tag
+        comfyui_ver = manager_core.get_current_comfyui_ver() or 'unknown'
+    else:
+        comfyui_ver = manager_core.get_comfyui_tag() or 'unknown'
 
-        # Get ComfyUI version tag
-        if is_desktop:
-            # extract version from pyproject.toml instead of git tag
-            comfyui_ver = manager_core.get_current_comfyui_ver() or 'unknown'
+    if is_desktop:
+        if is_windows:
+            form_factor = 'desktop-win'
+        elif is_mac:
+            form_factor = 'desktop-mac'
         else:
-            comfyui_ver = manager_core.get_comfyui_tag() or 'unknown'
+            form_factor = 'other'
+    else:
+        if is_windows:
+            form_factor = 'git-windows'
+        elif is_mac:
+            form_factor = 'git-mac'
+        elif is_linux:
+            form_factor = 'git-linux'
+        else:
+            form_factor = 'other'
 
-        if is_desktop:
-            if is_windows:
-                form_factor = 'desktop-win'
-            elif is_mac:
-                form_factor = 'desktop-mac'
-            else:
-                form_factor = 'other'
+    return comfyui_ver, form_factor
+
+
+async def fetch_nodes_page(page, comfyui_ver, form_factor, since=None):
+    """
+    Fetch a single page of `/nodes`, retrying with a non-blocking exponential backoff on 429/5xx and network errors.
+
+    :param since: ISO 8601 timestamp. only nodes created or updated after it are requested.
+    """
+    # Add comfyui_version and form_factor to the API request
+    sub_uri = f'{base_url}/nodes?page={page}&limit={page_size}&comfyui_version={comfyui_ver}&form_factor={form_factor}'
+    if since is not None:
+        sub_uri += f'&timestamp={urllib.parse.quote(since)}'
+    session = manager_util.get_session()
+
+    for attempt in range(max_page_retries + 1):
+        try:
+            async with session.get(sub_uri, timeout=aiohttp.ClientTimeout(total=page_timeout)) as resp:
+                if resp.status == 429 or resp.status >= 500:
+                    raise RetryablePageError(resp.status, resp.headers.get('Retry-After'))
+
+                resp.raise_for_status()
+                return await resp.json()
+
+        except (RetryablePageError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            if attempt == max_page_retries:
+                raise
+
+            delay = retry_backoff * (2 ** attempt)
+            if isinstance(e, RetryablePageError) and e.retry_after is not None:
+                try:
+                    delay = max(delay, float(e.retry_after))
+                except ValueError:
+                    pass
+
+            await asyncio.sleep(delay + random.uniform(0, retry_backoff))
+
+
+async def fetch_all_nodes(since=None):
+    """
+    Fetch the whole node list of ComfyRegistry (or the nodes updated after `since`).
+    The first page provides `totalPages`, and the remaining pages are fetched concurrently (up to `max_concurrent_pages`).
+    """
+    comfyui_ver, form_factor = get_registry_query_params()
+
+    first_page = await fetch_nodes_page(1, comfyui_ver, form_factor, since)
+    total_pages = first_page['totalPages']
+
+    semaphore = asyncio.Semaphore(max_concurrent_pages)
+    done_count = 1
+
+    async def fetch(page):
+        nonlocal done_count
+        async with semaphore:
+            res = await fetch_nodes_page(page, comfyui_ver, form_factor, since)
+
+        done_count += 1
+        if done_count % 5 == 0:
+            print(f"FETCH ComfyRegistry Data: {done_count}/{total_pages}")
+
+        return res
+
+    pages = [first_page] + await asyncio.gather(*[fetch(page) for page in range(2, total_pages + 1)])
+
+    # merge in page order
+    full_nodes = {}
+    for sub_json_obj in pages:
+        for x in sub_json_obj['nodes']:
+            full_nodes[x['id']] = x
+
+    print("FETCH ComfyRegistry Data [DONE]")
+
+    for v in full_nodes.values():
+        if 'latest_version' not in v:
+            v['latest_version'] = dict(version='nightly')
+
+    return {'nodes': list(full_nodes.values())}
+
+
+def get_sync_state_path(cache_path):
+    return cache_path + '.sync'
+
+
+def read_sync_state(cache_path):
+    """
+    watermark: start time of the last successful sync (ISO 8601, UTC)
+    full_sync: time of the last full sync (epoch seconds)
+    """
+    try:
+        with open(get_sync_state_path(cache_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def write_sync_state(cache_path, state):
+    with open(get_sync_state_path(cache_path), 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+async def sync_nodes(uri):
+    """
+    Synchronize the registry cache of `uri`.
+
+    If the cache has a watermark, only nodes updated after the watermark are requested and merged
+    into the cached node list. Deleted or banned nodes are removed from it.
+    A full sync is performed when there is no usable cache, or every `full_sync_interval` seconds
+    to catch removals that the incremental query cannot report.
+    """
+    cache_path = manager_util.get_cache_path(uri)
+    state = read_sync_state(cache_path)
+
+    now = time.time()
+    # overlap the window a bit to tolerate clock skew against the registry server
+    watermark = datetime.fromtimestamp(now - watermark_overlap, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    cached_nodes = None
+    if incremental_sync and 'watermark' in state and now - state.get('full_sync', 0) < full_sync_interval:
+        try:
+            cached_nodes = manager_util.read_json_file(cache_path)['nodes']
+        except Exception:
+            cached_nodes = None
+
+    if cached_nodes is None:
+        json_obj = await fetch_all_nodes()
+        manager_util.save_to_cache(uri, json_obj, compact=True)
+        write_sync_state(cache_path, {'watermark': watermark, 'full_sync': now})
+        return json_obj
+
+    updated = (await fetch_all_nodes(since=state['watermark']))['nodes']
+
+    nodes = {x['id']: x for x in cached_nodes}
+    for x in updated:
+        if x.get('status') in removed_node_statuses:
+            nodes.pop(x['id'], None)
         else:
-            if is_windows:
-                form_factor = 'git-windows'
-            elif is_mac:
-                form_factor = 'git-mac'
-            elif is_linux:
-                form_factor = 'git-linux'
-            else:
-                form_factor = 'other'
-        
-        while remained:
-            # Add comfyui_version and form_factor to the API request
-            sub_uri = f'{base_url}/nodes?page={page}&limit=30&comfyui_version={comfyui_ver}&form_factor={form_factor}'
-            sub_json_obj = await asyncio.wait_for(manager_util.get_data_with_cache(sub_uri, cache_mode=False, silent=True, dont_cache=True), timeout=30)
-            remained = page < sub_json_obj['totalPages']
+            nodes[x['id']] = x
+
+    json_obj = {'nodes': list(nodes.values())}
+
+    if updated:
+        manager_util.save_to_cache(uri, json_obj, compact=True)
+    else:
+        # nothing changed: just refresh the TTL of the cache
+        with manager_util.cache_lock:
+            os.utime(cache_path)
+
+    print(f"[ComfyUI-Manager] ComfyRegistry incremental sync: {len(updated)} node(s) updated")
+
+    state.update(watermark=watermark)
+    write_sync_state(cache_path, state)
+    return json_obj
+
+
+async def get_cnr_data(cache_mode=True, dont_wait=True):
+    try:
+        return await _get_cnr_data(cache_mode, dont_wait)
+    except asyncio.TimeoutError:
+        print("A timeout occurred during the fetch process from ComfyRegistry.")
+        return await _get_cnr_data(cache_mode=True, dont_wait=True)  # timeout fallback
 
-            for x in sub_json_obj['nodes']:
-                full_nodes[x['id']] = x
+async def update_registry_store(store, cache_mode=True, dont_wait=True):
+    """
+    Bring `store` (cnr_store.RegistryStore) up to date with ComfyRegistry.
+    If no fetch is needed and the store is already synchronized with the registry cache file,
+    the cache file isn't even parsed.
+    """
+    uri = f'{base_url}/nodes'
+    cache_path = manager_util.get_cache_path(uri)
 
-            if page % 5 == 0:
-                print(f"FETCH ComfyRegistry Data: {page}/{sub_json_obj['totalPages']}")
+    no_fetch = cache_mode and (dont_wait or manager_util.get_cache_state(uri) == 'cached')
+    if no_fetch and store.is_synced_with(cache_path):
+        return
 
-            page += 1
-            time.sleep(0.5)
+    nodes = await get_cnr_data(cache_mode=cache_mode, dont_wait=dont_wait)
+    if nodes:
+        await asyncio.to_thread(store.sync, nodes, cache_path)
 
-        print("FETCH ComfyRegistry Data [DONE]")
 
-        for v in full_nodes.values():
-            if 'latest_version' not in v:
-                v['latest_version'] = dict(version='nightly')
+async def _get_cnr_data(cache_mode=True, dont_wait=True):
+    global is_cache_loading
 
-        return {'nodes': list(full_nodes.values())}
+    uri = f'{base_url}/nodes'
 
     if cache_mode:
         is_cache_loading = True
@@ -100,16 +279,13 @@ async def _get_cnr_data(cache_mode=True, dont_wait=True):
                 return {}
             else:
                 print("[ComfyUI-Manager] The ComfyRegistry cache update is still in progress, so an outdated cache is being used.")
-                with open(manager_util.get_cache_path(uri), 'r', encoding="UTF-8", errors="ignore") as json_file:
-                    return json.load(json_file)['nodes']
+                return manager_util.read_json_file(manager_util.get_cache_path(uri))['nodes']
 
         if cache_state == 'cached':
-            with open(manager_util.get_cache_path(uri), 'r', encoding="UTF-8", errors="ignore") as json_file:
-                return json.load(json_file)['nodes']
+            return manager_util.read_json_file(manager_util.get_cache_path(uri))['nodes']
 
     try:
-        json_obj = await fetch_all()
-        manager_util.save_to_cache(uri, json_obj)
+        json_obj = await sync_nodes(uri)
         return json_obj['nodes']
     except:
         res = {}
@@ -163,6 +339,67 @@ def map_node_version(api_node_version):
     )
 
 
+def get_install_url(node_id, version=None):
+    if version is None:
+        return f"{base_url}/nodes/{node_id}/install"
+    else:
+        return f"{base_url}/nodes/{node_id}/install?version={version}"
+
+
+def get_versions_url(node_id):
+    return f"{base_url}/nodes/{node_id}/versions?statuses=NodeVersionStatusActive&statuses=NodeVersionStatusPending"
+
+
+def get_cached_response(url):
+    with response_cache_lock:
+        item = response_cache.get(url)
+        if item is not None and item[0] > time.time():
+            return True, item[1]
+    return False, None
+
+
+def put_cached_response(url, status, json_obj):
+    # only definitive answers are cached. (e.g. 5xx or network errors are not)
+    if status == 200 or status == 404:
+        value = json_obj if status == 200 else None
+        with response_cache_lock:
+            response_cache[url] = time.time() + response_cache_ttl, value
+
+
+def clear_response_cache():
+    with response_cache_lock:
+        response_cache.clear()
+
+
+def get_registry_json(url):
+    """
+    blocking GET of registry api with TTL cache. returns None if not available.
+    """
+    hit, value = get_cached_response(url)
+    if hit:
+        return value
+
+    response = requests.get(url, timeout=page_timeout)
+    json_obj = response.json() if response.status_code == 200 else None
+    put_cached_response(url, response.status_code, json_obj)
+    return json_obj
+
+
+async def get_registry_json_async(url):
+    """
+    non-blocking version of `get_registry_json`. shares the same TTL cache.
+    """
+    hit, value = get_cached_response(url)
+    if hit:
+        return value
+
+    session = manager_util.get_session()
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=page_timeout)) as response:
+        json_obj = await response.json() if response.status == 200 else None
+        put_cached_response(url, response.status, json_obj)
+        return json_obj
+
+
 def install_node(node_id, version=None):
     """
     Retrieves the node version for installation.
@@ -174,27 +411,51 @@ def install_node(node_id, version=None):
     Returns:
       NodeVersion: Node version data or error message.
     """
-    if version is None:
-        url = f"{base_url}/nodes/{node_id}/install"
+    json_obj = get_registry_json(get_install_url(node_id, version))
+    if json_obj is not None:
+        # Convert the API response to a NodeVersion object
+        return map_node_version(json_obj)
     else:
-        url = f"{base_url}/nodes/{node_id}/install?version={version}"
+        return None
 
-    response = requests.get(url)
-    if response.status_code == 200:
-        # Convert the API response to a NodeVersion object
-        return map_node_version(response.json())
+
+async def install_node_async(node_id, version=None):
+    json_obj = await get_registry_json_async(get_install_url(node_id, version))
+    if json_obj is not None:
+        return map_node_version(json_obj)
     else:
         return None
 
 
 def all_versions_of_node(node_id):
-    url = f"{base_url}/nodes/{node_id}/versions?statuses=NodeVersionStatusActive&statuses=NodeVersionStatusPending"
+    return get_registry_json(get_versions_url(node_id))
 
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return None
+
+async def all_versions_of_node_async(node_id):
+    return await get_registry_json_async(get_versions_url(node_id))
+
+
+async def resolve_node_versions(specs):
+    """
+    Resolve many `(node_id, version_spec)` pairs concurrently (up to `max_concurrent_resolves`).
+    The results are kept in the response cache, so the following `install_node` calls don't hit the network.
+
+    Returns:
+      dict: (node_id, version_spec) -> NodeVersion or None
+    """
+    sem = asyncio.Semaphore(max_concurrent_resolves)
+    specs = list(dict.fromkeys(specs))
+
+    async def resolve(node_id, version_spec):
+        async with sem:
+            try:
+                return await install_node_async(node_id, version_spec)
+            except Exception as e:
+                logging.warning(f"[ComfyUI-Manager] Failed to resolve '{node_id}@{version_spec}': {e}")
+                return None
+
+    results = await asyncio.gather(*[resolve(node_id, version_spec) for node_id, version_spec in specs])
+    return dict(zip(specs, results))
 
 
 def read_cnr_info(fullpath):
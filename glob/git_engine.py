@@ -0,0 +1,251 @@
+"""
+asyncio based git engine.
+
+git commands run via `asyncio.create_subprocess_exec`, with a global concurrency limit,
+per-host limits, per-operation timeouts and cancellation (the subprocess is killed).
+Limits are kept per event loop, because manager uses multiple loops (server, task worker, cm-cli).
+"""
+
+import asyncio
+import os
+import re
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+
+max_concurrency = 8      # git subprocesses at once
+max_per_host = 4         # network operations per remote host at once
+
+timeouts = {             # seconds per operation
+    'clone': 900,
+    'fetch': 180,
+    'pull': 300,
+    'ls-remote': 30,
+    'submodule': 600,
+    'repack': 1800,
+}
+default_timeout = 60
+
+progress_pattern = re.compile(r'([A-Za-z][A-Za-z ]+):\s+(\d+)% \((\d+)/(\d+)\)')
+
+
+@dataclass
+class GitResult:
+    args: List[str]
+    returncode: Optional[int]
+    stdout: str = ''
+    stderr: str = ''
+    elapsed: float = 0.0
+    timed_out: bool = False
+    cancelled: bool = False
+    progress: dict = field(default_factory=dict)   # stage -> (cur, total)
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+    def error_message(self):
+        if self.timed_out:
+            return f"timeout: git {' '.join(self.args)}"
+        if self.cancelled:
+            return f"cancelled: git {' '.join(self.args)}"
+        return self.stderr.strip().split('\n')[-1] if self.stderr.strip() else f"exit code {self.returncode}"
+
+
+def get_host(url):
+    """ host of http(s)/ssh/scp-like git urls. (None for local paths) """
+    if url is None:
+        return None
+
+    parsed = urlparse(url)
+    if parsed.hostname:
+        return parsed.hostname
+
+    m = re.match(r'^(?:[^@/]+@)?([^:/]+):', url)
+    if m and not os.path.exists(url):
+        return m.group(1)
+
+    return None
+
+
+def get_clone_options(strategy):
+    """ git clone options of the clone strategy (full | shallow | partial) """
+    if strategy == 'shallow':
+        return ['--depth', '1', '--shallow-submodules']
+    elif strategy == 'partial':
+        return ['--filter=blob:none']
+    return []
+
+
+class GitEngine:
+    def __init__(self, git_exe='git'):
+        self.git_exe = git_exe
+        self._lock = threading.Lock()
+        self._limits = {}   # loop -> (global semaphore, {host: semaphore})
+
+    def _get_limits(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for x in [x for x in self._limits if x.is_closed()]:
+                del self._limits[x]
+
+            limits = self._limits.get(loop)
+            if limits is None:
+                limits = asyncio.Semaphore(max_concurrency), {}
+                self._limits[loop] = limits
+
+            return limits
+
+    def _get_host_semaphore(self, host):
+        _, hosts = self._get_limits()
+        sem = hosts.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(max_per_host)
+            hosts[host] = sem
+        return sem
+
+    async def run(self, args, cwd=None, op=None, host=None, timeout=None, progress: Callable = None):
+        """
+        Run `git <args>`.
+
+        :param op: operation name which selects the timeout (see `timeouts`)
+        :param host: remote host to apply the per-host limit
+        :param progress: callback(stage, cur, total) for progress lines of `--progress`
+        :return: GitResult
+        """
+        if timeout is None:
+            timeout = timeouts.get(op, default_timeout)
+
+        global_sem, _ = self._get_limits()
+        host_sem = self._get_host_semaphore(host) if host else None
+
+        # the host limit is acquired first, so that waiting for a busy host doesn't occupy a global slot
+        if host_sem is not None:
+            async with host_sem, global_sem:
+                return await self._exec(args, cwd, timeout, progress)
+        else:
+            async with global_sem:
+                return await self._exec(args, cwd, timeout, progress)
+
+    async def _exec(self, args, cwd, timeout, progress):
+        env = os.environ.copy()
+        env['GIT_TERMINAL_PROMPT'] = '0'  # never wait for credentials
+
+        result = GitResult(args=list(args), returncode=None)
+        started = time.perf_counter()
+
+        # own process group: git spawns helpers (ssh, remote-https) which must be killed together
+        process = await asyncio.create_subprocess_exec(self.git_exe, *args, cwd=cwd, env=env,
+                                                       stdin=asyncio.subprocess.DEVNULL,
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE,
+                                                       start_new_session=os.name != 'nt')
+
+        async def read_stdout():
+            return (await process.stdout.read()).decode('utf-8', errors='replace')
+
+        async def read_stderr():
+            # progress lines are separated by '\r'
+            chunks = []
+            buf = b''
+            while True:
+                data = await process.stderr.read(4096)
+                if not data:
+                    break
+                chunks.append(data)
+                buf += data
+                *lines, buf = re.split(rb'[\r\n]', buf)
+                for line in lines:
+                    m = progress_pattern.search(line.decode('utf-8', errors='replace'))
+                    if m:
+                        stage, cur, total = m.group(1).strip(), int(m.group(3)), int(m.group(4))
+                        result.progress[stage] = cur, total
+                        if progress is not None:
+                            progress(stage, cur, total)
+            return b''.join(chunks).decode('utf-8', errors='replace')
+
+        io = asyncio.gather(read_stdout(), read_stderr(), process.wait())
+        io.add_done_callback(lambda f: f.cancelled() or f.exception())  # don't warn about the unretrieved exception
+
+        try:
+            result.stdout, result.stderr, _ = await asyncio.wait_for(io, timeout)
+            result.returncode = process.returncode
+        except asyncio.TimeoutError:
+            result.timed_out = True
+            await self._kill(process)
+        except asyncio.CancelledError:
+            result.cancelled = True
+            await self._kill(process)
+            raise
+        finally:
+            result.elapsed = time.perf_counter() - started
+
+        return result
+
+    @staticmethod
+    async def _kill(process):
+        try:
+            if os.name != 'nt':
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+        try:
+            await asyncio.wait_for(process.wait(), 5)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+
+    # --- operations ---
+
+    async def clone(self, url, path, recursive=True, strategy='full', reference=None, progress=None):
+        """
+        :param strategy: full | shallow (--depth 1) | partial (--filter=blob:none)
+        :param reference: local repository to borrow objects from (see git_mirror)
+        """
+        args = ['clone', '--progress'] + get_clone_options(strategy)
+        if reference is not None:
+            args += ['--reference-if-able', reference]
+        if recursive:
+            args.append('--recursive')
+        args += ['--', url, path]
+        return await self.run(args, op='clone', host=get_host(url), progress=progress)
+
+    async def fetch(self, path, remote, url=None, progress=None):
+        return await self.run(['fetch', '--progress', remote], cwd=path, op='fetch', host=get_host(url), progress=progress)
+
+    async def pull(self, path, remote, branch, url=None, progress=None):
+        return await self.run(['pull', '--progress', remote, branch], cwd=path, op='pull', host=get_host(url), progress=progress)
+
+    async def submodule_update(self, path):
+        return await self.run(['submodule', 'update', '--init', '--recursive'], cwd=path, op='submodule')
+
+    async def stash(self, path):
+        return await self.run(['stash'], cwd=path)
+
+    async def is_dirty(self, path):
+        res = await self.run(['status', '--porcelain', '--untracked-files=no'], cwd=path)
+        return res.ok and res.stdout.strip() != ''
+
+    async def ls_remote_head(self, url, branch):
+        """
+        :return: commit hash of the remote branch, '' if there is no such branch, None on failure
+        """
+        res = await self.run(['ls-remote', url, f'refs/heads/{branch}'], op='ls-remote', host=get_host(url))
+        if not res.ok:
+            return None
+
+        for line in res.stdout.splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[1] == f'refs/heads/{branch}':
+                return parts[0]
+
+        return ''
+
+
+engine = GitEngine()
@@ -0,0 +1,277 @@
+"""
+Host-wide shared git object store for node packs.
+
+Each remote is kept as a bare mirror in `<git_mirror_path>/<name>-<hash>.git`.
+Node packs are cloned with `--reference-if-able <mirror>`, so all ComfyUI installations of the host
+borrow their objects from one mirror (`.git/objects/info/alternates`) instead of downloading them again.
+
+Mirrors are shared between processes: a lock file serializes clone/fetch of a mirror and
+a mirror is fetched at most once per `fetch_interval`.
+Before a mirror is removed, the repositories borrowing from it must be dissociated (see `prune`).
+gc is disabled in the mirrors: objects which become unreachable after a force-push or a branch deletion
+may still be borrowed by the repositories.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+
+import git_engine
+import git_utils
+
+if os.name == 'nt':
+    import msvcrt
+    fcntl = None
+else:
+    import fcntl
+    msvcrt = None
+
+
+fetch_interval = 300      # seconds
+lock_timeout = 1800       # seconds to wait for a mirror which is being cloned/fetched by another process
+
+USERS_FILE = 'manager-users'
+FETCHED_FILE = 'manager-fetched'
+LOCK_FILE = 'manager.lock'
+
+
+def get_mirror_dir(root, url):
+    normalized = git_utils.normalize_url(url.rstrip('/'))
+    if normalized.endswith('.git'):
+        normalized = normalized[:-4]
+
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', os.path.basename(normalized)) or 'repo'
+    digest = hashlib.sha1(normalized.lower().encode('utf-8')).hexdigest()[:12]
+    return os.path.join(root, f"{name}-{digest}.git")
+
+
+def list_mirrors(root):
+    if not os.path.isdir(root):
+        return []
+
+    return sorted(os.path.join(root, x) for x in os.listdir(root)
+                  if x.endswith('.git') and os.path.isdir(os.path.join(root, x)))
+
+
+class MirrorLock:
+    """
+    inter-process lock of a mirror
+    """
+    def __init__(self, mirror_dir):
+        self.path = mirror_dir.rstrip('/\\') + '.' + LOCK_FILE
+        self.fd = None
+
+    def _try_lock(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+
+    async def __aenter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+
+        deadline = time.monotonic() + lock_timeout
+        while not self._try_lock():
+            if time.monotonic() > deadline:
+                os.close(self.fd)
+                self.fd = None
+                raise TimeoutError(f"mirror is locked: {self.path}")
+            await asyncio.sleep(0.5)
+
+        return self
+
+    async def __aexit__(self, *args):
+        self._unlock()
+        os.close(self.fd)
+        self.fd = None
+
+
+def is_fresh(mirror_dir):
+    try:
+        return time.time() - os.path.getmtime(os.path.join(mirror_dir, FETCHED_FILE)) < fetch_interval
+    except OSError:
+        return False
+
+
+def mark_fetched(mirror_dir):
+    with open(os.path.join(mirror_dir, FETCHED_FILE), 'w'):
+        pass
+
+
+async def disable_gc(engine, mirror_dir):
+    """
+    the borrowing repositories can't be protected from pruning, so unreachable objects are never removed from a mirror
+    """
+    for key, value in [('gc.auto', '0'), ('gc.pruneExpire', 'never')]:
+        res = await engine.run(['config', key, value], cwd=mirror_dir, op='config')
+        if not res.ok:
+            raise Exception(f"git config {key} failed: {res.error_message()}")
+
+
+async def ensure_mirror(engine, root, url):
+    """
+    Create or refresh the mirror of `url`.
+
+    :return: mirror dir, or None if the mirror isn't usable (the caller should clone without reference)
+    """
+    mirror_dir = get_mirror_dir(root, url)
+
+    try:
+        async with MirrorLock(mirror_dir):
+            if os.path.exists(os.path.join(mirror_dir, 'HEAD')):
+                if is_fresh(mirror_dir):
+                    return mirror_dir  # another install already fetched it
+
+                await disable_gc(engine, mirror_dir)  # mirrors created before gc was disabled
+                res = await engine.run(['fetch', '--prune', 'origin'], cwd=mirror_dir, op='fetch', host=git_engine.get_host(url))
+                if not res.ok:
+                    # a stale mirror is still a valid reference: missing objects are downloaded by the clone
+                    logging.warning(f"[ComfyUI-Manager] Failed to fetch git mirror '{mirror_dir}': {res.error_message()}")
+                    return mirror_dir
+            else:
+                if os.path.exists(mirror_dir):
+                    shutil.rmtree(mirror_dir, ignore_errors=True)  # leftover of an interrupted clone
+
+                res = await engine.run(['clone', '--mirror', '--', url, mirror_dir], op='clone', host=git_engine.get_host(url))
+                if not res.ok:
+                    logging.warning(f"[ComfyUI-Manager] Failed to create git mirror of '{url}': {res.error_message()}")
+                    shutil.rmtree(mirror_dir, ignore_errors=True)
+                    return None
+
+                await disable_gc(engine, mirror_dir)
+
+            mark_fetched(mirror_dir)
+            return mirror_dir
+    except Exception as e:
+        logging.warning(f"[ComfyUI-Manager] git mirror is not available for '{url}': {e}")
+        return None
+
+
+def get_alternates(repo_path):
+    """
+    object directories borrowed by the repository at `repo_path`
+    """
+    git_dir = git_utils.get_git_dir(repo_path)
+    if git_dir is None:
+        return []
+
+    path = os.path.join(git_utils.get_common_dir(git_dir), 'objects', 'info', 'alternates')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [os.path.normpath(x.strip()) for x in f.read().splitlines() if x.strip() and not x.startswith('#')]
+    except OSError:
+        return []
+
+
+def uses_mirror(repo_path, mirror_dir):
+    objects_dir = os.path.normpath(os.path.join(os.path.abspath(mirror_dir), 'objects'))
+    return objects_dir in get_alternates(repo_path)
+
+
+async def register_user(mirror_dir, repo_path):
+    """
+    Record `repo_path` as a borrower of the mirror. (used by `prune` to find the repositories to dissociate)
+    """
+    repo_path = os.path.abspath(repo_path)
+
+    async with MirrorLock(mirror_dir):
+        if not os.path.isdir(mirror_dir) or repo_path in read_users(mirror_dir):
+            return
+
+        with open(os.path.join(mirror_dir, USERS_FILE), 'a', encoding='utf-8') as f:
+            f.write(repo_path + '\n')
+
+
+def read_users(mirror_dir):
+    try:
+        with open(os.path.join(mirror_dir, USERS_FILE), 'r', encoding='utf-8') as f:
+            return [x.strip() for x in f.read().splitlines() if x.strip()]
+    except OSError:
+        return []
+
+
+def get_users(mirror_dir):
+    """
+    registered repositories which still borrow objects from the mirror
+    """
+    return [x for x in read_users(mirror_dir) if os.path.isdir(x) and uses_mirror(x, mirror_dir)]
+
+
+async def dissociate(engine, repo_path):
+    """
+    Copy the borrowed objects into the repository and remove its alternates. (same as `git clone --dissociate`)
+
+    :return: True on success
+    """
+    git_dir = git_utils.get_git_dir(repo_path)
+    if git_dir is None:
+        return False
+
+    alternates = os.path.join(git_utils.get_common_dir(git_dir), 'objects', 'info', 'alternates')
+    if not os.path.exists(alternates):
+        return True
+
+    res = await engine.run(['repack', '-a', '-d', '-q'], cwd=repo_path, op='repack')
+    if not res.ok:
+        logging.error(f"[ComfyUI-Manager] Failed to dissociate '{repo_path}': {res.error_message()}")
+        return False
+
+    os.remove(alternates)
+    return True
+
+
+async def prune(engine, root, unused_only=False):
+    """
+    Remove mirrors. The repositories which borrow objects from a mirror are dissociated first,
+    and a mirror is kept if any of them cannot be dissociated.
+
+    NOTE: only the borrowers registered by ComfyUI-Manager are known.
+          Don't prune a mirror which is referenced by repositories created by hand.
+
+    :param unused_only: remove only the mirrors without borrowers
+    :return: list of the removed mirrors
+    """
+    removed = []
+    for mirror_dir in list_mirrors(root):
+        async with MirrorLock(mirror_dir):
+            users = get_users(mirror_dir)
+            if unused_only and users:
+                continue
+
+            failed = False
+            for x in users:
+                print(f"Dissociate '{x}' from '{mirror_dir}'")
+                if not await dissociate(engine, x):
+                    failed = True
+
+            if failed:
+                logging.error(f"[ComfyUI-Manager] Keep the mirror '{mirror_dir}' because some repositories still borrow objects from it.")
+                continue
+
+            shutil.rmtree(mirror_dir)
+            removed.append(mirror_dir)
+
+        try:
+            os.remove(MirrorLock(mirror_dir).path)
+        except OSError:
+            pass
+
+    return removed
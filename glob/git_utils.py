@@ -1,5 +1,7 @@
 import os
 import configparser
+from dataclasses import dataclass
+from typing import Optional
 
 
 GITHUB_ENDPOINT = os.getenv('GITHUB_ENDPOINT')
@@ -12,21 +14,202 @@ def is_git_repo(path: str) -> bool:
     return os.path.exists(os.path.join(path, '.git'))
 
 
+# ----------------------------------------------------------------------------
+# Read-only access to git metadata without GitPython or git subprocesses.
+# Use GitPython only for the mutations (fetch, pull, checkout, ...).
+
+_memo = {}  # (kind, path) -> (stat identity, parsed result)
+
+
+def _read_memoized(kind, path, parser):
+    """ Parse the file at `path` with `parser`, memoized by mtime and size. """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    identity = st.st_mtime_ns, st.st_size
+    item = _memo.get((kind, path))
+    if item is not None and item[0] == identity:
+        return item[1]
+
+    res = parser(path)
+    _memo[(kind, path)] = identity, res
+    return res
+
+
+def _read_first_line(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def get_git_dir(path):
+    """ Resolve `.git` of the working tree, following `gitdir:` indirection of worktrees and submodules. """
+    dot_git = os.path.join(path, '.git')
+
+    if os.path.isdir(dot_git):
+        return dot_git
+
+    if os.path.isfile(dot_git):
+        line = _read_first_line(dot_git)
+        if line and line.startswith('gitdir:'):
+            git_dir = line[7:].strip()
+            return os.path.normpath(os.path.join(path, git_dir))
+
+    return None
+
+
+def get_common_dir(git_dir):
+    """ `refs`, `packed-refs` and `config` of a linked worktree are in the common dir. """
+    line = _read_first_line(os.path.join(git_dir, 'commondir'))
+    if line:
+        return os.path.normpath(os.path.join(git_dir, line))
+
+    return git_dir
+
+
+def _parse_packed_refs(path):
+    res = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in '#^':
+                continue
+
+            parts = line.split(' ', 1)
+            if len(parts) == 2:
+                res[parts[1]] = parts[0]
+
+    return res
+
+
+def _parse_config(path):
+    # Set `strict=False` to allow duplicate `vscode-merge-base` sections, addressing <https://github.com/ltdrdata/ComfyUI-Manager/issues/1529>
+    config = configparser.ConfigParser(strict=False)
+    config.read(path)
+
+    remotes = {}
+    branches = {}
+    for k, v in config.items():
+        if k.startswith('remote '):
+            name = k[7:].strip().strip('"')
+            remotes[name] = v.get('url')
+        elif k.startswith('branch '):
+            name = k[7:].strip().strip('"')
+            branches[name] = dict(remote=v.get('remote'), merge=v.get('merge'))
+
+    return dict(remotes=remotes, branches=branches)
+
+
+def read_git_config(git_dir):
+    """ :return: {'remotes': {name: url}, 'branches': {name: {'remote', 'merge'}}} """
+    path = os.path.join(get_common_dir(git_dir), 'config')
+    return _read_memoized('config', path, _parse_config)
+
+
+def resolve_ref(git_dir, ref, depth=0):
+    """ Resolve `ref` (e.g. 'HEAD', 'refs/heads/main') into a commit hash. loose refs and `packed-refs` are supported. """
+    if depth > 5:
+        return None
+
+    common_dir = get_common_dir(git_dir)
+
+    for base in (git_dir, common_dir):
+        line = _read_first_line(os.path.join(base, ref))
+        if line:
+            if line.startswith('ref: '):
+                return resolve_ref(git_dir, line[5:].strip(), depth + 1)
+            return line
+
+    packed = _read_memoized('packed-refs', os.path.join(common_dir, 'packed-refs'), _parse_packed_refs)
+    if packed is not None:
+        return packed.get(ref)
+
+    return None
+
+
+def read_head(git_dir):
+    """ :return: (branch name or None if detached, commit hash or None) """
+    line = _read_first_line(os.path.join(git_dir, 'HEAD'))
+    if not line:
+        return None, None
+
+    if line.startswith('ref: '):
+        ref = line[5:].strip()
+        branch = ref[11:] if ref.startswith('refs/heads/') else ref
+        return branch, resolve_ref(git_dir, ref)
+
+    return None, line
+
+
+@dataclass(frozen=True)
+class GitRepoInfo:
+    git_dir: str
+    branch: Optional[str]            # None if HEAD is detached
+    commit_hash: Optional[str]
+    remote_name: Optional[str]       # tracking remote of the branch, or the preferred remote (origin > upstream > first)
+    remote_url: Optional[str]
+    remote_commit_hash: Optional[str] = None  # commit of `refs/remotes/<remote_name>/<branch>`
+
+    @property
+    def is_detached(self):
+        return self.branch is None
+
+
+def get_preferred_remote(remotes):
+    if 'origin' in remotes:
+        return 'origin'
+    elif 'upstream' in remotes:
+        return 'upstream'
+    elif len(remotes) > 0:
+        return next(iter(remotes))
+
+    return None
+
+
+def get_repo_info(path, prefer_tracking=True):
+    """
+    Read HEAD, the active branch, its remote and the remote url of the git repository at `path`.
+
+    :param prefer_tracking: use the tracking remote of the active branch if it is configured,
+                            otherwise the preferred remote is always used.
+    :return: GitRepoInfo or None if `path` is not a git repository
+    """
+    git_dir = get_git_dir(path)
+    if git_dir is None:
+        return None
+
+    branch, commit_hash = read_head(git_dir)
+    config = read_git_config(git_dir) or dict(remotes={}, branches={})
+    remotes = config['remotes']
+
+    remote_name = None
+    if prefer_tracking and branch is not None:
+        remote_name = config['branches'].get(branch, {}).get('remote')
+        if remote_name not in remotes:
+            remote_name = None
+
+    if remote_name is None:
+        remote_name = get_preferred_remote(remotes)
+
+    remote_commit_hash = None
+    if remote_name is not None and branch is not None:
+        remote_commit_hash = resolve_ref(git_dir, f'refs/remotes/{remote_name}/{branch}')
+
+    return GitRepoInfo(git_dir=git_dir, branch=branch, commit_hash=commit_hash,
+                       remote_name=remote_name, remote_url=remotes.get(remote_name),
+                       remote_commit_hash=remote_commit_hash)
+
+
 def get_commit_hash(fullpath):
-    git_head = os.path.join(fullpath, '.git', 'HEAD')
-    if os.path.exists(git_head):
-        with open(git_head) as f:
-            line = f.readline()
-
-            if line.startswith("ref: "):
-                ref = os.path.join(fullpath, '.git', line[5:].strip())
-                if os.path.exists(ref):
-                    with open(ref) as f2:
-                        return f2.readline().strip()
-                else:
-                    return "unknown"
-            else:
-                return line
+    git_dir = get_git_dir(fullpath)
+    if git_dir is not None:
+        _, commit_hash = read_head(git_dir)
+        if commit_hash:
+            return commit_hash
 
     return "unknown"
 
@@ -35,18 +218,17 @@ def git_url(fullpath):
     """
     resolve version of unclassified custom node based on remote url in .git/config
     """
-    git_config_path = os.path.join(fullpath, '.git', 'config')
-
-    if not os.path.exists(git_config_path):
+    git_dir = get_git_dir(fullpath)
+    if git_dir is None:
         return None
 
-    # Set `strict=False` to allow duplicate `vscode-merge-base` sections, addressing <https://github.com/ltdrdata/ComfyUI-Manager/issues/1529>
-    config = configparser.ConfigParser(strict=False)
-    config.read(git_config_path)
+    config = read_git_config(git_dir)
+    if config is None:
+        return None
 
-    for k, v in config.items():
-        if k.startswith('remote ') and 'url' in v:
-            return v['url']
+    for url in config['remotes'].values():
+        if url:
+            return url
 
     return None
 
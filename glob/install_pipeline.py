@@ -0,0 +1,74 @@
+"""
+Pipelined installation of multiple node packs.
+
+* stage 1 - fetch: clone / download and extract a node pack. runs ahead for the next `lookahead` packs in worker threads
+* stage 0 - prefetch (optional): `pip download` the requirements of a fetched pack into the wheelhouse. runs in the same worker thread
+* stage 2 - install: dependency installation (pip, `install.py`). runs in the calling thread, one pack at a time, in the given order
+
+So the network phase of the next packs overlaps with the dependency installation of the current pack.
+"""
+
+import inspect
+import logging
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import manager_util
+
+
+def _run_stage(func, *args):
+    res = func(*args)
+    if inspect.iscoroutine(res):
+        res = manager_util.run_async(res)  # each worker thread runs its own event loop
+    return res
+
+
+def run(items, fetch, install, prefetch=None, lookahead=3):
+    """
+    :param fetch: callable(item) -> result. (may be a coroutine function)
+    :param install: callable(item, result, error) executed in order. `error` is the exception raised by the fetch stage
+    :param prefetch: callable(item, result). failures are ignored (the install stage downloads what is missing)
+    :param lookahead: number of packs fetched ahead of the pack being installed
+    """
+    items = list(items)
+    if not items:
+        return
+
+    def fetch_stage(item):
+        res = _run_stage(fetch, item)
+
+        if prefetch is not None:
+            try:
+                _run_stage(prefetch, item, res)
+            except Exception as e:
+                logging.warning(f"[ComfyUI-Manager] Failed to prefetch the dependencies of '{item}': {e}")
+
+        return res
+
+    workers = max(1, lookahead)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ManagerInstallFetch') as executor:
+        it = iter(items)
+        window = deque()
+
+        def fill():
+            # `lookahead` packs ahead of the pack being installed
+            while len(window) < workers:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                window.append((item, executor.submit(fetch_stage, item)))
+
+        fill()
+        while window:
+            item, future = window.popleft()
+            fill()
+
+            try:
+                res, error = future.result(), None
+            except Exception as e:
+                traceback.print_exc()
+                res, error = None, e
+
+            install(item, res, error)
@@ -3,6 +3,8 @@ description:
     `manager_core` contains the core implementation of the management functions in ComfyUI-Manager.
 """
 
+import asyncio
+import contextlib
 import json
 import logging
 import os
@@ -15,14 +17,15 @@ import platform
 from datetime import datetime
 
 import git
-from git.remote import RemoteProgress
 from urllib.parse import urlparse
 from tqdm.auto import tqdm
 import time
+import threading
 import yaml
 import zipfile
 import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import types
+from concurrent.futures import ThreadPoolExecutor
 import toml
 
 orig_print = print
@@ -37,10 +40,15 @@ sys.path.append(glob_path)
 
 import cm_global
 import cnr_utils
+import cnr_store
+import node_pack_watcher
 import manager_util
 import git_utils
+import git_engine
+import git_mirror
+import pip_lock
 import manager_downloader
-from node_package import InstalledNodePackage
+from node_package import InstalledNodePackage, NodePackResolution
 
 
 version_code = [3, 31, 9]
@@ -111,6 +119,13 @@ def get_script_env():
     if git_exe is not None:
         new_env['GIT_EXE_PATH'] = git_exe
 
+    new_env['CLONE_STRATEGY'] = get_config()['clone_strategy']
+    new_env['USE_UV'] = str(get_config()['use_uv'])
+
+    mirror_path = get_git_mirror_path()
+    if mirror_path is not None:
+        new_env['GIT_MIRROR_PATH'] = mirror_path
+
     if 'COMFYUI_PATH' not in new_env:
         new_env['COMFYUI_PATH'] = comfy_path
 
@@ -409,10 +424,15 @@ class UnifiedManager:
         self.unknown_inactive_nodes = {}   # node_id -> repo url * fullpath
         self.active_nodes = {}             # node_id -> node_version * fullpath
         self.unknown_active_nodes = {}     # node_id -> repo url * fullpath
-        self.cnr_map = {}                  # node_id -> cnr info
-        self.repo_cnr_map = {}             # repo_url -> cnr info
+        self.registry_store = cnr_store.RegistryStore()
+        self.cnr_map = cnr_store.NodeIdMap(self.registry_store)      # node_id -> cnr info
+        self.repo_cnr_map = cnr_store.RepoMap(self.registry_store)   # repo_url -> cnr info
         self.custom_node_map_cache = {}    # (channel, mode) -> augmented custom node list json
         self.processed_install = set()
+        self.path_cache = {}               # fullpath -> fingerprint * InstalledNodePackage * normalized git url
+        self.path_cache_registry = None    # registry store version which `path_cache` was resolved with
+        self.index_lock = threading.RLock()
+        self.watcher = None                # node_pack_watcher.NodePackWatcher (optional)
 
     def get_module_name(self, x):
         info = self.active_nodes.get(x)
@@ -557,50 +577,136 @@ class UnifiedManager:
             else:
                 return None
 
-    def update_cache_at_path(self, fullpath):
-        node_package = InstalledNodePackage.from_fullpath(fullpath, self.resolve_from_path)
-        self.installed_node_packages[node_package.id] = node_package
+    @staticmethod
+    def get_path_fingerprint(fullpath):
+        """
+        mtimes of the files which `resolve_from_path` depends on
+        """
+        res = []
+        for x in ('', '.git', os.path.join('.git', 'HEAD'), os.path.join('.git', 'config'), '.tracking', 'pyproject.toml'):
+            try:
+                res.append(os.stat(os.path.join(fullpath, x)).st_mtime_ns)
+            except OSError:
+                res.append(None)
+        return tuple(res)
 
-        if node_package.is_disabled and node_package.is_unknown:
+    def invalidate(self, *paths):
+        """
+        Drop the cached resolution of `paths`, so that the next `reload` re-resolves them.
+        Must be called whenever a node pack is installed, removed or moved.
+        """
+        for x in paths:
+            if x is not None:
+                self.path_cache.pop(os.path.normpath(x), None)
+
+        if self.watcher is not None:
+            self.watcher.mark_dirty()
+
+    def resolve_path(self, fullpath):
+        """
+        Resolve a node pack directory into NodePackResolution.
+        This doesn't touch the state of UnifiedManager, so it is safe to call from worker threads.
+        """
+        fingerprint = self.get_path_fingerprint(fullpath)
+        if fingerprint[0] is None:
+            return None
+
+        cached = self.path_cache.get(fullpath)
+        if cached is not None and cached.fingerprint == fingerprint:
+            return cached
+
+        info = self.resolve_from_path(fullpath)
+        node_package = InstalledNodePackage.from_fullpath(fullpath, lambda _: info)
+
+        url = None
+        if node_package.is_unknown:
             url = git_utils.git_url(node_package.fullpath)
             if url is not None:
                 url = git_utils.normalize_url(url)
-            self.unknown_inactive_nodes[node_package.id] = (url, node_package.fullpath)
+
+        return NodePackResolution(fullpath=fullpath, fingerprint=fingerprint, package=node_package, resolved=info is not None, url=url)
+
+    def resolve_paths(self, paths):
+        """
+        Resolve `paths` in parallel (`resolve_workers` of config).
+        Only the paths whose fingerprint is changed are resolved again.
+
+        :return: list of NodePackResolution in the order of `paths` (None for a path which is not a directory)
+        """
+        def resolve(fullpath):
+            try:
+                return self.resolve_path(fullpath)
+            except Exception as e:
+                logging.error(f"[ComfyUI-Manager] Failed to resolve node pack '{fullpath}': {e}")
+                return None
+
+        workers = get_config()['resolve_workers']
+        if workers <= 1 or len(paths) <= 1:
+            return [resolve(x) for x in paths]
+
+        with ThreadPoolExecutor(min(workers, len(paths))) as executor:
+            return list(executor.map(resolve, paths))
+
+    def apply_resolution(self, resolution, index=None):
+        """
+        :param index: object with the maps of the installed node pack index. (default: self)
+        """
+        if index is None:
+            index = self
+
+        index.path_cache[resolution.fullpath] = resolution
+
+        node_package = resolution.package
+        url = resolution.url
+
+        index.installed_node_packages[node_package.id] = node_package
+
+        if node_package.is_disabled and node_package.is_unknown:
+            index.unknown_inactive_nodes[node_package.id] = (url, node_package.fullpath)
 
         if node_package.is_disabled and node_package.is_nightly:
-            self.nightly_inactive_nodes[node_package.id] = node_package.fullpath
+            index.nightly_inactive_nodes[node_package.id] = node_package.fullpath
 
         if node_package.is_enabled and not node_package.is_unknown:
-            self.active_nodes[node_package.id] = node_package.version, node_package.fullpath
+            index.active_nodes[node_package.id] = node_package.version, node_package.fullpath
 
         if node_package.is_enabled and node_package.is_unknown:
-            url = git_utils.git_url(node_package.fullpath)
-            if url is not None:
-                url = git_utils.normalize_url(url)
-            self.unknown_active_nodes[node_package.id] = (url, node_package.fullpath)
+            index.unknown_active_nodes[node_package.id] = (url, node_package.fullpath)
 
         if node_package.is_from_cnr and node_package.is_disabled:
-            self.add_to_cnr_inactive_nodes(node_package.id, node_package.version, node_package.fullpath)
+            index.cnr_inactive_nodes.setdefault(node_package.id, {})[node_package.version] = node_package.fullpath
+
+    def update_cache_at_path(self, fullpath):
+        resolution = self.resolve_path(os.path.normpath(fullpath))
+        if resolution is not None:
+            with self.index_lock:
+                self.apply_resolution(resolution)
+
+    def is_updatable(self, node_id, cnr=None):
+        """
+        :param cnr: cnr info of `node_id` if the caller already has it
+        """
+        if cnr is None:
+            cnr = self.cnr_map[node_id]
 
-    def is_updatable(self, node_id):
         cur_ver = self.get_cnr_active_version(node_id)
-        latest_ver = self.cnr_map[node_id]['latest_version']['version']
+        latest_ver = cnr['latest_version']['version']
 
         if cur_ver and latest_ver:
             return self.safe_version(latest_ver) > self.safe_version(cur_ver)
 
         return False
 
-    def fetch_or_pull_git_repo(self, is_pull=False):
+    async def fetch_or_pull_git_repo(self, is_pull=False):
         updated = set()
         failed = set()
 
-        def check_update(node_name, fullpath, ver_spec):
+        async def check_update(node_name, fullpath, ver_spec):
             try:
                 if is_pull:
-                    is_updated, success = git_repo_update_check_with(fullpath, do_update=True)
+                    is_updated, success = await git_repo_update_check_with_async(fullpath, do_update=True)
                 else:
-                    is_updated, success = git_repo_update_check_with(fullpath, do_fetch=True)
+                    is_updated, success = await check_update_of_git_repo(fullpath)
 
                 return f"{node_name}@{ver_spec}", is_updated, success
             except Exception:
@@ -608,24 +714,27 @@ class UnifiedManager:
 
             return f"{node_name}@{ver_spec}", False, False
 
-        with ThreadPoolExecutor() as executor:
-            futures = []
+        # concurrency is bounded by git_engine
+        tasks = []
 
-            for k, v in self.unknown_active_nodes.items():
-                futures.append(executor.submit(check_update, k, v[1], 'unknown'))
+        for k, v in self.unknown_active_nodes.items():
+            tasks.append(check_update(k, v[1], 'unknown'))
 
-            for k, v in self.active_nodes.items():
-                if v[0] == 'nightly':
-                    futures.append(executor.submit(check_update, k, v[1], 'nightly'))
+        for k, v in self.active_nodes.items():
+            if v[0] == 'nightly':
+                tasks.append(check_update(k, v[1], 'nightly'))
 
-            for future in as_completed(futures):
-                item, is_updated, success = future.result()
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            remote_head_cache.flush()
 
-                if is_updated:
-                    updated.add(item)
+        for item, is_updated, success in results:
+            if is_updated:
+                updated.add(item)
 
-                if not success:
-                    failed.add(item)
+            if not success:
+                failed.add(item)
 
         return dict(updated=list(updated), failed=list(failed))
 
@@ -731,40 +840,71 @@ class UnifiedManager:
 
     async def reload(self, cache_mode, dont_wait=True):
         self.custom_node_map_cache = {}
-        self.cnr_inactive_nodes = {}      # node_id -> node_version -> fullpath
-        self.nightly_inactive_nodes = {}  # node_id -> fullpath
-        self.unknown_inactive_nodes = {}  # node_id -> repo url * fullpath
-        self.unknown_active_nodes = {}    # node_id -> repo url * fullpath
-        self.active_nodes = {}            # node_id -> node_version * fullpath
 
         if get_config()['network_mode'] != 'public':
             dont_wait = True
 
-        # reload 'cnr_map' and 'repo_cnr_map'
-        cnrs = await cnr_utils.get_cnr_data(cache_mode=cache_mode=='cache', dont_wait=dont_wait)
+        # sync the registry store behind 'cnr_map' and 'repo_cnr_map'
+        await cnr_utils.update_registry_store(self.registry_store, cache_mode=cache_mode=='cache', dont_wait=dont_wait)
 
-        for x in cnrs:
-            self.cnr_map[x['id']] = x
-            if 'repository' in x:
-                normalized_url = git_utils.normalize_url(x['repository'])
-                self.repo_cnr_map[normalized_url] = x
+        # resolution of node packs depends on the registry
+        registry_version = self.registry_store.get_meta('source')
+        if registry_version != self.path_cache_registry:
+            with self.index_lock:
+                self.path_cache = {}
+                self.path_cache_registry = registry_version
+        elif self.watcher is not None and self.watcher.is_in_sync():
+            return  # the live index is up to date
 
-        # reload node status info from custom_nodes/*
-        for custom_nodes_path in folder_paths.get_folder_paths('custom_nodes'):
-            for x in os.listdir(custom_nodes_path):
-                fullpath = os.path.join(custom_nodes_path, x)
-                if os.path.isdir(fullpath):
-                    if x not in ['__pycache__', '.disabled']:
-                        self.update_cache_at_path(fullpath)
+        self.rescan_node_packs()
 
-        # reload node status info from custom_nodes/.disabled/*
-        for custom_nodes_path in folder_paths.get_folder_paths('custom_nodes'):
-            disabled_dir = os.path.join(custom_nodes_path, '.disabled')
-            if os.path.exists(disabled_dir):
-                for x in os.listdir(disabled_dir):
-                    fullpath = os.path.join(disabled_dir, x)
-                    if os.path.isdir(fullpath):
-                        self.update_cache_at_path(fullpath)
+    def rescan_node_packs(self):
+        """
+        Rebuild the installed node pack index from custom_nodes/* and custom_nodes/.disabled/*
+        """
+        with self.index_lock:
+            # collect node pack paths: custom_nodes/* and custom_nodes/.disabled/*
+            paths = []
+            for custom_nodes_path in folder_paths.get_folder_paths('custom_nodes'):
+                for x in os.listdir(custom_nodes_path):
+                    if x not in ['__pycache__', '.disabled']:
+                        paths.append(os.path.normpath(os.path.join(custom_nodes_path, x)))
+
+            for custom_nodes_path in folder_paths.get_folder_paths('custom_nodes'):
+                disabled_dir = os.path.join(custom_nodes_path, '.disabled')
+                if os.path.exists(disabled_dir):
+                    for x in os.listdir(disabled_dir):
+                        paths.append(os.path.normpath(os.path.join(disabled_dir, x)))
+
+            # resolve in parallel, then build the new maps aside.
+            # the readers which don't take `index_lock` never see empty or partially filled maps
+            resolutions = [x for x in self.resolve_paths(paths) if x is not None]
+
+            index = types.SimpleNamespace(
+                installed_node_packages={},
+                cnr_inactive_nodes={},      # node_id -> node_version -> fullpath
+                nightly_inactive_nodes={},  # node_id -> fullpath
+                unknown_inactive_nodes={},  # node_id -> repo url * fullpath
+                unknown_active_nodes={},    # node_id -> repo url * fullpath
+                active_nodes={},            # node_id -> node_version * fullpath
+                path_cache={})
+            for x in resolutions:
+                self.apply_resolution(x, index)
+
+            (self.installed_node_packages, self.cnr_inactive_nodes, self.nightly_inactive_nodes,
+             self.unknown_inactive_nodes, self.unknown_active_nodes, self.active_nodes, self.path_cache) = \
+                (index.installed_node_packages, index.cnr_inactive_nodes, index.nightly_inactive_nodes,
+                 index.unknown_inactive_nodes, index.unknown_active_nodes, index.active_nodes, index.path_cache)
+
+    def start_watcher(self):
+        """
+        Keep the installed node pack index up to date by watching custom_nodes directories.
+        While the watcher is in sync, `reload` doesn't rescan the directories.
+        """
+        if self.watcher is None:
+            self.watcher = node_pack_watcher.NodePackWatcher(self.rescan_node_packs, lambda: folder_paths.get_folder_paths('custom_nodes'))
+            self.watcher.start()
+            logging.info(f"[ComfyUI-Manager] Watching custom_nodes directories ({self.watcher.mode})")
 
     @staticmethod
     async def load_nightly(channel, mode):
@@ -856,26 +996,28 @@ class UnifiedManager:
         requirements_path = os.path.join(repo_path, "requirements.txt")
 
         res = True
-        if lazy_mode:
+        if lazy_mode or (os.path.exists(requirements_path) and not no_deps and is_deferred_install(instant_execution)):
+            # deferred: all requirements of the pack are installed together on the next startup
             install_cmd = ["#LAZY-INSTALL-SCRIPT", sys.executable]
             return try_install_script(url, repo_path, install_cmd)
         else:
             if os.path.exists(requirements_path) and not no_deps:
                 print("Install: pip packages")
-                pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, manager_files_path)
-                lines = manager_util.robust_readlines(requirements_path)
-                for line in lines:
-                    package_name = remap_pip_package(line.strip())
-                    if package_name and not package_name.startswith('#') and package_name not in self.processed_install:
-                        self.processed_install.add(package_name)
-                        install_cmd = manager_util.make_pip_cmd(["install", package_name])
-                        if package_name.strip() != "" and not package_name.startswith('#'):
-                            res = res and try_install_script(url, repo_path, install_cmd, instant_execution=instant_execution)
+                with locked_env():
+                    pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, manager_files_path)
+                    lines = manager_util.robust_readlines(requirements_path)
+                    batches = manager_util.parse_requirements(lines, remap=remap_pip_package,
+                                                              skip=lambda x: x in self.processed_install)
+                    for _, specs in batches:
+                        self.processed_install.update(specs)
 
-                pip_fixer.fix_broken()
+                    res = manager_util.install_requirements(batches, lambda cmd: try_install_script(url, repo_path, cmd, instant_execution=instant_execution))
+
+                    pip_fixer.fix_broken()
 
             if os.path.exists(install_script_path) and install_script_path not in self.processed_install:
                 self.processed_install.add(install_script_path)
+                manager_util.check_cancelled()
                 print("Install: install script")
                 install_cmd = [sys.executable, "install.py"]
                 return res and try_install_script(url, repo_path, install_cmd, instant_execution=instant_execution)
@@ -907,6 +1049,7 @@ class UnifiedManager:
         if info is None or not os.path.exists(info[1]):
             return result.fail(f'not found: {node_id}@{version_spec}')
 
+        manager_util.check_cancelled()
         self.execute_install_script(node_id, info[1], instant_execution=instant_execution, no_deps=no_deps)
 
         return result
@@ -968,12 +1111,18 @@ class UnifiedManager:
 
         archive_name = f"CNR_temp_{str(uuid.uuid4())}.zip"  # should be unpredictable name - security precaution
         download_path = os.path.join(get_default_custom_nodes_path(), archive_name)
-        manager_downloader.basic_download_url(node_info.download_url, get_default_custom_nodes_path(), archive_name)
-
-        # 2. extract files into <node_id>
         install_path = self.active_nodes[node_id][1]
-        extracted = manager_util.extract_package_as_zip(download_path, install_path)
-        os.remove(download_path)
+        try:
+            manager_downloader.basic_download_url(node_info.download_url, get_default_custom_nodes_path(), archive_name)
+
+            # 2. extract files into <node_id>
+            extracted = manager_util.extract_package_as_zip(download_path, install_path)
+        finally:
+            # also on failure/cancel
+            if os.path.exists(download_path):
+                os.remove(download_path)
+
+        self.invalidate(install_path)
 
         if extracted is None:
             if len(os.listdir(install_path)) == 0:
@@ -1008,6 +1157,7 @@ class UnifiedManager:
 
         # 6. post install
         result.target = version_spec
+        result.to_path = install_path
 
         def postinstall():
             res = self.execute_install_script(f"{node_id}@{version_spec}", install_path, instant_execution=instant_execution, no_deps=no_deps)
@@ -1087,18 +1237,20 @@ class UnifiedManager:
 
         # move from disk
         shutil.move(from_path, to_path)
+        self.invalidate(from_path, to_path)
 
         # update cache
-        if version_spec == 'unknown':
-            self.unknown_active_nodes[node_id] = self.unknown_inactive_nodes[node_id][0], to_path
-            del self.unknown_inactive_nodes[node_id]
-            return result.with_target(to_path)
-        elif version_spec == 'nightly':
-            del self.nightly_inactive_nodes[node_id]
-        else:
-            del self.cnr_inactive_nodes[node_id][version_spec]
+        with self.index_lock:
+            if version_spec == 'unknown':
+                self.unknown_active_nodes[node_id] = self.unknown_inactive_nodes.pop(node_id)[0], to_path
+                return result.with_target(to_path)
+            elif version_spec == 'nightly':
+                self.nightly_inactive_nodes.pop(node_id, None)
+            else:
+                self.cnr_inactive_nodes.get(node_id, {}).pop(version_spec, None)
+
+            self.active_nodes[node_id] = version_spec, to_path
 
-        self.active_nodes[node_id] = version_spec, to_path
         return result.with_target(to_path)
 
     def unified_disable(self, node_id: str, is_unknown):
@@ -1128,10 +1280,12 @@ class UnifiedManager:
             to_path = os.path.join(base_path, '.disabled', node_id)
 
             shutil.move(repo_and_path[1], to_path)
+            self.invalidate(repo_and_path[1], to_path)
             result.append((repo_and_path[1], to_path))
 
-            self.unknown_inactive_nodes[node_id] = repo_and_path[0], to_path
-            del self.unknown_active_nodes[node_id]
+            with self.index_lock:
+                self.unknown_inactive_nodes[node_id] = repo_and_path[0], to_path
+                self.unknown_active_nodes.pop(node_id, None)
 
             return result
 
@@ -1145,14 +1299,16 @@ class UnifiedManager:
         # NOTE: A disabled node may have multiple versions, so preserve it using the `@ suffix`.
         to_path = os.path.join(base_path, '.disabled', f"{node_id}@{ver_and_path[0].replace('.', '_')}")
         shutil.move(ver_and_path[1], to_path)
+        self.invalidate(ver_and_path[1], to_path)
         result.append((ver_and_path[1], to_path))
 
-        if ver_and_path[0] == 'nightly':
-            self.nightly_inactive_nodes[node_id] = to_path
-        else:
-            self.add_to_cnr_inactive_nodes(node_id, ver_and_path[0], to_path)
+        with self.index_lock:
+            if ver_and_path[0] == 'nightly':
+                self.nightly_inactive_nodes[node_id] = to_path
+            else:
+                self.add_to_cnr_inactive_nodes(node_id, ver_and_path[0], to_path)
 
-        del self.active_nodes[node_id]
+            self.active_nodes.pop(node_id, None)
 
         return result
 
@@ -1173,8 +1329,10 @@ class UnifiedManager:
 
             if repo_and_path is not None and os.path.exists(repo_and_path[1]):
                 rmtree(repo_and_path[1])
+                self.invalidate(repo_and_path[1])
                 result.append(repo_and_path[1])
-                del self.unknown_active_nodes[node_id]
+                with self.index_lock:
+                    self.unknown_active_nodes.pop(node_id, None)
 
                 is_removed = True
 
@@ -1183,8 +1341,10 @@ class UnifiedManager:
 
             if repo_and_path is not None and os.path.exists(repo_and_path[1]):
                 rmtree(repo_and_path[1])
+                self.invalidate(repo_and_path[1])
                 result.append(repo_and_path[1])
-                del self.unknown_inactive_nodes[node_id]
+                with self.index_lock:
+                    self.unknown_inactive_nodes.pop(node_id, None)
 
                 is_removed = True
 
@@ -1198,23 +1358,29 @@ class UnifiedManager:
 
         if ver_and_path is not None and os.path.exists(ver_and_path[1]):
             try_rmtree(node_id, ver_and_path[1])
+            self.invalidate(ver_and_path[1])
             result.items.append(ver_and_path)
-            del self.active_nodes[node_id]
+            with self.index_lock:
+                self.active_nodes.pop(node_id, None)
 
         # remove from nightly inactives
         fullpath = self.nightly_inactive_nodes.get(node_id)
         if fullpath is not None and os.path.exists(fullpath):
             try_rmtree(node_id, fullpath)
+            self.invalidate(fullpath)
             result.items.append(('nightly', fullpath))
-            del self.nightly_inactive_nodes[node_id]
+            with self.index_lock:
+                self.nightly_inactive_nodes.pop(node_id, None)
 
         # remove from cnr inactives
         ver_map = self.cnr_inactive_nodes.get(node_id)
         if ver_map is not None:
-            for key, fullpath in ver_map.items():
+            for key, fullpath in list(ver_map.items()):
                 try_rmtree(node_id, fullpath)
+                self.invalidate(fullpath)
                 result.items.append((key, fullpath))
-            del self.cnr_inactive_nodes[node_id]
+            with self.index_lock:
+                self.cnr_inactive_nodes.pop(node_id, None)
 
         if len(result.items) == 0:
             return ManagedResult('skip').with_msg('Not installed')
@@ -1240,23 +1406,37 @@ class UnifiedManager:
 
         # install_path
         install_path = os.path.join(get_default_custom_nodes_path(), node_id)
-        if os.path.exists(install_path):
+        if os.path.exists(install_path) and not os.path.exists(get_install_marker(install_path)):
             return result.fail(f'Install path already exists: {install_path}')
 
-        manager_downloader.download_url(node_info.download_url, get_default_custom_nodes_path(), archive_name)
-        os.makedirs(install_path, exist_ok=True)
-        extracted = manager_util.extract_package_as_zip(download_path, install_path)
-        os.remove(download_path)
-        result.to_path = install_path
-
-        if extracted is None:
-            shutil.rmtree(install_path)
-            return result.fail(f'Empty archive file: {node_id}@{version_spec}')
+        begin_install(install_path)
+        ok = False
+        try:
+            manager_downloader.download_url(node_info.download_url, get_default_custom_nodes_path(), archive_name)
+            manager_util.check_cancelled()
+            os.makedirs(install_path, exist_ok=True)
+            self.invalidate(install_path)
+            extracted = manager_util.extract_package_as_zip(download_path, install_path)
+            os.remove(download_path)
+            result.to_path = install_path
 
-        # create .tracking file
-        tracking_info_file = os.path.join(install_path, '.tracking')
-        with open(tracking_info_file, "w", encoding='utf-8') as file:
-            file.write('\n'.join(extracted))
+            if extracted is None:
+                shutil.rmtree(install_path)
+                return result.fail(f'Empty archive file: {node_id}@{version_spec}')
+
+            # create .tracking file
+            tracking_info_file = os.path.join(install_path, '.tracking')
+            with open(tracking_info_file, "w", encoding='utf-8') as file:
+                file.write('\n'.join(extracted))
+
+            ok = True
+        finally:
+            # failed or cancelled: don't leave the temp zip and the partial node pack
+            if os.path.exists(download_path):
+                os.remove(download_path)
+            if not ok and os.path.exists(install_path):
+                shutil.rmtree(install_path, ignore_errors=True)
+            end_install(install_path)
 
         result.target = version_spec
 
@@ -1271,7 +1451,7 @@ class UnifiedManager:
 
         return result
 
-    def repo_install(self, url: str, repo_path: str, instant_execution=False, no_deps=False, return_postinstall=False):
+    async def repo_install(self, url: str, repo_path: str, instant_execution=False, no_deps=False, return_postinstall=False):
         result = ManagedResult('install-git')
         result.append(url)
 
@@ -1287,15 +1467,13 @@ class UnifiedManager:
             # Clone the repository from the remote URL
             clone_url = git_utils.get_url_for_clone(url)
             print(f"Download: git clone '{clone_url}'")
+            self.invalidate(repo_path)
 
-            if not instant_execution and platform.system() == 'Windows':
-                res = manager_funcs.run_script([sys.executable, git_script_path, "--clone", get_default_custom_nodes_path(), clone_url, repo_path], cwd=get_default_custom_nodes_path())
-                if res != 0:
-                    return result.fail(f"Failed to clone repo: {clone_url}")
-            else:
-                repo = git.Repo.clone_from(clone_url, repo_path, recursive=True, progress=GitProgress())
-                repo.git.clear_cache()
-                repo.close()
+            err = await clone_git_repo(clone_url, repo_path, instant_execution=instant_execution)
+            if err is not None:
+                return result.fail(f"Failed to clone repo: {clone_url} / {err}")
+
+            result.to_path = repo_path
 
             def postinstall():
                 return self.execute_install_script(url, repo_path, instant_execution=instant_execution, no_deps=no_deps)
@@ -1303,7 +1481,7 @@ class UnifiedManager:
             if return_postinstall:
                 return result.with_postinstall(postinstall)
             else:
-                if not postinstall():
+                if not await asyncio.to_thread(postinstall):
                     return result.fail(f"Failed to execute install script: {url}")
 
         except Exception as e:
@@ -1363,6 +1541,7 @@ class UnifiedManager:
 
         if commit_hash != remote_commit_hash:
             git_pull(repo_path)
+            self.invalidate(repo_path)
 
             if len(repo.remotes) > 0:
                 url = repo.remotes[0].url
@@ -1382,6 +1561,75 @@ class UnifiedManager:
         else:
             return ManagedResult('skip').with_msg('Up to date')
 
+    async def repo_update_async(self, repo_path, instant_execution=False, no_deps=False):
+        """
+        async version of `repo_update`.
+        git runs through git_engine, so a cancelled task stops the fetch/pull. (see manager_util.TaskContext)
+        """
+        result = ManagedResult('update-git')
+
+        if not os.path.exists(os.path.join(repo_path, '.git')):
+            return result.fail(f'Path not found: {repo_path}')
+
+        engine = get_git_engine()
+
+        info = git_utils.get_repo_info(repo_path)
+        if info is not None and info.is_detached:
+            if not await asyncio.to_thread(switch_to_default_branch_at, repo_path):
+                return result.fail(f"Failed to switch to default branch: {repo_path}")
+            info = git_utils.get_repo_info(repo_path)
+
+        if info is None or info.remote_name is None:
+            return result.fail(f"Failed to get remote when installing: {repo_path}")
+
+        res = await engine.fetch(repo_path, info.remote_name, info.remote_url)
+        if not res.ok:
+            # same as `repo_update`: compare with the last fetched remote head
+            print(f"\nFetching failed: {repo_path}\n{res.error_message()}", file=sys.stderr)
+
+        info = git_utils.get_repo_info(repo_path)
+        if info.remote_commit_hash is None:
+            return result.fail(f"Not updatable branch: {info.branch}")
+
+        if info.commit_hash == info.remote_commit_hash:
+            return ManagedResult('skip').with_msg('Up to date')
+
+        if await engine.is_dirty(repo_path):
+            print(f"STASH: '{repo_path}' is dirty.")
+            await engine.stash(repo_path)
+
+        res = await engine.pull(repo_path, info.remote_name, info.branch, info.remote_url)
+        if not res.ok:
+            return result.fail(f"Failed to pull: {repo_path} / {res.error_message()}")
+
+        await engine.submodule_update(repo_path)
+        self.invalidate(repo_path)
+
+        url = info.remote_url or "unknown repo"
+        if not await asyncio.to_thread(self.execute_install_script, url, repo_path, instant_execution=instant_execution, no_deps=no_deps):
+            return result.fail(f"Failed to execute install script: {url}")
+
+        return result
+
+    async def unified_update_async(self, node_id, version_spec=None, instant_execution=False, no_deps=False):
+        """
+        async version of `unified_update` for the task queue. every step can be cancelled.
+        """
+        if version_spec is None:
+            version_spec = self.resolve_unspecified_version(node_id, guess_mode='active')
+
+        if version_spec is None:
+            return ManagedResult('update').fail(f'Update not available: {node_id}@{version_spec}').with_ver(version_spec)
+
+        if version_spec in ['nightly', 'unknown']:
+            nodes = self.active_nodes if version_spec == 'nightly' else self.unknown_active_nodes
+            res = await self.repo_update_async(nodes[node_id][1], instant_execution=instant_execution, no_deps=no_deps)
+            return res.with_target(version_spec).with_ver(version_spec)
+        else:
+            # download (checks the cancellation per chunk) and pip (killed on cancel) in a thread
+            res = await asyncio.to_thread(self.cnr_switch_version, node_id, instant_execution=instant_execution, no_deps=no_deps)
+            return res.with_ver('cnr')
+
     def unified_update(self, node_id, version_spec=None, instant_execution=False, no_deps=False, return_postinstall=False):
         orig_print(f"\x1b[2K\rUpdating: {node_id}", end='')
 
@@ -1448,13 +1696,16 @@ class UnifiedManager:
                     self.unified_disable(node_id, False)
 
             to_path = os.path.abspath(os.path.join(get_default_custom_nodes_path(), node_id))
-            res = self.repo_install(repo_url, to_path, instant_execution=instant_execution, no_deps=no_deps, return_postinstall=return_postinstall)
+            res = await self.repo_install(repo_url, to_path, instant_execution=instant_execution, no_deps=no_deps, return_postinstall=return_postinstall)
             if res.result:
-                if version_spec == 'unknown':
-                    self.unknown_active_nodes[node_id] = repo_url, to_path
-                elif version_spec == 'nightly':
+                if version_spec == 'nightly':
                     cnr_utils.generate_cnr_id(to_path, node_id)
-                    self.active_nodes[node_id] = 'nightly', to_path
+
+                with self.index_lock:
+                    if version_spec == 'unknown':
+                        self.unknown_active_nodes[node_id] = repo_url, to_path
+                    elif version_spec == 'nightly':
+                        self.active_nodes[node_id] = 'nightly', to_path
             else:
                 return res
 
@@ -1471,14 +1722,16 @@ class UnifiedManager:
         if self.is_disabled(node_id, "cnr"):
             # enable and switch version if cnr is disabled (not specified version)
             self.unified_enable(node_id, "cnr")
-            return self.cnr_switch_version(node_id, version_spec, no_deps=no_deps, return_postinstall=return_postinstall)
+            return await asyncio.to_thread(self.cnr_switch_version, node_id, version_spec, no_deps=no_deps, return_postinstall=return_postinstall)
 
         if self.is_enabled(node_id, "cnr"):
-            return self.cnr_switch_version(node_id, version_spec, no_deps=no_deps, return_postinstall=return_postinstall)
+            return await asyncio.to_thread(self.cnr_switch_version, node_id, version_spec, no_deps=no_deps, return_postinstall=return_postinstall)
 
-        res = self.cnr_install(node_id, version_spec, instant_execution=instant_execution, no_deps=no_deps, return_postinstall=return_postinstall)
+        # download and dependency installation don't block the event loop of the task worker
+        res = await asyncio.to_thread(self.cnr_install, node_id, version_spec, instant_execution=instant_execution, no_deps=no_deps, return_postinstall=return_postinstall)
         if res.result:
-            self.active_nodes[node_id] = version_spec, res.to_path
+            with self.index_lock:
+                self.active_nodes[node_id] = version_spec, res.to_path
 
         return res
 
@@ -1628,6 +1881,15 @@ def write_config():
         'always_lazy_install': get_config()['always_lazy_install'],
         'network_mode': get_config()['network_mode'],
         'db_mode': get_config()['db_mode'],
+        'resolve_workers': get_config()['resolve_workers'],
+        'watch_custom_nodes': get_config()['watch_custom_nodes'],
+        'update_check_mode': get_config()['update_check_mode'],
+        'remote_head_ttl': get_config()['remote_head_ttl'],
+        'cache_max_staleness': get_config()['cache_max_staleness'],
+        'clone_strategy': get_config()['clone_strategy'],
+        'git_mirror_path': get_config()['git_mirror_path'],
+        'pip_constraints': get_config()['pip_constraints'],
+        'task_workers': get_config()['task_workers'],
     }
 
     directory = os.path.dirname(manager_config_path)
@@ -1644,10 +1906,19 @@ def read_config():
         config.read(manager_config_path)
         default_conf = config['default']
         manager_util.use_uv = default_conf['use_uv'].lower() == 'true' if 'use_uv' in default_conf else False
+        manager_util.use_pip_constraints = default_conf['pip_constraints'].lower() == 'true' if 'pip_constraints' in default_conf else True
 
         def get_bool(key, default_value):
             return default_conf[key].lower() == 'true' if key in default_conf else False
 
+        def get_int(key, default_value):
+            try:
+                return int(default_conf[key]) if key in default_conf else default_value
+            except ValueError:
+                return default_value
+
+        manager_util.cache_max_staleness = get_int('cache_max_staleness', 7 * 86400)
+
         return {
                     'http_channel_enabled': get_bool('http_channel_enabled', False),
                     'preview_method': default_conf.get('preview_method', manager_funcs.get_current_preview_method()).lower(),
@@ -1667,10 +1938,21 @@ def read_config():
                     'network_mode': default_conf.get('network_mode', 'public').lower(),
                     'security_level': default_conf.get('security_level', 'normal').lower(),
                     'db_mode': default_conf.get('db_mode', 'cache').lower(),
+                    'resolve_workers': get_int('resolve_workers', 8),
+                    'watch_custom_nodes': get_bool('watch_custom_nodes', False),
+                    'update_check_mode': default_conf.get('update_check_mode', 'ls-remote').lower(),
+                    'remote_head_ttl': get_int('remote_head_ttl', 1800),
+                    'cache_max_staleness': manager_util.cache_max_staleness,
+                    'clone_strategy': default_conf.get('clone_strategy', 'full').lower(),
+                    'git_mirror_path': default_conf.get('git_mirror_path', ''),
+                    'pip_constraints': manager_util.use_pip_constraints,
+                    'task_workers': get_int('task_workers', 4),
                }
 
     except Exception:
         manager_util.use_uv = False
+        manager_util.use_pip_constraints = True
+        manager_util.cache_max_staleness = 7 * 86400
         return {
             'http_channel_enabled': False,
             'preview_method': manager_funcs.get_current_preview_method(),
@@ -1690,6 +1972,15 @@ def read_config():
             'network_mode': 'public',   # public | private | offline
             'security_level': 'normal', # strong | normal | normal- | weak
             'db_mode': 'cache',         # local | cache | remote
+            'resolve_workers': 8,
+            'watch_custom_nodes': False,
+            'update_check_mode': 'ls-remote',   # ls-remote | fetch
+            'remote_head_ttl': 1800,
+            'cache_max_staleness': manager_util.cache_max_staleness,
+            'clone_strategy': 'full',   # full | shallow | partial
+            'git_mirror_path': '',
+            'pip_constraints': True,
+            'task_workers': 4,
         }
 
 
@@ -1778,10 +2069,33 @@ def try_rmtree(title, fullpath):
         reserve_script(title, ["#LAZY-DELETE-NODEPACK", fullpath])
 
 
+# serializes pip/uv and `install.py` executions of concurrent tasks (see task_scheduler)
+# NOTE: use `locked_env`. coroutines run the steps which take it through `asyncio.to_thread`
+env_lock = threading.RLock()
+
+
+@contextlib.contextmanager
+def locked_env():
+    """
+    `env_lock` which stops waiting if the running task is cancelled. (raises manager_util.TaskCancelled)
+    """
+    while not env_lock.acquire(timeout=0.5):
+        manager_util.check_cancelled()
+
+    try:
+        manager_util.check_cancelled()
+        yield
+    finally:
+        env_lock.release()
+
+
+def is_deferred_install(instant_execution=False):
+    """ True if install scripts are reserved to be executed on the next startup """
+    return not instant_execution and (platform.system() == "Windows" or get_config()['always_lazy_install'])
+
+
 def try_install_script(url, repo_path, install_cmd, instant_execution=False):
-    if not instant_execution and (
-            (len(install_cmd) > 0 and install_cmd[0].startswith('#')) or platform.system() == "Windows" or get_config()['always_lazy_install']
-    ):
+    if (not instant_execution and len(install_cmd) > 0 and install_cmd[0].startswith('#')) or is_deferred_install(instant_execution):
         reserve_script(repo_path, install_cmd)
         return True
     else:
@@ -1795,7 +2109,8 @@ def try_install_script(url, repo_path, install_cmd, instant_execution=False):
                 return True
 
         print(f"\n## ComfyUI-Manager: EXECUTE => {install_cmd}")
-        code = manager_funcs.run_script(install_cmd, cwd=repo_path)
+        with locked_env():
+            code = manager_funcs.run_script(install_cmd, cwd=repo_path)
 
         if platform.system() != "Windows":
             try:
@@ -1887,37 +2202,22 @@ def execute_install_script(url, repo_path, lazy_mode=False, instant_execution=Fa
     install_script_path = os.path.join(repo_path, "install.py")
     requirements_path = os.path.join(repo_path, "requirements.txt")
 
-    if lazy_mode:
+    if lazy_mode or (os.path.exists(requirements_path) and not no_deps and is_deferred_install(instant_execution)):
+        # deferred: all requirements of the pack are installed together on the next startup
         install_cmd = ["#LAZY-INSTALL-SCRIPT",  sys.executable]
         try_install_script(url, repo_path, install_cmd)
     else:
         if os.path.exists(requirements_path) and not no_deps:
             print("Install: pip packages")
-            pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, manager_files_path)
-            with open(requirements_path, "r") as requirements_file:
-                for line in requirements_file:
-                    #handle comments
-                    if '#' in line:
-                        if line.strip()[0] == '#':
-                            print("Line is comment...skipping")
-                            continue
-                        else:
-                            line = line.split('#')[0].strip()
-
-                    package_name = remap_pip_package(line.strip())
-
-                    if package_name and not package_name.startswith('#'):
-                        if '--index-url' in package_name:
-                            s = package_name.split('--index-url')
-                            install_cmd = manager_util.make_pip_cmd(["install", s[0].strip(), '--index-url', s[1].strip()])
-                        else:
-                            install_cmd = manager_util.make_pip_cmd(["install", package_name])
-
-                        if package_name.strip() != "" and not package_name.startswith('#'):
-                            try_install_script(url, repo_path, install_cmd, instant_execution=instant_execution)
-            pip_fixer.fix_broken()
+            with locked_env():
+                pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, manager_files_path)
+                lines = manager_util.robust_readlines(requirements_path)
+                batches = manager_util.parse_requirements(lines, remap=remap_pip_package)
+                manager_util.install_requirements(batches, lambda cmd: try_install_script(url, repo_path, cmd, instant_execution=instant_execution))
+                pip_fixer.fix_broken()
 
         if os.path.exists(install_script_path):
+            manager_util.check_cancelled()
             print("Install: install script")
             install_cmd = [sys.executable, "install.py"]
             try_install_script(url, repo_path, install_cmd, instant_execution=instant_execution)
@@ -1925,6 +2225,191 @@ def execute_install_script(url, repo_path, lazy_mode=False, instant_execution=Fa
     return True
 
 
+def prefetch_requirements(repo_path, wheelhouse):
+    """
+    Download the missing requirements of the node pack at `repo_path` into `wheelhouse`. (see install_pipeline)
+    """
+    requirements_path = os.path.join(repo_path, "requirements.txt")
+    if not os.path.exists(requirements_path):
+        return True
+
+    lines = manager_util.robust_readlines(requirements_path)
+    batches = manager_util.parse_requirements(lines, remap=remap_pip_package, skip=is_installed)
+    return manager_util.prefetch_wheels(batches, wheelhouse)
+
+
+def get_git_engine():
+    git_engine.engine.git_exe = get_config()['git_exe'] or 'git'
+    return git_engine.engine
+
+
+def get_git_mirror_path():
+    path = get_config()['git_mirror_path']
+    return os.path.abspath(os.path.expanduser(path)) if path else None
+
+
+async def prepare_git_reference(clone_url):
+    """
+    Refresh the shared mirror of `clone_url` if `git_mirror_path` is configured.
+
+    :return: mirror dir to clone with `--reference-if-able`, or None
+    """
+    root = get_git_mirror_path()
+    if root is None:
+        return None
+
+    return await git_mirror.ensure_mirror(get_git_engine(), root, clone_url)
+
+
+def get_install_marker(path):
+    """
+    marker file of a node pack which is being installed.
+    the node pack is removed at the next startup if the installation is interrupted. (see prestartup_script.py)
+    """
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.cm-installing")
+
+
+def begin_install(path):
+    marker = get_install_marker(path)
+    if os.path.exists(marker) and os.path.exists(path):
+        logging.info(f"[ComfyUI-Manager] Remove the interrupted installation: {path}")
+        shutil.rmtree(path)
+
+    with open(marker, 'w'):
+        pass
+
+
+def end_install(path):
+    try:
+        os.remove(get_install_marker(path))
+    except OSError:
+        pass
+
+
+async def clone_git_repo(clone_url, repo_path, instant_execution=False):
+    """
+    Clone a node pack. (via git_helper.py on Windows unless `instant_execution`)
+
+    :return: error message, or None on success
+    """
+    reference = await prepare_git_reference(clone_url)
+
+    begin_install(repo_path)
+    existed = os.path.exists(repo_path)
+    ok = False
+    try:
+        if not instant_execution and platform.system() == 'Windows':
+            cmd = [sys.executable, git_script_path, "--clone", get_default_custom_nodes_path(), clone_url, repo_path]
+            if reference is not None:
+                cmd += ['--reference', reference]
+
+            if manager_funcs.run_script(cmd, cwd=get_default_custom_nodes_path()) != 0:
+                return "git clone failed"
+        else:
+            res = await get_git_engine().clone(clone_url, repo_path, strategy=get_config()['clone_strategy'], reference=reference, progress=GitEngineProgress())
+            if not res.ok:
+                return res.error_message()
+
+        ok = True
+    finally:
+        # partial clone of a failed or cancelled (killed git) clone
+        leftover = not ok and not existed and os.path.exists(repo_path)
+        if leftover:
+            shutil.rmtree(repo_path, ignore_errors=True)
+
+        if not (leftover and os.path.exists(repo_path)):
+            end_install(repo_path)  # otherwise, the leftover is removed at the next startup
+
+    if reference is not None and git_mirror.uses_mirror(repo_path, reference):
+        await git_mirror.register_user(reference, repo_path)
+
+    return None
+
+
+def switch_to_default_branch_at(path):
+    repo = git.Repo(path)
+    try:
+        return switch_to_default_branch(repo)
+    finally:
+        repo.close()
+
+
+async def git_repo_update_check_with_async(path, do_fetch=False, do_update=False, no_deps=False):
+    """
+    async version of `git_repo_update_check_with`.
+    fetch/pull run through git_engine, so the event loop isn't blocked.
+
+    :return: update state * success
+    """
+    if do_fetch:
+        orig_print(f"\x1b[2K\rFetching: {path}", end='')
+    elif do_update:
+        orig_print(f"\x1b[2K\rUpdating: {path}", end='')
+
+    if not os.path.exists(os.path.join(path, '.git')):
+        raise ValueError(f'[ComfyUI-Manager] Not a valid git repository: {path}')
+
+    if not do_fetch and not do_update:
+        return await asyncio.to_thread(git_repo_update_check_with, path)
+
+    engine = get_git_engine()
+
+    info = git_utils.get_repo_info(path, prefer_tracking=False)
+    if info is None or info.remote_name is None:
+        raise ValueError(f"No remotes are configured for this repository: {path}")
+
+    if not do_update and info.is_detached:
+        res = await engine.fetch(path, info.remote_name, info.remote_url)
+        return True, res.ok  # detached branch is treated as updatable
+
+    if info.is_detached:
+        if not await asyncio.to_thread(switch_to_default_branch_at, path):
+            raise ValueError(f"Failed to switch detached branch to default branch: {path}")
+
+    res = await engine.fetch(path, info.remote_name, info.remote_url)
+    if not res.ok:
+        print(f"\nFetching failed: {path}\n{res.error_message()}", file=sys.stderr)
+        return False, False
+
+    info = git_utils.get_repo_info(path, prefer_tracking=False)
+
+    if not do_update:
+        # compare with the fetched remote head
+        return await asyncio.to_thread(git_repo_update_check_with, path)
+
+    commit_hash = info.commit_hash
+
+    if await engine.is_dirty(path):
+        print(f"\nSTASH: '{path}' is dirty.")
+        await engine.stash(path)
+
+    if info.remote_commit_hash is None:
+        # the tracked branch is gone on the remote
+        if not await asyncio.to_thread(switch_to_default_branch_at, path):
+            raise ValueError(f"Failed to switch to default branch while updating: {path}")
+
+        info = git_utils.get_repo_info(path, prefer_tracking=False)
+        if info is None or info.remote_commit_hash is None:
+            return False, False
+
+    if commit_hash == info.remote_commit_hash:
+        return False, True
+
+    res = await engine.pull(path, info.remote_name, info.branch, info.remote_url)
+    if not res.ok:
+        print(f"\nUpdating failed: {path}\n{res.error_message()}", file=sys.stderr)
+        return False, False
+
+    await engine.submodule_update(path)
+
+    if git_utils.get_commit_hash(path) != commit_hash:
+        await asyncio.to_thread(execute_install_script, None, path, no_deps=no_deps)
+        print(f"\x1b[2K\rUpdated: {path}")
+        return True, True
+
+    return False, False
+
+
 def git_repo_update_check_with(path, do_fetch=False, do_update=False, no_deps=False):
     """
 
@@ -1946,6 +2431,21 @@ def git_repo_update_check_with(path, do_fetch=False, do_update=False, no_deps=Fa
     if not os.path.exists(os.path.join(path, '.git')):
         raise ValueError(f'[ComfyUI-Manager] Not a valid git repository: {path}')
 
+    if not do_fetch and not do_update:
+        # fast path: compare the local and remote heads from the git metadata without GitPython
+        info = git_utils.get_repo_info(path, prefer_tracking=False)
+        if info is not None and info.remote_name is not None:
+            if info.is_detached:
+                return True, True  # detached branch is treated as updatable
+
+            if info.remote_commit_hash is None:
+                return True, True  # Assuming there's an update if it's not the default branch.
+
+            if info.commit_hash == info.remote_commit_hash:
+                return False, True
+
+            # diverged: the commit dates are compared below
+
     if platform.system() == "Windows":
         updated, success = __win_check_git_update(path, do_fetch, do_update)
         if updated and success:
@@ -2047,15 +2547,15 @@ def git_repo_update_check_with(path, do_fetch=False, do_update=False, no_deps=Fa
     return False, True
 
 
-class GitProgress(RemoteProgress):
+class GitEngineProgress:
+    """ progress callback of git_engine operations """
     def __init__(self):
-        super().__init__()
         self.pbar = tqdm()
 
-    def update(self, op_code, cur_count, max_count=None, message=''):
+    def __call__(self, stage, cur_count, max_count):
+        self.pbar.set_description(stage, refresh=False)
         self.pbar.total = max_count
         self.pbar.n = cur_count
-        self.pbar.pos = 0
         self.pbar.refresh()
 
 
@@ -2073,7 +2573,7 @@ def is_valid_url(url):
     return False
 
 
-async def gitclone_install(url, instant_execution=False, msg_prefix='', no_deps=False):
+async def gitclone_install(url, instant_execution=False, msg_prefix='', no_deps=False, return_postinstall=False):
     await unified_manager.reload('cache')
     await unified_manager.get_custom_nodes('default', 'cache')
 
@@ -2090,7 +2590,7 @@ async def gitclone_install(url, instant_execution=False, msg_prefix='', no_deps=
         cnr = unified_manager.get_cnr_by_repo(url)
         if cnr:
             cnr_id = cnr['id']
-            return await unified_manager.install_by_id(cnr_id, version_spec='nightly', channel='default', mode='cache')
+            return await unified_manager.install_by_id(cnr_id, version_spec='nightly', channel='default', mode='cache', return_postinstall=return_postinstall)
         else:
             repo_name = os.path.splitext(os.path.basename(url))[0]
 
@@ -2118,16 +2618,19 @@ async def gitclone_install(url, instant_execution=False, msg_prefix='', no_deps=
             # Clone the repository from the remote URL
             clone_url = git_utils.get_url_for_clone(url)
 
-            if not instant_execution and platform.system() == 'Windows':
-                res = manager_funcs.run_script([sys.executable, git_script_path, "--clone", get_default_custom_nodes_path(), clone_url, repo_path], cwd=get_default_custom_nodes_path())
-                if res != 0:
-                    return result.fail(f"Failed to clone '{clone_url}' into  '{repo_path}'")
-            else:
-                repo = git.Repo.clone_from(clone_url, repo_path, recursive=True, progress=GitProgress())
-                repo.git.clear_cache()
-                repo.close()
+            err = await clone_git_repo(clone_url, repo_path, instant_execution=instant_execution)
+            if err is not None:
+                return result.fail(f"Failed to clone '{clone_url}' into  '{repo_path}': {err}")
+
+            result.to_path = repo_path
+
+            def postinstall():
+                return execute_install_script(url, repo_path, instant_execution=instant_execution, no_deps=no_deps)
 
-            execute_install_script(url, repo_path, instant_execution=instant_execution, no_deps=no_deps)
+            if return_postinstall:
+                return result.with_target(repo_path).with_postinstall(postinstall)
+
+            await asyncio.to_thread(postinstall)
             print("Installation was successful.")
             return result.with_target(repo_path)
 
@@ -2168,6 +2671,13 @@ def git_pull(path):
     return True
 
 
+def get_cache_path(uri, filename):
+    """
+    path of the cached `filename` which is fetched from `uri`
+    """
+    return os.path.join(manager_util.cache_dir, str(manager_util.simple_hash(uri))+'_'+filename)
+
+
 async def get_data_by_mode(mode, filename, channel_url=None):
     if channel_url in get_channel_dict():
         channel_url = get_channel_dict()[channel_url]
@@ -2183,8 +2693,7 @@ async def get_data_by_mode(mode, filename, channel_url=None):
             else:
                 uri = channel_url + '/' + filename
 
-            cache_uri = str(manager_util.simple_hash(uri))+'_'+filename
-            cache_uri = os.path.join(manager_util.cache_dir, cache_uri)
+            cache_uri = get_cache_path(uri, filename)
 
             if get_config()['network_mode'] == 'offline':
                 # offline network mode
@@ -2198,13 +2707,7 @@ async def get_data_by_mode(mode, filename, channel_url=None):
                         json_obj = {}  # fallback
             else:
                 # public network mode
-                if mode == "cache" and manager_util.is_file_created_within_one_day(cache_uri):
-                    json_obj = await manager_util.get_data(cache_uri)
-                else:
-                    json_obj = await manager_util.get_data(uri)
-                    with manager_util.cache_lock:
-                        with open(cache_uri, "w", encoding='utf-8') as file:
-                            json.dump(json_obj, file, indent=4, sort_keys=True)
+                json_obj = await manager_util.get_data_with_cache(uri, cache_mode=mode == "cache", stale_while_revalidate=True, cache_path=cache_uri)
     except Exception as e:
         print(f"[ComfyUI-Manager] Due to a network error, switching to local mode.\n=> {filename}\n=> {e}")
         uri = os.path.join(manager_util.comfyui_manager_path, filename)
@@ -2241,7 +2744,8 @@ def gitclone_fix(files, instant_execution=False, no_deps=False):
 
 
 def pip_install(packages):
-    install_cmd = ['#FORCE'] + manager_util.make_pip_cmd(["install", '-U']) + packages
+    # explicitly requested by the user: not restricted by the constraints of node pack dependencies
+    install_cmd = ['#FORCE'] + manager_util.make_pip_cmd(["install", '-U'], use_constraints=False) + packages
     try_install_script('pip install via manager', '..', install_cmd)
 
 
@@ -2553,7 +3057,122 @@ def simple_check_custom_node(url):
     return 'not-installed'
 
 
-def check_state_of_git_node_pack_single(item, do_fetch=False, do_update_check=True, do_update=False):
+class RemoteHeadCache:
+    """
+    Persistent cache of remote branch heads: (remote url, branch) -> (commit hash, checked time)
+
+    `put` only updates the memory; the batch of update checks calls `flush` once at the end.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = None
+        self.dirty = False
+
+    @staticmethod
+    def get_path():
+        return os.path.join(manager_util.cache_dir, 'remote-heads.json')
+
+    def _load(self):
+        if self.items is None:
+            try:
+                with open(self.get_path(), 'r', encoding='utf-8') as f:
+                    self.items = json.load(f)
+            except Exception:
+                self.items = {}
+
+    def get(self, url, branch, ttl):
+        with self.lock:
+            self._load()
+            item = self.items.get(f"{url}#{branch}")
+            if item is not None and time.time() - item['time'] < ttl:
+                return item['hash']
+        return None
+
+    def put(self, url, branch, commit_hash):
+        with self.lock:
+            self._load()
+            self.items[f"{url}#{branch}"] = dict(hash=commit_hash, time=time.time())
+            self.dirty = True
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+
+            try:
+                os.makedirs(os.path.dirname(self.get_path()), exist_ok=True)
+                with open(self.get_path(), 'w', encoding='utf-8') as f:
+                    json.dump(self.items, f)
+                self.dirty = False
+            except Exception as e:
+                logging.warning(f"[ComfyUI-Manager] Failed to save remote head cache: {e}")
+
+
+remote_head_cache = RemoteHeadCache()
+
+
+async def get_remote_head(url, branch):
+    """
+    commit hash of the remote branch via `git ls-remote` (cached for `remote_head_ttl` seconds)
+
+    :return: commit hash, '' if the remote has no such branch, None on failure
+    """
+    commit_hash = remote_head_cache.get(url, branch, get_config()['remote_head_ttl'])
+    if commit_hash is None:
+        commit_hash = await get_git_engine().ls_remote_head(url, branch)
+        if commit_hash is not None:
+            remote_head_cache.put(url, branch, commit_hash)
+
+    return commit_hash
+
+
+async def git_repo_update_check_with_ls_remote(path):
+    """
+    Update check without fetching objects: the remote head of the current branch is compared with the local HEAD.
+
+    :param path: path to git custom node
+    :return: update state * success
+    """
+    info = git_utils.get_repo_info(path, prefer_tracking=False)
+    if info is None:
+        raise ValueError(f'[ComfyUI-Manager] Not a valid git repository: {path}')
+
+    if info.remote_name is None or not info.remote_url:
+        raise ValueError(f"No remotes are configured for this repository: {path}")
+
+    if info.is_detached:
+        return True, True  # detached branch is treated as updatable
+
+    remote_head = await get_remote_head(info.remote_url, info.branch)
+
+    if remote_head is None:
+        print(f"\n[ComfyUI-Manager] Failed to check remote head: {path}", file=sys.stderr)
+        return False, False
+
+    if remote_head == '':
+        return True, True  # Assuming there's an update if it's not the default branch.
+
+    if remote_head == info.commit_hash:
+        return False, True
+
+    if remote_head == info.remote_commit_hash:
+        # the remote head was already fetched: compare the commit dates locally (e.g. local commits ahead of the remote)
+        return await asyncio.to_thread(git_repo_update_check_with, path)
+
+    return True, True
+
+
+async def check_update_of_git_repo(path):
+    """
+    update check of git node pack according to `update_check_mode` of config (fetch | ls-remote)
+    """
+    if get_config()['update_check_mode'] == 'ls-remote':
+        return await git_repo_update_check_with_ls_remote(path)
+    else:
+        return await git_repo_update_check_with_async(path, do_fetch=True)
+
+
+async def check_state_of_git_node_pack_single(item, do_fetch=False, do_update_check=True, do_update=False):
     if item['version'] == 'unknown':
         dir_path = unified_manager.unknown_active_nodes.get(item['id'])[1]
     elif item['version'] == 'nightly':
@@ -2565,7 +3184,10 @@ def check_state_of_git_node_pack_single(item, do_fetch=False, do_update_check=Tr
     if dir_path and os.path.exists(dir_path):
         if do_update_check:
             try:
-                update_state, success = git_repo_update_check_with(dir_path, do_fetch, do_update)
+                if do_fetch and not do_update:
+                    update_state, success = await check_update_of_git_repo(dir_path)
+                else:
+                    update_state, success = await git_repo_update_check_with_async(dir_path, do_fetch, do_update)
                 if (do_update_check or do_update) and update_state:
                     item['update-state'] = 'true'
                 elif do_update and not success:
@@ -2576,8 +3198,7 @@ def check_state_of_git_node_pack_single(item, do_fetch=False, do_update_check=Tr
 
 def get_installed_pip_packages():
     # extract pip package infos
-    cmd = manager_util.make_pip_cmd(['freeze'])
-    pips = subprocess.check_output(cmd, text=True).split('\n')
+    pips = manager_util.get_installed_freeze_specs()
 
     res = {}
     for x in pips:
@@ -2593,6 +3214,17 @@ def get_installed_pip_packages():
     return res
 
 
+def get_git_snapshot_info(fullpath):
+    """
+    :return: (remote url, commit hash) of the git node pack
+    """
+    info = git_utils.get_repo_info(fullpath)
+    if info is None or info.remote_url is None or info.commit_hash is None:
+        raise ValueError(f"Cannot read git metadata: {fullpath}")
+
+    return info.remote_url, info.commit_hash
+
+
 async def get_current_snapshot(custom_nodes_only = False):
     await unified_manager.reload('cache')
     await unified_manager.get_custom_nodes('default', 'cache')
@@ -2609,6 +3241,7 @@ async def get_current_snapshot(custom_nodes_only = False):
     git_custom_nodes = {}
     cnr_custom_nodes = {}
     file_custom_nodes = []
+    node_pack_paths = []
 
     # Get custom nodes hash
     for custom_nodes_dir in get_custom_nodes_paths():
@@ -2626,49 +3259,56 @@ async def get_current_snapshot(custom_nodes_only = False):
             fullpath = os.path.join(custom_nodes_dir, path)
 
             if os.path.isdir(fullpath):
-                is_disabled = path.endswith(".disabled") or os.path.basename(os.path.dirname(fullpath)) == ".disabled"
+                node_pack_paths.append(os.path.normpath(fullpath))
 
-                try:
-                    info = unified_manager.resolve_from_path(fullpath)
+            elif path.endswith('.py'):
+                is_disabled = path.endswith(".py.disabled")
+                filename = os.path.basename(path)
+                item = {
+                    'filename': filename,
+                    'disabled': is_disabled
+                }
 
-                    if info is None:
-                        continue
+                file_custom_nodes.append(item)
 
-                    if info['ver'] not in ['nightly', 'latest', 'unknown']:
-                        if is_disabled:
-                            continue  # don't restore disabled state of CNR node.
+    # node packs are resolved/inspected in parallel (mostly cache hits of the reload above)
+    resolutions = unified_manager.resolve_paths(node_pack_paths)
 
-                        cnr_custom_nodes[info['id']] = info['ver']
-                    else:
-                        repo = git.Repo(fullpath)
+    git_targets = []
+    for fullpath, resolution in zip(node_pack_paths, resolutions):
+        if resolution is None:
+            print(f"Failed to extract snapshots for the custom node '{os.path.basename(fullpath)}'.")
+            continue
 
-                        if repo.head.is_detached:
-                            remote_name = get_remote_name(repo)
-                        else:
-                            current_branch = repo.active_branch
+        if not resolution.resolved:
+            continue
 
-                            if current_branch.tracking_branch() is None:
-                                remote_name = get_remote_name(repo)
-                            else:
-                                remote_name = current_branch.tracking_branch().remote_name
+        node_package = resolution.package
+        if node_package.version not in ['nightly', 'latest', 'unknown']:
+            if node_package.is_disabled:
+                continue  # don't restore disabled state of CNR node.
 
-                        commit_hash = repo.head.commit.hexsha
+            cnr_custom_nodes[node_package.id] = node_package.version
+        else:
+            git_targets.append(node_package)
 
-                        url = repo.remotes[remote_name].url
+    def get_git_info(node_package):
+        try:
+            return get_git_snapshot_info(node_package.fullpath)
+        except Exception:
+            return None
 
-                        git_custom_nodes[url] = dict(hash=commit_hash, disabled=is_disabled)
-                except:
-                    print(f"Failed to extract snapshots for the custom node '{path}'.")
+    workers = max(1, min(get_config()['resolve_workers'], len(git_targets)))
+    with ThreadPoolExecutor(workers) as executor:
+        git_infos = list(executor.map(get_git_info, git_targets))
 
-            elif path.endswith('.py'):
-                is_disabled = path.endswith(".py.disabled")
-                filename = os.path.basename(path)
-                item = {
-                    'filename': filename,
-                    'disabled': is_disabled
-                }
+    for node_package, git_info in zip(git_targets, git_infos):
+        if git_info is None:
+            print(f"Failed to extract snapshots for the custom node '{os.path.basename(node_package.fullpath)}'.")
+            continue
 
-                file_custom_nodes.append(item)
+        url, commit_hash = git_info
+        git_custom_nodes[url] = dict(hash=commit_hash, disabled=node_package.is_disabled)
 
     pip_packages = None if custom_nodes_only else get_installed_pip_packages()
 
@@ -2862,15 +3502,18 @@ async def get_unified_total_nodes(channel, mode, regsitry_cache_mode='cache'):
 
     res = await unified_manager.get_custom_nodes(channel, mode)
 
+    # every node is looked up: use the in-memory index of the registry store
+    cnr_map, repo_cnr_map = unified_manager.registry_store.get_index()
+
     # collect pure cnr ids (i.e. not exists in custom-node-list.json)
     # populate state/updatable field to non-pure cnr nodes
-    cnr_ids = set(unified_manager.cnr_map.keys())
+    cnr_ids = set(cnr_map.keys())
     for k, v in res.items():
         # resolve cnr_id from repo url
         files_in_json = v.get('files', [])
         cnr_id = None
         if len(files_in_json) == 1:
-            cnr = unified_manager.get_cnr_by_repo(files_in_json[0])
+            cnr = repo_cnr_map.get(git_utils.normalize_url(files_in_json[0]))
             if cnr:
                 cnr_id = cnr['id']
 
@@ -2878,7 +3521,7 @@ async def get_unified_total_nodes(channel, mode, regsitry_cache_mode='cache'):
             # cnr or nightly version
             cnr_ids.remove(cnr_id)
             updatable = False
-            cnr = unified_manager.cnr_map[cnr_id]
+            cnr = cnr_map[cnr_id]
 
             if cnr_id in invalid_nodes:
                 v['invalid-installation'] = True
@@ -2887,7 +3530,7 @@ async def get_unified_total_nodes(channel, mode, regsitry_cache_mode='cache'):
                 # installed
                 v['state'] = 'enabled'
                 if unified_manager.active_nodes[cnr_id][0] != 'nightly':
-                    updatable = unified_manager.is_updatable(cnr_id)
+                    updatable = unified_manager.is_updatable(cnr_id, cnr)
                 else:
                     updatable = False
                 v['active_version'] = unified_manager.active_nodes[cnr_id][0]
@@ -2937,7 +3580,7 @@ async def get_unified_total_nodes(channel, mode, regsitry_cache_mode='cache'):
     if normalize_channel(channel) == DEFAULT_CHANNEL:
         # Don't show CNR nodes unless default channel
         for cnr_id in cnr_ids:
-            cnr = unified_manager.cnr_map[cnr_id]
+            cnr = cnr_map[cnr_id]
             author = cnr['publisher']['name']
             title = cnr['name']
             reference = f"https://registry.comfy.org/nodes/{cnr['id']}"
@@ -2952,7 +3595,7 @@ async def get_unified_total_nodes(channel, mode, regsitry_cache_mode='cache'):
             if cnr_id in unified_manager.active_nodes:
                 # installed
                 state = 'enabled'
-                updatable = unified_manager.is_updatable(cnr_id)
+                updatable = unified_manager.is_updatable(cnr_id, cnr)
                 active_version = unified_manager.active_nodes[cnr['id']][0]
                 ver = active_version
 
@@ -3012,7 +3655,29 @@ def populate_favorites(node_packs, json_obj_extras):
                 v['is_favorite'] = True
 
 
-async def restore_snapshot(snapshot_path, git_helper_extras=None):
+async def get_requirement_files():
+    """
+    requirements.txt of ComfyUI and every enabled node pack
+    """
+    await unified_manager.reload('cache')
+
+    res = [os.path.join(comfy_path, 'requirements.txt')]
+    for _, path in list(unified_manager.active_nodes.values()) + list(unified_manager.unknown_active_nodes.values()):
+        requirements_path = os.path.join(path, 'requirements.txt')
+        if os.path.exists(requirements_path):
+            res.append(requirements_path)
+
+    return res
+
+
+async def generate_pip_lock(lock_path):
+    return pip_lock.generate_lock(await get_requirement_files(), lock_path, remap=remap_pip_package)
+
+
+async def restore_snapshot(snapshot_path, git_helper_extras=None, pip_lock_path=None):
+    """
+    :param pip_lock_path: lockfile (see `generate_pip_lock`) to sync the pip packages with after the node packs are restored
+    """
     cloned_repos = []
     checkout_repos = []
     enabled_repos = []
@@ -3022,6 +3687,8 @@ async def restore_snapshot(snapshot_path, git_helper_extras=None):
     installed_node_packs = []
     failed = []
 
+    no_deps = pip_lock_path is not None  # the lockfile provides the dependencies
+
     await unified_manager.reload('cache')
     await unified_manager.get_custom_nodes('default', 'cache')
 
@@ -3061,6 +3728,10 @@ async def restore_snapshot(snapshot_path, git_helper_extras=None):
                         else:
                             skip_node_packs.append(k)
 
+            # resolve every required cnr version in one round
+            await cnr_utils.resolve_node_versions(todo_checkout + [(k, v) for k, v in cnr_info.items()
+                                                                   if 'comfyui-manager' not in k and k not in unified_manager.active_nodes])
+
             for x in todo_disable:
                 unified_manager.unified_disable(x, False)
                 disabled_repos.append(x)
@@ -3079,7 +3750,7 @@ async def restore_snapshot(snapshot_path, git_helper_extras=None):
                 if 'comfyui-manager' in k:
                     continue
 
-                ps = await unified_manager.install_by_id(k, version_spec=v, instant_execution=True, return_postinstall=True)
+                ps = await unified_manager.install_by_id(k, version_spec=v, instant_execution=True, no_deps=no_deps, return_postinstall=True)
                 if ps.action == 'install-cnr' and ps.result:
                     installed_node_packs.append(f"{k}@{v}")
 
@@ -3162,7 +3833,7 @@ async def restore_snapshot(snapshot_path, git_helper_extras=None):
                 cnr = unified_manager.repo_cnr_map.get(normalized_url)
                 if cnr is not None:
                     pack_id = cnr['id']
-                    res = await unified_manager.install_by_id(pack_id, 'nightly', instant_execution=True, no_deps=False, return_postinstall=False)
+                    res = await unified_manager.install_by_id(pack_id, 'nightly', instant_execution=True, no_deps=no_deps, return_postinstall=False)
                     if res.action == 'install-git' and res.result:
                         cloned_repos.append(pack_id)
                     elif res.action == 'skip':
@@ -3243,7 +3914,7 @@ async def restore_snapshot(snapshot_path, git_helper_extras=None):
             repo_name = repo_name[:-4]
 
         to_path = os.path.join(get_default_custom_nodes_path(), repo_name)
-        unified_manager.repo_install(repo_url, to_path, instant_execution=True, no_deps=False, return_postinstall=False)
+        await unified_manager.repo_install(repo_url, to_path, instant_execution=True, no_deps=no_deps, return_postinstall=False)
         cloned_repos.append(repo_name)
 
     # print summary
@@ -3264,6 +3935,9 @@ async def restore_snapshot(snapshot_path, git_helper_extras=None):
     for x in failed:
         print(f"[  FAILED   ] {x}")
 
+    if pip_lock_path is not None and not pip_lock.sync_lock(pip_lock_path):
+        print(f"[  FAILED   ] {pip_lock_path}")
+
     # if is_failed:
     #     print("[bold red]ERROR: Failed to restore snapshot.[/bold red]")
 
@@ -3336,12 +4010,52 @@ def resolve_giturl_from_path(fullpath):
     return None
 
 
+def ensure_commit_available(repo, commit_hash):
+    """
+    Make `commit_hash` available locally, deepening a shallow clone on demand.
+
+    :return: False if the commit cannot be fetched
+    """
+    try:
+        repo.git.cat_file('-e', f'{commit_hash}^{{commit}}')
+        return True
+    except git.GitCommandError:
+        pass
+
+    remote_name = get_remote_name(repo)
+    if remote_name is None:
+        return False
+
+    is_shallow = os.path.exists(os.path.join(repo.git_dir, 'shallow'))
+
+    print(f"[ComfyUI-Manager] Fetching commit '{commit_hash}' of '{repo.working_dir}'")
+    try:
+        # only the required commit (the remote must allow fetching a reachable commit by its hash)
+        if is_shallow:
+            repo.git.fetch('--depth=1', remote_name, commit_hash)
+        else:
+            repo.git.fetch(remote_name, commit_hash)
+        return True
+    except git.GitCommandError:
+        pass
+
+    try:
+        if is_shallow:
+            repo.git.fetch('--unshallow', remote_name)
+        else:
+            repo.git.fetch(remote_name)
+        return True
+    except git.GitCommandError:
+        return False
+
+
 def repo_switch_commit(repo_path, commit_hash):
     try:
         repo = git.Repo(repo_path)
         if repo.head.commit.hexsha == commit_hash:
             return False
 
+        ensure_commit_available(repo, commit_hash)
         repo.git.checkout(commit_hash)
         return True
     except:
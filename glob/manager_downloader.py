@@ -1,12 +1,14 @@
 import os
 from urllib.parse import urlparse
-import urllib
 import sys
 import logging
+import shutil
 import requests
 from huggingface_hub import HfApi
 from tqdm.auto import tqdm
 
+import manager_util
+
 
 aria2 = os.getenv('COMFYUI_MANAGER_ARIA2_SERVER')
 HF_ENDPOINT = os.getenv('HF_ENDPOINT')
@@ -22,10 +24,13 @@ if aria2 is not None:
     aria2 = aria2p.API(aria2p.Client(host=host, port=port, secret=secret))
 
 
-def basic_download_url(url, dest_folder: str, filename: str):
+def basic_download_url(url, dest_folder: str, filename: str, headers=None):
     '''
     Download file from url to dest_folder with filename
     using requests library.
+
+    The file is written to `<filename>.part` and renamed when it is completed.
+    An interrupted download is resumed from the `.part` file if the server supports range requests.
     '''
     import requests
 
@@ -35,16 +40,46 @@ def basic_download_url(url, dest_folder: str, filename: str):
 
     # Full path to save the file
     dest_path = os.path.join(dest_folder, filename)
+    part_path = dest_path + '.part'
+
+    headers = dict(headers or {})
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset > 0:
+        headers['Range'] = f'bytes={offset}-'
 
     # Download the file
-    response = requests.get(url, stream=True)
-    if response.status_code == 200:
-        with open(dest_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:
-                    file.write(chunk)
-    else:
-        raise Exception(f"Failed to download file from {url}")
+    with requests.get(url, stream=True, headers=headers, timeout=60) as response:
+        if response.status_code == 416 and offset > 0:
+            # the `.part` file is already complete
+            os.replace(part_path, dest_path)
+            return
+
+        if response.status_code == 206 and offset > 0:
+            mode = 'ab'
+            logging.info(f"[ComfyUI-Manager] Resume download: {filename} (from {offset} bytes)")
+        elif response.status_code == 200:
+            mode = 'wb'
+            offset = 0
+        else:
+            raise Exception(f"Failed to download file from {url}")
+
+        total = response.headers.get('Content-Length')
+        total = int(total) + offset if total is not None else None
+
+        try:
+            with open(part_path, mode) as file, tqdm(total=total, initial=offset, unit='B', unit_scale=True, desc=filename) as progress:
+                for chunk in response.iter_content(chunk_size=1024*1024):
+                    manager_util.check_cancelled()
+                    if chunk:
+                        file.write(chunk)
+                        progress.update(len(chunk))
+                        manager_util.report_progress(progress.n, total)
+        except manager_util.TaskCancelled:
+            # a cancelled download isn't resumed
+            os.remove(part_path)
+            raise
+
+    os.replace(part_path, dest_path)
 
 
 def download_url(model_url: str, model_dir: str, filename: str):
@@ -54,8 +89,11 @@ def download_url(model_url: str, model_dir: str, filename: str):
     if aria2:
         return aria2_download_url(model_url, model_dir, filename)
     else:
-        from torchvision.datasets.utils import download_url as torchvision_download_url
-        return torchvision_download_url(model_url, model_dir, filename)
+        if os.path.exists(os.path.join(model_dir, filename)):
+            logging.info(f"[ComfyUI-Manager] Using downloaded file: {os.path.join(model_dir, filename)}")
+            return
+
+        return basic_download_url(model_url, model_dir, filename)
 
 
 def aria2_find_task(dir: str, filename: str):
@@ -98,6 +136,13 @@ def aria2_download_url(model_url: str, model_dir: str, filename: str):
                 if progress_bar.total == 0 and download.total_length != 0:
                     progress_bar.reset(download.total_length)
                 progress_bar.update(download.completed_length - progress_bar.n)
+                manager_util.report_progress(download.completed_length, download.total_length)
+
+                ctx = manager_util.get_task_context()
+                if ctx is not None and ctx.cancelled:
+                    aria2.remove([download], force=True, files=True)
+                    raise manager_util.TaskCancelled()
+
                 time.sleep(1)
                 download.update()
 
@@ -107,15 +152,7 @@ def download_url_with_agent(url, save_path):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
 
-        req = urllib.request.Request(url, headers=headers)
-        response = urllib.request.urlopen(req)
-        data = response.read()
-
-        if not os.path.exists(os.path.dirname(save_path)):
-            os.makedirs(os.path.dirname(save_path))
-
-        with open(save_path, 'wb') as f:
-            f.write(data)
+        basic_download_url(url, os.path.dirname(save_path), os.path.basename(save_path), headers=headers)
 
     except Exception as e:
         print(f"Download error: {url} / {e}", file=sys.stderr)
@@ -129,6 +166,7 @@ def download_repo_in_bytes(repo_id, local_dir):
     api = HfApi()
     repo_info = api.repo_info(repo_id=repo_id, files_metadata=True)
 
+    created = not os.path.exists(local_dir)
     os.makedirs(local_dir, exist_ok=True)
 
     total_size = 0
@@ -138,22 +176,29 @@ def download_repo_in_bytes(repo_id, local_dir):
 
     pbar = tqdm(total=total_size, unit="B", unit_scale=True, desc="Downloading")
 
-    for file_info in repo_info.siblings:
-        out_path = os.path.join(local_dir, file_info.rfilename)
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-
-        if file_info.size is None:
-            continue
-
-        download_url = f"https://huggingface.co/{repo_id}/resolve/main/{file_info.rfilename}"
+    try:
+        for file_info in repo_info.siblings:
+            out_path = os.path.join(local_dir, file_info.rfilename)
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
 
-        with requests.get(download_url, stream=True) as r, open(out_path, "wb") as f:
-            r.raise_for_status()
-            for chunk in r.iter_content(chunk_size=65536):
-                if chunk:
-                    f.write(chunk)
-                    pbar.update(len(chunk))
+            if file_info.size is None:
+                continue
 
-    pbar.close()
+            download_url = f"https://huggingface.co/{repo_id}/resolve/main/{file_info.rfilename}"
+
+            with requests.get(download_url, stream=True) as r, open(out_path, "wb") as f:
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=65536):
+                    manager_util.check_cancelled()
+                    if chunk:
+                        f.write(chunk)
+                        pbar.update(len(chunk))
+                        manager_util.report_progress(pbar.n, total_size)
+    except manager_util.TaskCancelled:
+        if created:
+            shutil.rmtree(local_dir, ignore_errors=True)
+        raise
+    finally:
+        pbar.close()
 
 
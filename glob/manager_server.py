@@ -22,6 +22,9 @@ import asyncio
 import queue
 
 import manager_downloader
+import task_journal
+import task_scheduler
+from task_batch import get_task_target, dedupe_tasks
 
 
 logging.info(f"### Loading: ComfyUI-Manager ({core.version_str})")
@@ -100,22 +103,57 @@ def is_allowed_security_level(level):
         return True
 
 
-async def get_risky_level(files, pip_packages):
+DEFAULT_CHANNEL_RAW_URL = 'https://raw.githubusercontent.com/ltdrdata/ComfyUI-Manager/main'
+allowlist_cache = None  # (identity of the source files, (urls, pip packages))
+
+
+def get_allowlist_identity():
+    paths = [os.path.join(manager_util.comfyui_manager_path, 'custom-node-list.json'),
+             core.get_cache_path(f"{DEFAULT_CHANNEL_RAW_URL}/custom-node-list.json", 'custom-node-list.json')]
+
+    res = []
+    for x in paths:
+        try:
+            res.append(manager_util.ParsedJsonCache.file_identity(x))
+        except OSError:
+            res.append(None)
+
+    return res
+
+
+async def get_allowlist_index():
+    """
+    urls and pip packages of the known node packs (local + default channel).
+    The index is rebuilt only when the source lists are changed.
+
+    :return: (urls, pip packages)
+    """
+    global allowlist_cache
+
+    if allowlist_cache is not None and allowlist_cache[0] == get_allowlist_identity():
+        return allowlist_cache[1]
+
     json_data1 = await core.get_data_by_mode('local', 'custom-node-list.json')
-    json_data2 = await core.get_data_by_mode('cache', 'custom-node-list.json', channel_url='https://raw.githubusercontent.com/ltdrdata/ComfyUI-Manager/main')
+    json_data2 = await core.get_data_by_mode('cache', 'custom-node-list.json', channel_url=DEFAULT_CHANNEL_RAW_URL)
 
     all_urls = set()
-    for x in json_data1['custom_nodes'] + json_data2['custom_nodes']:
+    all_pip_packages = set()
+    for x in json_data1.get('custom_nodes', []) + json_data2.get('custom_nodes', []):
         all_urls.update(x.get('files', []))
+        all_pip_packages.update(x.get('pip', []))
+
+    index = all_urls, all_pip_packages
+    allowlist_cache = get_allowlist_identity(), index
+    return index
+
+
+async def get_risky_level(files, pip_packages):
+    all_urls, all_pip_packages = await get_allowlist_index()
 
     for x in files:
         if x not in all_urls:
             return "high"
 
-    all_pip_packages = set()
-    for x in json_data1['custom_nodes'] + json_data2['custom_nodes']:
-        all_pip_packages.update(x.get('pip', []))
-
     for p in pip_packages:
         if p not in all_pip_packages:
             return "block"
@@ -141,6 +179,11 @@ class ManagerFuncsInComfyUI(core.ManagerFuncs):
 
         process = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1, env=core.get_script_env())
 
+        # killed when the running task is cancelled
+        ctx = manager_util.get_task_context()
+        if ctx is not None:
+            ctx.add_process(process)
+
         stdout_thread = threading.Thread(target=handle_stream, args=(process.stdout, ""))
         stderr_thread = threading.Thread(target=handle_stream, args=(process.stderr, "[!]"))
 
@@ -150,7 +193,11 @@ class ManagerFuncsInComfyUI(core.ManagerFuncs):
         stdout_thread.join()
         stderr_thread.join()
 
-        return process.wait()
+        try:
+            return process.wait()
+        finally:
+            if ctx is not None:
+                ctx.remove_process(process)
 
 
 core.manager_funcs = ManagerFuncsInComfyUI()
@@ -267,7 +314,6 @@ setup_environment()
 # Expand Server api
 
 from aiohttp import web
-import aiohttp
 import json
 import zipfile
 import urllib.request
@@ -335,7 +381,7 @@ def get_model_path(data, show_log=False):
             return os.path.join(base_model, data['filename'])
 
 
-def check_state_of_git_node_pack(node_packs, do_fetch=False, do_update_check=True, do_update=False):
+async def check_state_of_git_node_pack(node_packs, do_fetch=False, do_update_check=True, do_update=False):
     if do_fetch:
         print("Start fetching...", end="")
     elif do_update:
@@ -343,13 +389,16 @@ def check_state_of_git_node_pack(node_packs, do_fetch=False, do_update_check=Tru
     elif do_update_check:
         print("Start update check...", end="")
 
-    def process_custom_node(item):
-        core.check_state_of_git_node_pack_single(item, do_fetch, do_update_check, do_update)
+    # concurrency is bounded by git_engine
+    tasks = []
+    for k, v in node_packs.items():
+        if v.get('active_version') in ['unknown', 'nightly']:
+            tasks.append(core.check_state_of_git_node_pack_single(v, do_fetch, do_update_check, do_update))
 
-    with concurrent.futures.ThreadPoolExecutor(4) as executor:
-        for k, v in node_packs.items():
-            if v.get('active_version') in ['unknown', 'nightly']:
-                executor.submit(process_custom_node, v)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        core.remote_head_cache.flush()
 
     if do_fetch:
         print("\x1b[2K\rFetching done.")
@@ -391,19 +440,149 @@ def nickname_filter(json_obj):
     return json_obj
 
 
-task_queue = queue.Queue()
+task_queue = queue.Queue()  # task_scheduler.Task which isn't taken by the scheduler yet
 nodepack_result = {}
 model_result = {}
+finished_tasks = []  # (task, state, result) of the finished tasks. (see /manager/queue/tasks)
 tasks_in_progress = set()
 task_worker_lock = threading.Lock()
+scheduler = None  # task_scheduler.TaskScheduler of the running task worker
+journal = task_journal.TaskJournal(os.path.join(core.manager_files_path, 'task-queue.db'))
+
+
+enqueue_lock = threading.RLock()
+
+
+class QueueRequestError(Exception):
+    def __init__(self, status, text=None):
+        super().__init__(text)
+        self.status = status
+        self.text = text
+
+    def to_response(self):
+        return web.Response(status=self.status, text=self.text)
+
+
+def is_node_pack_installed(node_id):
+    """ True if the node pack is installed, either enabled or disabled """
+    m = core.unified_manager
+    return any(node_id in x for x in [m.active_nodes, m.unknown_active_nodes,
+                                      m.cnr_inactive_nodes, m.nightly_inactive_nodes, m.unknown_inactive_nodes])
+
+
+def remove_pending_tasks(predicate):
+    """
+    Remove the queued tasks which aren't started yet.
+
+    :param predicate: callable(task_scheduler.Task) -> True to remove
+    :return: removed tasks
+    """
+    removed = []
+    with task_queue.mutex:
+        remained = []
+        for x in task_queue.queue:
+            (removed if predicate(x) else remained).append(x)
+        task_queue.queue.clear()
+        task_queue.queue.extend(remained)
+
+    if scheduler is not None:
+        removed += scheduler.remove_pending(predicate)
+
+    for x in removed:
+        if x.task_id is not None:
+            journal.discard(x.task_id)
+
+    return removed
+
+
+def make_task(kind, item, priority=task_scheduler.NORMAL, task_id=None, resumed=False):
+    resource, key = get_task_resource(kind, item)
+    return task_scheduler.Task(kind, item, resource, key, task_id=task_id, resumed=resumed, priority=priority)
+
+
+def enqueue_task(kind, item, priority=task_scheduler.NORMAL):
+    """
+    Queue a task. A pending task of the same kind for the same UI item is replaced.
+
+    :param priority: lane of the task (see task_scheduler)
+    """
+    with enqueue_lock:
+        ui_id = item[0]
+        if remove_pending_tasks(lambda x: x.kind == kind and x.item[0] == ui_id and ui_id is not None):
+            logging.info(f"[ComfyUI-Manager] The pending '{kind}' task of '{ui_id}' is replaced.")
+
+        task_id = journal.enqueue(kind, item, priority)
+        task_queue.put(make_task(kind, item, priority, task_id))
+
+
+def enqueue_tasks(tasks, priority=task_scheduler.NORMAL):
+    """
+    Queue tasks at once. (not interleaved with the other requests)
+    """
+    with enqueue_lock:
+        for kind, item in tasks:
+            enqueue_task(kind, item, priority)
+
+
+async def enqueue_request(make_task_awaitable):
+    """
+    Queue the task of a single endpoint. (interactive lane)
+
+    :param make_task_awaitable: awaitable of `make_*_task`
+    """
+    try:
+        task = await make_task_awaitable
+    except QueueRequestError as e:
+        return e.to_response()
+
+    if task is not None:
+        enqueue_task(*task, priority=task_scheduler.INTERACTIVE)
+
+    return web.Response(status=200)
+
+
+# running tasks of these kinds can't be interrupted safely. (e.g. checkout of ComfyUI itself by GitPython)
+uncancellable_kinds = ['update-comfyui']
+
+
+def get_cancelled_result(kind):
+    if kind in ['update', 'update-main']:
+        return {'msg': 'cancelled'}
+
+    return 'cancelled'
+
+
+def record_task_result(kind, item, msg):
+    """
+    NOTE: must be called with `task_worker_lock`
+
+    :return: ui_target of the result
+    """
+    ui_id = item[0]
+    if kind == 'install-model':
+        model_result[ui_id] = msg
+        return "model_manager"
+    elif kind == 'update-main':
+        nodepack_result[ui_id] = msg
+        return "main"
+    elif kind == 'update-comfyui':
+        nodepack_result['comfyui'] = msg
+        return "main"
+    elif kind == 'update':
+        nodepack_result[ui_id] = msg['msg']
+        return "nodepack_manager"
+    else:
+        nodepack_result[ui_id] = msg
+        return "nodepack_manager"
+
 
 async def task_worker():
-    global task_queue
     global nodepack_result
     global model_result
     global tasks_in_progress
+    global scheduler
 
-    async def do_install(item) -> str:
+    async def do_install(item, resumed=False) -> str:
         ui_id, node_spec_str, channel, mode, skip_post_install = item
 
         try:
@@ -414,6 +593,15 @@ async def task_worker():
 
             node_name, version_spec, is_specified = node_spec
             res = await core.unified_manager.install_by_id(node_name, version_spec, channel, mode, return_postinstall=skip_post_install)
+
+            if resumed and res.action == 'skip' and res.result and not skip_post_install:
+                # the node pack is installed by the interrupted task, but its dependencies may not be
+                logging.info(f"[ComfyUI-Manager] Resume the installation of dependencies: {node_name}@{version_spec}")
+                res = core.unified_manager.unified_fix(node_name, version_spec)
+                if not res.result:
+                    logging.error(f"[ComfyUI-Manager] Installation failed:\n{res.msg}")
+                    return res.msg
+
             # discard post install if skip_post_install mode
 
             if res.action not in ['skip', 'enable', 'install-git', 'install-cnr', 'switch-cnr']:
@@ -433,7 +621,7 @@ async def task_worker():
         ui_id, node_name, node_ver = item
 
         try:
-            res = core.unified_manager.unified_update(node_name, node_ver)
+            res = await core.unified_manager.unified_update_async(node_name, node_ver)
 
             if res.ver == 'unknown':
                 url = core.unified_manager.unknown_active_nodes[node_name][0]
@@ -442,8 +630,6 @@ async def task_worker():
                 url = core.unified_manager.cnr_map[node_name].get('repository')
                 title = core.unified_manager.cnr_map[node_name]['name']
 
-            manager_util.clear_pip_cache()
-
             if url is not None:
                 base_res = {'url': url, 'title': title}
             else:
@@ -497,7 +683,7 @@ async def task_worker():
         ui_id, node_name, node_ver = item
 
         try:
-            res = core.unified_manager.unified_fix(node_name, node_ver)
+            res = await asyncio.to_thread(core.unified_manager.unified_fix, node_name, node_ver)
 
             if res.result:
                 return 'success'
@@ -539,6 +725,20 @@ async def task_worker():
 
         return f"Failed to disable: '{node_name}'"
 
+    async def do_enable(item) -> str:
+        ui_id, cnr_id = item
+
+        try:
+            res = core.unified_manager.unified_enable(cnr_id)
+
+            if res:
+                return 'success'
+
+        except Exception:
+            traceback.print_exc()
+
+        return f"Failed to enable: '{cnr_id}'"
+
     async def do_install_model(item) -> str:
         ui_id, json_data = item
 
@@ -589,29 +789,32 @@ async def task_worker():
 
     stats = {}
 
-    while True:
+    def fetch_tasks():
+        # move the queued tasks into the scheduler
+        res = []
+        while True:
+            try:
+                res.append(task_queue.get_nowait())
+            except queue.Empty:
+                return res
+
+    def get_counts():
+        pending_count, running_count = scheduler.counts()
         done_count = len(nodepack_result) + len(model_result)
-        total_count = done_count + task_queue.qsize()
-
-        if task_queue.empty():
-            logging.info(f"\n[ComfyUI-Manager] Queued works are completed.\n{stats}")
+        return done_count + running_count + pending_count + task_queue.qsize(), done_count
 
-            logging.info("\nAfter restarting ComfyUI, please refresh the browser.")
-            PromptServer.instance.send_sync("cm-queue-status",
-                                            {'status': 'done',
-                                             'nodepack_result': nodepack_result, 'model_result': model_result,
-                                             'total_count': total_count, 'done_count': done_count})
-            nodepack_result = {}
-            task_queue = queue.Queue()
-            return  # terminate worker thread
+    async def execute(task):
+        kind, item = task.kind, task.item
 
         with task_worker_lock:
-            kind, item = task_queue.get()
             tasks_in_progress.add((kind, item[0]))
 
+        if task.task_id is not None:
+            journal.start(task.task_id)
+
         try:
             if kind == 'install':
-                msg = await do_install(item)
+                msg = await do_install(item, task.resumed)
             elif kind == 'install-model':
                 msg = await do_install_model(item)
             elif kind == 'update':
@@ -626,38 +829,73 @@ async def task_worker():
                 msg = await do_uninstall(item)
             elif kind == 'disable':
                 msg = await do_disable(item)
+            elif kind == 'enable':
+                msg = await do_enable(item)
             else:
                 msg = "Unexpected kind: " + kind
+        except (asyncio.CancelledError, manager_util.TaskCancelled):
+            msg = None
         except Exception:
             traceback.print_exc()
             msg = f"Exception: {(kind, item)}"
 
-        with task_worker_lock:
-            tasks_in_progress.remove((kind, item[0]))
+        # NOTE: a cancelled step may be reported as a failure (e.g. killed pip)
+        cancelled = task.context.cancelled
+        if cancelled:
+            logging.info(f"[ComfyUI-Manager] The task is cancelled: {kind} '{item[0]}'")
+            msg = get_cancelled_result(kind)
 
-            ui_id = item[0]
-            if kind == 'install-model':
-                model_result[ui_id] = msg
-                ui_target = "model_manager"
-            elif kind == 'update-main':
-                nodepack_result[ui_id] = msg
-                ui_target = "main"
-            elif kind == 'update-comfyui':
-                nodepack_result['comfyui'] = msg
-                ui_target = "main"
-            elif kind == 'update':
-                nodepack_result[ui_id] = msg['msg']
-                ui_target = "nodepack_manager"
-            else:
-                nodepack_result[ui_id] = msg
-                ui_target = "nodepack_manager"
+        if task.task_id is not None:
+            journal.finish(task.task_id, msg)
 
-        stats[kind] = stats.get(kind, 0) + 1
+        with task_worker_lock:
+            tasks_in_progress.remove((kind, item[0]))
+            ui_target = record_task_result(kind, item, msg)
+            finished_tasks.append((task, 'cancelled' if cancelled else 'done', msg))
+            stats[kind] = stats.get(kind, 0) + 1
 
+        total_count, done_count = get_counts()
         PromptServer.instance.send_sync("cm-queue-status",
                                         {'status': 'in_progress', 'target': item[0], 'ui_target': ui_target,
                                          'total_count': total_count, 'done_count': done_count})
 
+    scheduler = task_scheduler.TaskScheduler(fetch_tasks, execute, workers=core.get_config()['task_workers'])
+    while True:
+        await asyncio.get_running_loop().run_in_executor(None, scheduler.run)
+
+        # tasks which are queued after the scheduler is drained are executed in this batch as well
+        with enqueue_lock:
+            if task_queue.empty():
+                scheduler = None
+                task_worker_finishing.set()  # later tasks are started by the next `/manager/queue/start`
+                break
+
+    total_count, done_count = get_counts()
+    logging.info(f"\n[ComfyUI-Manager] Queued works are completed.\n{stats}")
+
+    logging.info("\nAfter restarting ComfyUI, please refresh the browser.")
+    PromptServer.instance.send_sync("cm-queue-status",
+                                    {'status': 'done',
+                                     'nodepack_result': nodepack_result, 'model_result': model_result,
+                                     'total_count': total_count, 'done_count': done_count})
+    journal.purge_done()
+    nodepack_result = {}
+
+
+def get_task_resource(kind, item):
+    """
+    :return: (resource class, key) of a queued task (see task_scheduler)
+    """
+    key = get_task_target(kind, item)
+    if kind in ['install', 'update', 'update-main', 'install-model']:
+        return task_scheduler.NETWORK, key
+    elif kind == 'fix':
+        return task_scheduler.ENVIRONMENT, key
+    elif kind in ['uninstall', 'disable', 'enable']:
+        return task_scheduler.FILESYSTEM, key
+
+    return task_scheduler.EXCLUSIVE, None
+
 
 @routes.get("/customnode/getmappings")
 async def fetch_customnode_mappings(request):
@@ -706,7 +944,7 @@ async def fetch_updates(request):
         await core.unified_manager.reload(request.rel_url.query["mode"])
         await core.unified_manager.get_custom_nodes(channel, request.rel_url.query["mode"])
 
-        res = core.unified_manager.fetch_or_pull_git_repo(is_pull=False)
+        res = await core.unified_manager.fetch_or_pull_git_repo(is_pull=False)
 
         for x in res['failed']:
             logging.error(f"FETCH FAILED: {x}")
@@ -750,7 +988,7 @@ async def update_all(request):
                 continue
 
         update_item = k, k, v[0]
-        task_queue.put(("update-main", update_item))
+        enqueue_task("update-main", update_item, task_scheduler.BACKGROUND)
 
     for k, v in core.unified_manager.unknown_active_nodes.items():
         if k == 'comfyui-manager':
@@ -759,7 +997,7 @@ async def update_all(request):
                 continue
 
         update_item = k, k, 'unknown'
-        task_queue.put(("update-main", update_item))
+        enqueue_task("update-main", update_item, task_scheduler.BACKGROUND)
 
     return web.Response(status=200)
 
@@ -844,7 +1082,7 @@ async def fetch_customnode_list(request):
     core.populate_github_stats(node_packs, await json_obj_github)
     core.populate_favorites(node_packs, await json_obj_extras)
 
-    check_state_of_git_node_pack(node_packs, not skip_update, do_update_check=not skip_update)
+    await check_state_of_git_node_pack(node_packs, not skip_update, do_update_check=not skip_update)
 
     for v in node_packs.values():
         populate_markdown(v)
@@ -1122,7 +1360,7 @@ def copy_set_active(files, is_disable, js_path_name='.'):
 @routes.get("/customnode/versions/{node_name}")
 async def get_cnr_versions(request):
     node_name = request.match_info.get("node_name", None)
-    versions = core.cnr_utils.all_versions_of_node(node_name)
+    versions = await core.cnr_utils.all_versions_of_node_async(node_name)
 
     if versions is not None:
         return web.json_response(versions, content_type='application/json')
@@ -1165,14 +1403,25 @@ async def import_fail_info(request):
 
 @routes.post("/manager/queue/reinstall")
 async def reinstall_custom_node(request):
-    await uninstall_custom_node(request)
-    await install_custom_node(request)
+    json_data = await request.json()
+    try:
+        tasks = [await make_uninstall_task(json_data), await make_install_task(json_data)]
+    except QueueRequestError as e:
+        return e.to_response()
+
+    enqueue_tasks([x for x in tasks if x is not None], task_scheduler.INTERACTIVE)
+    return web.Response(status=200)
 
 
 @routes.get("/manager/queue/reset")
 async def reset_queue(request):
-    global task_queue
-    task_queue = queue.Queue()
+    with enqueue_lock:
+        with task_queue.mutex:
+            task_queue.queue.clear()
+        if scheduler is not None:
+            scheduler.clear_pending()
+        journal.clear_queued()
+
     return web.Response(status=200)
 
 
@@ -1183,7 +1432,8 @@ async def queue_count(request):
     with task_worker_lock:
         done_count = len(nodepack_result) + len(model_result)
         in_progress_count = len(tasks_in_progress)
-        total_count = done_count + in_progress_count + task_queue.qsize()
+        pending_count = scheduler.counts()[0] if scheduler is not None else 0
+        total_count = done_count + in_progress_count + pending_count + task_queue.qsize()
         is_processing = task_worker_thread is not None and task_worker_thread.is_alive()
 
     return web.json_response({
@@ -1191,13 +1441,10 @@ async def queue_count(request):
         'is_processing': is_processing})
 
 
-@routes.post("/manager/queue/install")
-async def install_custom_node(request):
+async def make_install_task(json_data):
     if not is_allowed_security_level('middle'):
         logging.error(SECURITY_MESSAGE_MIDDLE_OR_BELOW)
-        return web.Response(status=403, text="A security error has occurred. Please check the terminal logs")
-
-    json_data = await request.json()
+        raise QueueRequestError(403, "A security error has occurred. Please check the terminal logs")
 
     # non-nightly cnr is safe
     risky_level = None
@@ -1210,8 +1457,8 @@ async def install_custom_node(request):
     if json_data['version'] != 'unknown' and selected_version != 'unknown':
         if skip_post_install:
             if cnr_id in core.unified_manager.nightly_inactive_nodes or cnr_id in core.unified_manager.cnr_inactive_nodes:
-                core.unified_manager.unified_enable(cnr_id)
-                return web.Response(status=200)
+                # enabled when the task is executed. (a rejected batch must not change anything)
+                return "enable", (json_data.get('ui_id'), cnr_id)
         elif selected_version is None:
             selected_version = 'latest'
 
@@ -1223,10 +1470,10 @@ async def install_custom_node(request):
             git_url = [json_data.get('repository')]
             if git_url is None:
                 logging.error(f"[ComfyUI-Manager] Following node pack doesn't provide `nightly` version: ${git_url}")
-                return web.Response(status=404, text=f"Following node pack doesn't provide `nightly` version: ${git_url}")
+                raise QueueRequestError(404, f"Following node pack doesn't provide `nightly` version: ${git_url}")
     elif json_data['version'] != 'unknown' and selected_version == 'unknown':
         logging.error(f"[ComfyUI-Manager] Invalid installation request: {json_data}")
-        return web.Response(status=400, text="Invalid installation request")
+        raise QueueRequestError(400, "Invalid installation request")
     else:
         # unknown
         unknown_name = os.path.basename(json_data['files'][0])
@@ -1238,19 +1485,23 @@ async def install_custom_node(request):
         if git_url is not None:
             risky_level = await get_risky_level(git_url, json_data.get('pip', []))
         else:
-            return web.Response(status=404, text=f"Following node pack doesn't provide `nightly` version: ${git_url}")
+            raise QueueRequestError(404, f"Following node pack doesn't provide `nightly` version: ${git_url}")
 
     if not is_allowed_security_level(risky_level):
         logging.error(SECURITY_MESSAGE_GENERAL)
-        return web.Response(status=404, text="A security error has occurred. Please check the terminal logs")
+        raise QueueRequestError(404, "A security error has occurred. Please check the terminal logs")
 
     install_item = json_data.get('ui_id'), node_spec_str, json_data['channel'], json_data['mode'], skip_post_install
-    task_queue.put(("install", install_item))
+    return "install", install_item
 
-    return web.Response(status=200)
+
+@routes.post("/manager/queue/install")
+async def install_custom_node(request):
+    return await enqueue_request(make_install_task(await request.json()))
 
 
 task_worker_thread:threading.Thread = None
+task_worker_finishing = threading.Event()  # the worker doesn't take new tasks anymore, and is reporting the results
 
 @routes.get("/manager/queue/start")
 async def queue_start(request):
@@ -1259,24 +1510,53 @@ async def queue_start(request):
     global task_worker_thread
 
     if task_worker_thread is not None and task_worker_thread.is_alive():
-        return web.Response(status=201) # already in-progress
+        if not task_worker_finishing.is_set():
+            return web.Response(status=201) # already in-progress
+
+        await asyncio.to_thread(task_worker_thread.join)
 
     nodepack_result = {}
     model_result = {}
+    finished_tasks.clear()
+
+    start_task_worker()
+    return web.Response(status=200)
+
+
+def start_task_worker():
+    global task_worker_thread
 
-    task_worker_thread = threading.Thread(target=lambda: asyncio.run(task_worker()))
+    task_worker_finishing.clear()
+    manager_util.refresh_pip_constraints(core.manager_files_path)
+    task_worker_thread = threading.Thread(target=lambda: manager_util.run_async(task_worker()))
     task_worker_thread.start()
 
-    return web.Response(status=200)
 
+def resume_tasks():
+    """
+    Queue the incomplete tasks of the previous session again and start the task worker.
+    The results of the tasks which were finished before the restart are reported together.
+    """
+    incomplete = journal.get_incomplete()
+    if not incomplete:
+        journal.purge_done()
+        return
 
-@routes.post("/manager/queue/fix")
-async def fix_custom_node(request):
+    with task_worker_lock:
+        for kind, item, msg in journal.get_done():
+            record_task_result(kind, item, msg)
+
+    for task_id, kind, item, priority, interrupted in incomplete:
+        task_queue.put(make_task(kind, item, priority, task_id, interrupted))
+
+    logging.info(f"[ComfyUI-Manager] Resume {len(incomplete)} incomplete tasks of the previous session.")
+    start_task_worker()
+
+
+async def make_fix_task(json_data):
     if not is_allowed_security_level('middle'):
         logging.error(SECURITY_MESSAGE_GENERAL)
-        return web.Response(status=403, text="A security error has occurred. Please check the terminal logs")
-
-    json_data = await request.json()
+        raise QueueRequestError(403, "A security error has occurred. Please check the terminal logs")
 
     node_id = json_data.get('id')
     node_ver = json_data['version']
@@ -1287,9 +1567,12 @@ async def fix_custom_node(request):
         node_name = os.path.basename(json_data['files'][0])
 
     update_item = json_data.get('ui_id'), node_name, json_data['version']
-    task_queue.put(("fix", update_item))
+    return "fix", update_item
 
-    return web.Response(status=200)
+
+@routes.post("/manager/queue/fix")
+async def fix_custom_node(request):
+    return await enqueue_request(make_fix_task(await request.json()))
 
 
 @routes.post("/customnode/install/git_url")
@@ -1324,13 +1607,10 @@ async def install_custom_node_pip(request):
     return web.Response(status=200)
 
 
-@routes.post("/manager/queue/uninstall")
-async def uninstall_custom_node(request):
+async def make_uninstall_task(json_data):
     if not is_allowed_security_level('middle'):
         logging.error(SECURITY_MESSAGE_MIDDLE_OR_BELOW)
-        return web.Response(status=403, text="A security error has occurred. Please check the terminal logs")
-
-    json_data = await request.json()
+        raise QueueRequestError(403, "A security error has occurred. Please check the terminal logs")
 
     node_id = json_data.get('id')
     if json_data['version'] != 'unknown':
@@ -1342,18 +1622,18 @@ async def uninstall_custom_node(request):
         node_name = os.path.basename(json_data['files'][0])
 
     uninstall_item = json_data.get('ui_id'), node_name, is_unknown
-    task_queue.put(("uninstall", uninstall_item))
+    return "uninstall", uninstall_item
 
-    return web.Response(status=200)
 
+@routes.post("/manager/queue/uninstall")
+async def uninstall_custom_node(request):
+    return await enqueue_request(make_uninstall_task(await request.json()))
 
-@routes.post("/manager/queue/update")
-async def update_custom_node(request):
+
+async def make_update_task(json_data):
     if not is_allowed_security_level('middle'):
         logging.error(SECURITY_MESSAGE_MIDDLE_OR_BELOW)
-        return web.Response(status=403, text="A security error has occurred. Please check the terminal logs")
-
-    json_data = await request.json()
+        raise QueueRequestError(403, "A security error has occurred. Please check the terminal logs")
 
     node_id = json_data.get('id')
     if json_data['version'] != 'unknown':
@@ -1363,16 +1643,22 @@ async def update_custom_node(request):
         node_name = os.path.basename(json_data['files'][0])
 
     update_item = json_data.get('ui_id'), node_name, json_data['version']
-    task_queue.put(("update", update_item))
+    return "update", update_item
 
-    return web.Response(status=200)
+
+@routes.post("/manager/queue/update")
+async def update_custom_node(request):
+    return await enqueue_request(make_update_task(await request.json()))
+
+
+async def make_update_comfyui_task(json_data=None):
+    is_stable = core.get_config()['update_policy'] != 'nightly-comfyui'
+    return "update-comfyui", ('comfyui', is_stable)
 
 
 @routes.get("/manager/queue/update_comfyui")
 async def update_comfyui(request):
-    is_stable = core.get_config()['update_policy'] != 'nightly-comfyui'
-    task_queue.put(("update-comfyui", ('comfyui', is_stable)))
-    return web.Response(status=200)
+    return await enqueue_request(make_update_comfyui_task())
 
 
 @routes.get("/comfyui_manager/comfyui_versions")
@@ -1399,10 +1685,7 @@ async def comfyui_switch_version(request):
     return web.Response(status=400)
 
 
-@routes.post("/manager/queue/disable")
-async def disable_node(request):
-    json_data = await request.json()
-
+async def make_disable_task(json_data):
     node_id = json_data.get('id')
     if json_data['version'] != 'unknown':
         is_unknown = False
@@ -1413,9 +1696,12 @@ async def disable_node(request):
         node_name = os.path.basename(json_data['files'][0])
 
     update_item = json_data.get('ui_id'), node_name, is_unknown
-    task_queue.put(("disable", update_item))
+    return "disable", update_item
 
-    return web.Response(status=200)
+
+@routes.post("/manager/queue/disable")
+async def disable_node(request):
+    return await enqueue_request(make_disable_task(await request.json()))
 
 
 async def check_whitelist_for_model(item):
@@ -1434,18 +1720,15 @@ async def check_whitelist_for_model(item):
     return False
 
 
-@routes.post("/manager/queue/install_model")
-async def install_model(request):
-    json_data = await request.json()
-
+async def make_install_model_task(json_data):
     if not is_allowed_security_level('middle'):
         logging.error(SECURITY_MESSAGE_MIDDLE_OR_BELOW)
-        return web.Response(status=403, text="A security error has occurred. Please check the terminal logs")
+        raise QueueRequestError(403, "A security error has occurred. Please check the terminal logs")
 
     # validate request
     if not await check_whitelist_for_model(json_data):
         logging.error(f"[ComfyUI-Manager] Invalid model install request is detected: {json_data}")
-        return web.Response(status=400, text="Invalid model install request is detected")
+        raise QueueRequestError(400, "Invalid model install request is detected")
 
     if not json_data['filename'].endswith('.safetensors') and not is_allowed_security_level('high'):
         models_json = await core.get_data_by_mode('cache', 'model-list.json', 'default')
@@ -1458,12 +1741,150 @@ async def install_model(request):
 
         if not is_belongs_to_whitelist:
             logging.error(SECURITY_MESSAGE_NORMAL_MINUS_MODEL)
-            return web.Response(status=403, text="A security error has occurred. Please check the terminal logs")
+            raise QueueRequestError(403, "A security error has occurred. Please check the terminal logs")
 
     install_item = json_data.get('ui_id'), json_data
-    task_queue.put(("install-model", install_item))
+    return "install-model", install_item
 
-    return web.Response(status=200)
+
+@routes.post("/manager/queue/install_model")
+async def install_model(request):
+    return await enqueue_request(make_install_model_task(await request.json()))
+
+
+# operations of `/manager/queue/batch` (same names as the single endpoints)
+batch_task_makers = {
+    'install': make_install_task,
+    'fix': make_fix_task,
+    'uninstall': make_uninstall_task,
+    'update': make_update_task,
+    'update_comfyui': make_update_comfyui_task,
+    'disable': make_disable_task,
+    'install_model': make_install_model_task,
+}
+
+
+@routes.post("/manager/queue/batch")
+async def queue_batch(request):
+    """
+    Queue multiple operations at once.
+
+    body: {"operations": [{"op": "install"|"reinstall"|"uninstall"|..., "data": <body of the single endpoint>}, ...],
+           "priority": "interactive"|"normal"|"background"}
+
+    Every operation is validated first, and nothing is queued if any of them is rejected.
+    Duplicated or superseded operations are dropped. (see dedupe_tasks)
+    """
+    json_data = await request.json()
+    operations = json_data.get('operations', []) if isinstance(json_data, dict) else json_data
+    priority = task_scheduler.get_priority(json_data.get('priority')) if isinstance(json_data, dict) else task_scheduler.NORMAL
+
+    tasks = []
+    errors = []
+    for i, x in enumerate(operations):
+        op = x.get('op') if isinstance(x, dict) else None
+        data = x.get('data') if isinstance(x, dict) else None
+        ui_id = data.get('ui_id') if isinstance(data, dict) else None
+
+        try:
+            if not isinstance(data, dict) and op != 'update_comfyui':
+                raise QueueRequestError(400, "Invalid request: `data` is required")
+            elif op == 'reinstall':
+                tasks += [await make_uninstall_task(data), await make_install_task(data)]
+            elif op in batch_task_makers:
+                tasks.append(await batch_task_makers[op](data))
+            else:
+                raise QueueRequestError(400, f"Unknown operation: {op}")
+        except QueueRequestError as e:
+            errors.append({'index': i, 'ui_id': ui_id, 'status': e.status, 'text': e.text})
+        except (KeyError, IndexError, TypeError, AttributeError) as e:
+            errors.append({'index': i, 'ui_id': ui_id, 'status': 400, 'text': f"Invalid request: {e}"})
+
+    if errors:
+        return web.json_response({'errors': errors}, status=errors[0]['status'])
+
+    tasks, dropped = dedupe_tasks([x for x in tasks if x is not None], is_node_pack_installed)
+    enqueue_tasks(tasks, priority)
+
+    return web.json_response({'queued': len(tasks), 'dropped': len(dropped)})
+
+
+def get_task_info(task, state, eta=None, result=None):
+    progress = task.context.progress
+    return {
+        'task_id': task.task_id,
+        'kind': task.kind,
+        'ui_id': task.item[0],
+        'target': task.key,
+        'priority': task_scheduler.get_priority_name(task.priority),
+        'state': state,
+        'queued_at': task.queued_at,
+        'started_at': task.started_at,
+        'progress': list(progress) if progress is not None else None,
+        'eta': eta,
+        'result': result,
+    }
+
+
+@routes.get("/manager/queue/tasks")
+async def queue_tasks(request):
+    """
+    State of every task of the current batch.
+
+    state: 'running', 'queued' (in the order of execution), 'done' or 'cancelled'
+    eta: estimated seconds until the task is completed. (null if unknown)
+    """
+    with task_worker_lock:
+        res = [get_task_info(task, state, result=msg) for task, state, msg in finished_tasks]
+
+    if scheduler is not None:
+        res += [get_task_info(task, state, eta) for task, state, eta in scheduler.snapshot()]
+
+    with task_queue.mutex:
+        res += [get_task_info(task, 'queued') for task in task_queue.queue]
+
+    return web.json_response({'tasks': res})
+
+
+@routes.post("/manager/queue/cancel")
+async def cancel_task(request):
+    """
+    Cancel tasks. A queued task is removed, a running task is interrupted. (git/pip processes are killed)
+    A running task which can't be interrupted (see `uncancellable_kinds`) is reported in `not_cancellable`.
+
+    body: {"task_id": <id>} or {"ui_id": <ui_id>}
+    """
+    json_data = await request.json()
+    task_id = json_data.get('task_id')
+    ui_id = json_data.get('ui_id')
+
+    if task_id is None and ui_id is None:
+        return web.Response(status=400, text="Invalid request: `task_id` or `ui_id` is required")
+
+    def match(task):
+        if task_id is not None:
+            return task.task_id == task_id
+        return task.item[0] == ui_id
+
+    with enqueue_lock:
+        removed = remove_pending_tasks(match)
+
+    with task_worker_lock:
+        for task in removed:
+            msg = get_cancelled_result(task.kind)
+            record_task_result(task.kind, task.item, msg)
+            finished_tasks.append((task, 'cancelled', msg))
+
+    running = scheduler.find(match)[1] if scheduler is not None else []
+    rejected = [x for x in running if x.kind in uncancellable_kinds]
+    running = [x for x in running if x.kind not in uncancellable_kinds]
+    for task in running:
+        logging.info(f"[ComfyUI-Manager] Cancel the running task: {task.kind} '{task.item[0]}'")
+        task.context.cancel()
+
+    cancelled = len(removed) + len(running)
+    status = 409 if rejected and not cancelled else 200
+    return web.json_response({'cancelled': cancelled, 'not_cancellable': [x.item[0] for x in rejected]}, status=status)
 
 
 @routes.get("/manager/preview_method")
@@ -1553,46 +1974,46 @@ async def get_notice(request):
     url = "github.com"
     path = "/ltdrdata/ltdrdata.github.io/wiki/News"
 
-    async with aiohttp.ClientSession(trust_env=True, connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
-        async with session.get(f"https://{url}{path}") as response:
-            if response.status == 200:
-                # html_content = response.read().decode('utf-8')
-                html_content = await response.text()
+    session = manager_util.get_session()
+    async with session.get(f"https://{url}{path}") as response:
+        if response.status == 200:
+            # html_content = response.read().decode('utf-8')
+            html_content = await response.text()
 
-                pattern = re.compile(r'<div class="markdown-body">([\s\S]*?)</div>')
-                match = pattern.search(html_content)
+            pattern = re.compile(r'<div class="markdown-body">([\s\S]*?)</div>')
+            match = pattern.search(html_content)
 
-                if match:
-                    markdown_content = match.group(1)
-                    version_tag = os.environ.get('__COMFYUI_DESKTOP_VERSION__')
-                    if version_tag is not None:
-                        markdown_content += f"<HR>ComfyUI: {version_tag} [Desktop]"
+            if match:
+                markdown_content = match.group(1)
+                version_tag = os.environ.get('__COMFYUI_DESKTOP_VERSION__')
+                if version_tag is not None:
+                    markdown_content += f"<HR>ComfyUI: {version_tag} [Desktop]"
+                else:
+                    version_tag = core.get_comfyui_tag()
+                    if version_tag is None:
+                        markdown_content += f"<HR>ComfyUI: {core.comfy_ui_revision}[{comfy_ui_hash[:6]}]({core.comfy_ui_commit_datetime.date()})"
                     else:
-                        version_tag = core.get_comfyui_tag()
-                        if version_tag is None:
-                            markdown_content += f"<HR>ComfyUI: {core.comfy_ui_revision}[{comfy_ui_hash[:6]}]({core.comfy_ui_commit_datetime.date()})"
-                        else:
-                            markdown_content += (f"<HR>ComfyUI: {version_tag}<BR>"
-                                                 f"&nbsp; &nbsp; &nbsp; &nbsp; &nbsp;({core.comfy_ui_commit_datetime.date()})")
-                    # markdown_content += f"<BR>&nbsp; &nbsp; &nbsp; &nbsp; &nbsp;()"
-                    markdown_content += f"<BR>Manager: {core.version_str}"
+                        markdown_content += (f"<HR>ComfyUI: {version_tag}<BR>"
+                                             f"&nbsp; &nbsp; &nbsp; &nbsp; &nbsp;({core.comfy_ui_commit_datetime.date()})")
+                # markdown_content += f"<BR>&nbsp; &nbsp; &nbsp; &nbsp; &nbsp;()"
+                markdown_content += f"<BR>Manager: {core.version_str}"
 
-                    markdown_content = add_target_blank(markdown_content)
+                markdown_content = add_target_blank(markdown_content)
 
-                    try:
-                        if '__COMFYUI_DESKTOP_VERSION__' not in os.environ:
-                            if core.comfy_ui_commit_datetime == datetime(1900, 1, 1, 0, 0, 0):
-                                markdown_content = '<P style="text-align: center; color:red; background-color:white; font-weight:bold">Your ComfyUI isn\'t git repo.</P>' + markdown_content
-                            elif core.comfy_ui_required_commit_datetime.date() > core.comfy_ui_commit_datetime.date():
-                                markdown_content = '<P style="text-align: center; color:red; background-color:white; font-weight:bold">Your ComfyUI is too OUTDATED!!!</P>' + markdown_content
-                    except:
-                        pass
-
-                    return web.Response(text=markdown_content, status=200)
-                else:
-                    return web.Response(text="Unable to retrieve Notice", status=200)
+                try:
+                    if '__COMFYUI_DESKTOP_VERSION__' not in os.environ:
+                        if core.comfy_ui_commit_datetime == datetime(1900, 1, 1, 0, 0, 0):
+                            markdown_content = '<P style="text-align: center; color:red; background-color:white; font-weight:bold">Your ComfyUI isn\'t git repo.</P>' + markdown_content
+                        elif core.comfy_ui_required_commit_datetime.date() > core.comfy_ui_commit_datetime.date():
+                            markdown_content = '<P style="text-align: center; color:red; background-color:white; font-weight:bold">Your ComfyUI is too OUTDATED!!!</P>' + markdown_content
+                except:
+                    pass
+
+                return web.Response(text=markdown_content, status=200)
             else:
                 return web.Response(text="Unable to retrieve Notice", status=200)
+        else:
+            return web.Response(text="Unable to retrieve Notice", status=200)
 
 
 @routes.get("/manager/reboot")
@@ -1707,13 +2128,21 @@ async def _confirm_try_install(sender, custom_node_url, msg):
 
 
 def confirm_try_install(sender, custom_node_url, msg):
-    asyncio.run(_confirm_try_install(sender, custom_node_url, msg))
+    manager_util.run_async(_confirm_try_install(sender, custom_node_url, msg))
 
 
 cm_global.register_api('cm.try-install-custom-node', confirm_try_install)
 
 
 async def default_cache_update():
+    try:
+        await update_default_caches()
+    finally:
+        # the interrupted tasks are resumed even if the caches couldn't be updated
+        resume_tasks()
+
+
+async def update_default_caches():
     core.refresh_channel_dict()
     channel_url = core.get_config()['channel_url']
     async def get_cache(filename):
@@ -1726,12 +2155,8 @@ async def default_cache_update():
             cache_uri = str(manager_util.simple_hash(uri)) + '_' + filename
             cache_uri = os.path.join(manager_util.cache_dir, cache_uri)
 
-            json_obj = await manager_util.get_data(uri, True)
-
-            with manager_util.cache_lock:
-                with open(cache_uri, "w", encoding='utf-8') as file:
-                    json.dump(json_obj, file, indent=4, sort_keys=True)
-                    logging.info(f"[ComfyUI-Manager] default cache updated: {uri}")
+            await manager_util.get_data_with_validators(uri, cache_uri, True)
+            logging.info(f"[ComfyUI-Manager] default cache updated: {uri}")
         except Exception as e:
             logging.error(f"[ComfyUI-Manager] Failed to perform initial fetching '{filename}': {e}")
             traceback.print_exc()
@@ -1752,10 +2177,22 @@ async def default_cache_update():
             await core.unified_manager.reload('remote', dont_wait=False)
             await core.unified_manager.get_custom_nodes(channel_url, 'remote')
 
+    logging.debug(f"[ComfyUI-Manager] connection stats: {manager_util.get_connection_stats()}")
     logging.info("[ComfyUI-Manager] All startup tasks have been completed.")
 
 
-threading.Thread(target=lambda: asyncio.run(default_cache_update())).start()
+threading.Thread(target=lambda: manager_util.run_async(default_cache_update())).start()
+
+
+async def close_http_session(app):
+    # the shared session of the PromptServer loop lives until the server shuts down
+    await manager_util.close_session()
+
+
+PromptServer.instance.app.on_cleanup.append(close_http_session)
+
+if core.get_config()['watch_custom_nodes']:
+    core.unified_manager.start_watcher()
 
 if not os.path.exists(core.manager_config_path):
     core.get_config()
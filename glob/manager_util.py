@@ -5,7 +5,11 @@ description:
 import traceback
 
 import aiohttp
+import asyncio
+import concurrent.futures
+import contextvars
 import json
+import pickle
 import threading
 import os
 from datetime import datetime
@@ -15,6 +19,7 @@ import re
 import logging
 import platform
 import shlex
+from collections import OrderedDict
 
 
 cache_lock = threading.Lock()
@@ -23,6 +28,10 @@ comfyui_manager_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '
 cache_dir = os.path.join(comfyui_manager_path, '.cache')  # This path is also updated together in **manager_core.update_user_directory**.
 
 use_uv = False
+use_pip_constraints = True
+pip_constraints_path = None  # constraints file which is passed to every `pip install` (see refresh_pip_constraints)
+pip_constraints = {}         # canonical package name -> constraint specs
+pip_wheelhouse = None        # local wheel directory which is passed to every `pip install` as `--find-links` (see prefetch_wheels)
 
 
 def add_python_path_to_env():
@@ -34,7 +43,25 @@ def add_python_path_to_env():
     os.environ['PATH'] = os.path.dirname(sys.executable)+sep+os.environ['PATH']
 
 
-def make_pip_cmd(cmd):
+def get_constraint_args(cmd):
+    if use_pip_constraints and pip_constraints_path is not None and cmd and cmd[0] in ['install', 'download'] \
+            and os.path.exists(pip_constraints_path):
+        return ['-c', pip_constraints_path]
+    return []
+
+
+def get_wheelhouse_args(cmd):
+    if pip_wheelhouse is not None and cmd and cmd[0] == 'install' and os.path.isdir(pip_wheelhouse):
+        return ['--find-links', pip_wheelhouse]
+    return []
+
+
+def make_pip_cmd(cmd, use_constraints=True):
+    if use_constraints:
+        cmd = cmd + get_constraint_args(cmd)
+
+    cmd = cmd + get_wheelhouse_args(cmd)
+
     if 'python_embeded' in sys.executable:
         if use_uv:
             return [sys.executable, '-s', '-m', 'uv', 'pip'] + cmd
@@ -120,34 +147,299 @@ def simple_hash(input_string):
     return hash_value
 
 
+def get_file_age(file_path):
+    # NOTE: A cache revalidated by `304 Not Modified` is only touched, so mtime is also considered.
+    file_creation_time = max(os.path.getctime(file_path), os.path.getmtime(file_path))
+    current_time = datetime.now().timestamp()
+    return current_time - file_creation_time
+
+
 def is_file_created_within_one_day(file_path):
     if not os.path.exists(file_path):
         return False
 
-    file_creation_time = os.path.getctime(file_path)
-    current_time = datetime.now().timestamp()
-    time_difference = current_time - file_creation_time
+    return get_file_age(file_path) <= 86400
+
+
+class SessionManager:
+    """
+    Process-wide pool of `aiohttp.ClientSession` objects.
+
+    An aiohttp session is bound to the event loop it was created on, and ComfyUI-Manager runs
+    fetches on several loops (PromptServer, startup cache thread, task worker, cm-cli).
+    So one keep-alive session is lazily created per running loop and shared by every fetch on that loop.
+    """
+
+    def __init__(self, limit=64, limit_per_host=8, ttl_dns_cache=300, keepalive_timeout=30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.ttl_dns_cache = ttl_dns_cache
+        self.keepalive_timeout = keepalive_timeout
+
+        self._sessions = {}    # event loop -> aiohttp.ClientSession
+        self._lock = threading.Lock()
+        self.stats = {'new': 0, 'reused': 0}
+
+    async def _on_connection_create_end(self, session, ctx, params):
+        self.stats['new'] += 1
+
+    async def _on_connection_reuseconn(self, session, ctx, params):
+        self.stats['reused'] += 1
+
+    def _create_session(self):
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+
+        connector = aiohttp.TCPConnector(ssl=False, limit=self.limit, limit_per_host=self.limit_per_host,
+                                         use_dns_cache=True, ttl_dns_cache=self.ttl_dns_cache,
+                                         keepalive_timeout=self.keepalive_timeout)
+
+        return aiohttp.ClientSession(trust_env=True, connector=connector, trace_configs=[trace_config])
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the shared session of the running event loop. (must be called inside a coroutine)
+        """
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            # forget sessions of loops that are already gone (e.g. finished `asyncio.run`)
+            for k in [k for k in self._sessions if k.is_closed()]:
+                del self._sessions[k]
+
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                session = self._create_session()
+                self._sessions[loop] = session
+
+        return session
+
+    async def close(self):
+        """
+        Close the shared session of the running event loop.
+        This should be awaited before a loop created by `asyncio.run` is finished.
+        """
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            session = self._sessions.pop(loop, None)
+
+        if session is not None and not session.closed:
+            await session.close()
+
+
+session_manager = SessionManager()
+
+
+def get_session() -> aiohttp.ClientSession:
+    return session_manager.get_session()
+
+
+async def close_session():
+    await session_manager.close()
+
+
+def get_connection_stats():
+    """
+    Counter of newly opened and reused connections. Pooling is working if 'reused' grows.
+    """
+    return dict(session_manager.stats)
+
+
+def run_async(coro):
+    """
+    `asyncio.run` replacement that closes the shared session of the temporary event loop on exit.
+    """
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await close_session()
+
+    return asyncio.run(wrapper())
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class TaskContext:
+    """
+    Cancellation and progress of a running manager task.
+
+    Long running steps of the task (pip/git subprocesses, downloads) look up the context with `get_task_context`:
+    subprocesses are registered to be killed on cancel, and loops call `check_cancelled`.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.processes = set()
+        self.callbacks = []
+        self.progress = None  # (done, total) of the current step. e.g. bytes of a download
+
+    def cancel(self):
+        with self.lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            processes = list(self.processes)
+            callbacks = list(self.callbacks)
+
+        for x in processes:
+            try:
+                x.kill()
+            except OSError:
+                pass
+
+        for x in callbacks:
+            x()
+
+    def on_cancel(self, callback):
+        with self.lock:
+            if not self.cancelled:
+                self.callbacks.append(callback)
+                return
+
+        callback()
+
+    def add_process(self, process):
+        """
+        :param process: object with `kill()` (e.g. subprocess.Popen)
+        """
+        with self.lock:
+            self.processes.add(process)
+            cancelled = self.cancelled
+
+        if cancelled:
+            process.kill()
+
+    def remove_process(self, process):
+        with self.lock:
+            self.processes.discard(process)
+
+
+task_context = contextvars.ContextVar('task_context', default=None)
+
+
+def get_task_context():
+    return task_context.get()
+
+
+def check_cancelled():
+    ctx = task_context.get()
+    if ctx is not None and ctx.cancelled:
+        raise TaskCancelled()
+
 
-    return time_difference <= 86400
+def report_progress(done, total):
+    ctx = task_context.get()
+    if ctx is not None:
+        ctx.progress = done, total
+
+
+class ParsedJsonCache:
+    """
+    LRU cache of parsed JSON documents keyed by file identity (path, size, mtime_ns).
+
+    Documents are kept in pickled form, so every caller receives its own copy and
+    cannot corrupt the cache by mutating it. The pickled size is also used to bound the memory.
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()    # path -> ((size, mtime_ns), pickled json)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def file_identity(path):
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, path, identity):
+        with self._lock:
+            item = self._items.get(path)
+            if item is None or item[0] != identity:
+                return None
+
+            self._items.move_to_end(path)
+            blob = item[1]
+
+        return pickle.loads(blob)
+
+    def put(self, path, identity, json_obj):
+        blob = pickle.dumps(json_obj, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove(path)
+            self._items[path] = identity, blob
+            self._total_bytes += len(blob)
+
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+    def _remove(self, path):
+        item = self._items.pop(path, None)
+        if item is not None:
+            self._total_bytes -= len(item[1])
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._total_bytes = 0
+
+
+parsed_json_cache = ParsedJsonCache()
+
+
+def read_json_file(path):
+    """
+    Read a JSON file through `parsed_json_cache`.
+    Unchanged files are served from memory without disk reads or parsing.
+    """
+    json_obj = parsed_json_cache.get(path, ParsedJsonCache.file_identity(path))
+    if json_obj is not None:
+        return json_obj
+
+    with cache_lock:
+        identity = ParsedJsonCache.file_identity(path)
+        with open(path, "r", encoding="utf-8") as f:
+            json_text = f.read()
+
+    json_obj = json.loads(json_text)
+    parsed_json_cache.put(path, identity, json_obj)
+
+    return json_obj
 
 
 async def get_data(uri, silent=False):
     if not silent:
         print(f"FETCH DATA from: {uri}", end="")
 
-    if uri.startswith("http"):
-        async with aiohttp.ClientSession(trust_env=True, connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
-            headers = {
-                'Cache-Control': 'no-cache',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            }
-            async with session.get(uri, headers=headers) as resp:
-                json_text = await resp.text()
-    else:
-        with cache_lock:
-            with open(uri, "r", encoding="utf-8") as f:
-                json_text = f.read()
+    if not uri.startswith("http"):
+        try:
+            json_obj = read_json_file(uri)
+        except json.JSONDecodeError as e:
+            logging.error(f"[ComfyUI-Manager] An error occurred while fetching '{uri}': {e}")
+            return {}
+
+        if not silent:
+            print(" [DONE]")
+
+        return json_obj
+
+    session = get_session()
+    headers = {
+        'Cache-Control': 'no-cache',
+        'Pragma': 'no-cache',
+        'Expires': '0'
+    }
+    async with session.get(uri, headers=headers) as resp:
+        json_text = await resp.text()
 
     try:
         json_obj = json.loads(json_text)
@@ -178,18 +470,178 @@ def get_cache_state(uri):
     return "expired"
 
 
-def save_to_cache(uri, json_obj, silent=False):
+def save_to_cache(uri, json_obj, silent=False, compact=False):
     cache_uri = get_cache_path(uri)
 
     with cache_lock:
         with open(cache_uri, "w", encoding='utf-8') as file:
-            json.dump(json_obj, file, indent=4, sort_keys=True)
+            if compact:
+                json.dump(json_obj, file, separators=(',', ':'))
+            else:
+                json.dump(json_obj, file, indent=4, sort_keys=True)
             if not silent:
                 logging.info(f"[ComfyUI-Manager] default cache updated: {uri}")
 
 
-async def get_data_with_cache(uri, silent=False, cache_mode=True, dont_wait=False, dont_cache=False):
-    cache_uri = get_cache_path(uri)
+def get_validators_path(cache_path):
+    return cache_path + '.validators'
+
+
+def read_validators(cache_path):
+    """
+    Read HTTP validators (ETag, Last-Modified) stored in the sidecar of `cache_path`.
+    """
+    validators_path = get_validators_path(cache_path)
+
+    if not os.path.exists(cache_path) or not os.path.exists(validators_path):
+        return {}
+
+    try:
+        with open(validators_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def write_validators(cache_path, headers):
+    validators = {}
+    if 'ETag' in headers:
+        validators['etag'] = headers['ETag']
+    if 'Last-Modified' in headers:
+        validators['last_modified'] = headers['Last-Modified']
+
+    validators_path = get_validators_path(cache_path)
+    if validators:
+        with open(validators_path, 'w', encoding='utf-8') as f:
+            json.dump(validators, f)
+    elif os.path.exists(validators_path):
+        os.remove(validators_path)
+
+
+async def get_data_with_validators(uri, cache_path, silent=False):
+    """
+    Fetch `uri` and store it into `cache_path`.
+
+    If the cache has validators, the request is conditional (If-None-Match / If-Modified-Since).
+    A `304 Not Modified` response only refreshes the TTL of the cache,
+    skipping the download and the JSON re-serialization.
+    """
+    if not uri.startswith("http"):
+        return await get_data(uri, silent=silent)
+
+    if not silent:
+        print(f"FETCH DATA from: {uri}", end="")
+
+    headers = {
+        'Cache-Control': 'no-cache',
+        'Pragma': 'no-cache',
+        'Expires': '0'
+    }
+
+    validators = read_validators(cache_path)
+    if 'etag' in validators:
+        headers['If-None-Match'] = validators['etag']
+    if 'last_modified' in validators:
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    session = get_session()
+    async with session.get(uri, headers=headers) as resp:
+        if resp.status == 304:
+            with cache_lock:
+                os.utime(cache_path)
+
+            if not silent:
+                print(" [NOT MODIFIED]")
+
+            return await get_data(cache_path, silent=True)
+
+        json_text = await resp.text()
+        resp_status = resp.status
+        resp_headers = resp.headers
+
+    try:
+        json_obj = json.loads(json_text)
+    except Exception as e:
+        logging.error(f"[ComfyUI-Manager] An error occurred while fetching '{uri}': {e}")
+        json_obj = {}
+
+    with cache_lock:
+        with open(cache_path, "w", encoding='utf-8') as file:
+            json.dump(json_obj, file, indent=4, sort_keys=True)
+
+        if resp_status == 200 and json_obj:
+            write_validators(cache_path, resp_headers)
+        else:
+            write_validators(cache_path, {})
+
+    if not silent:
+        print(" [DONE]")
+
+    return json_obj
+
+
+# Stale cache older than this (in seconds) is not served by stale-while-revalidate mode, and the caller blocks.
+cache_max_staleness = 7 * 86400
+
+inflight_fetches = {}    # uri -> concurrent.futures.Future
+inflight_lock = threading.Lock()
+
+
+async def fetch_to_cache(uri, cache_path, silent=False):
+    """
+    Fetch `uri` into `cache_path` with single-flight semantics.
+    Concurrent requests for the same `uri` (even from other event loops) are coalesced onto one in-flight fetch.
+    """
+    with inflight_lock:
+        future = inflight_fetches.get(uri)
+        is_owner = future is None
+        if is_owner:
+            future = concurrent.futures.Future()
+            inflight_fetches[uri] = future
+
+    if not is_owner:
+        await asyncio.wrap_future(future)
+        return await get_data(cache_path, silent=True)  # each waiter gets its own copy
+
+    try:
+        json_obj = await get_data_with_validators(uri, cache_path, silent=silent)
+        future.set_result(True)
+        return json_obj
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with inflight_lock:
+            del inflight_fetches[uri]
+
+
+def refresh_cache_in_background(uri, cache_path):
+    """
+    Start a background refresh of `cache_path` unless one is already in flight for `uri`.
+    The refresh runs on its own thread, so it outlives the event loop of the caller.
+    """
+    with inflight_lock:
+        if uri in inflight_fetches:
+            return
+
+    def worker():
+        try:
+            run_async(fetch_to_cache(uri, cache_path, silent=True))
+            logging.info(f"[ComfyUI-Manager] cache refreshed in background: {uri}")
+        except Exception as e:
+            logging.error(f"[ComfyUI-Manager] Failed to refresh cache '{uri}': {e}")
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
+async def get_data_with_cache(uri, silent=False, cache_mode=True, dont_wait=False, dont_cache=False,
+                              stale_while_revalidate=False, max_staleness=None, cache_path=None):
+    """
+    :param stale_while_revalidate: return the expired cache immediately and refresh it in background,
+                                   unless it is older than `max_staleness` (default: `cache_max_staleness`)
+    :param cache_path: cache file to use instead of `get_cache_path(uri)`
+    """
+    cache_uri = get_cache_path(uri) if cache_path is None else cache_path
 
     if cache_mode and dont_wait:
         # NOTE: return the cache if possible, even if it is expired, so do not cache
@@ -203,16 +655,20 @@ async def get_data_with_cache(uri, silent=False, cache_mode=True, dont_wait=Fals
 
             return await get_data(cache_uri, silent=silent)
 
+    if max_staleness is None:
+        max_staleness = cache_max_staleness
+
     if cache_mode and is_file_created_within_one_day(cache_uri):
         json_obj = await get_data(cache_uri, silent=silent)
-    else:
+    elif dont_cache:
         json_obj = await get_data(uri, silent=silent)
-        if not dont_cache:
-            with cache_lock:
-                with open(cache_uri, "w", encoding='utf-8') as file:
-                    json.dump(json_obj, file, indent=4, sort_keys=True)
-                    if not silent:
-                        logging.info(f"[ComfyUI-Manager] default cache updated: {uri}")
+    elif cache_mode and stale_while_revalidate and os.path.exists(cache_uri) and get_file_age(cache_uri) <= max_staleness:
+        refresh_cache_in_background(uri, cache_uri)
+        json_obj = await get_data(cache_uri, silent=silent)
+    else:
+        json_obj = await fetch_to_cache(uri, cache_uri, silent=silent)
+        if not silent:
+            logging.info(f"[ComfyUI-Manager] default cache updated: {uri}")
 
     return json_obj
 
@@ -225,7 +681,9 @@ def extract_package_as_zip(file_path, extract_path):
     import zipfile
     try:
         with zipfile.ZipFile(file_path, "r") as zip_ref:
-            zip_ref.extractall(extract_path)
+            for member in zip_ref.infolist():
+                check_cancelled()
+                zip_ref.extract(member, extract_path)
             extracted_files = zip_ref.namelist()
         logging.info(f"Extracted zip file to {extract_path}")
         return extracted_files
@@ -234,36 +692,160 @@ def extract_package_as_zip(file_path, extract_path):
         return None
 
 
-pip_map = None
+class InstalledDistributions:
+    """
+    In-process index of the installed python distributions (replaces `pip list` / `pip freeze`).
 
+    Built by scanning the `.dist-info`/`.egg-info` of `sys.path` through importlib.metadata,
+    and rebuilt only when the mtime of one of the scanned directories changes
+    (installing, upgrading or removing a package always touches its site-packages directory).
+    """
+    freeze_excludes = {'pip', 'setuptools', 'wheel', 'distribute'}
 
-def get_installed_packages(renew=False):
-    global pip_map
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None
+        self.versions = {}      # normalized name -> version (same as `pip list`)
+        self.freeze = []        # freeze style specs (same as `pip freeze`)
+
+    @staticmethod
+    def get_paths():
+        res = []
+        for x in sys.path:
+            x = os.path.abspath(x or '.')
+            if x not in res and os.path.isdir(x):
+                res.append(x)
+        return res
+
+    @staticmethod
+    def get_state(paths):
+        res = []
+        for x in paths:
+            try:
+                res.append((x, os.stat(x).st_mtime_ns))
+            except OSError:
+                res.append((x, None))
+        return tuple(res)
+
+    @staticmethod
+    def canonical_name(name):
+        return re.sub(r'[-_.]+', '-', name).lower()
 
-    if renew or pip_map is None:
+    @staticmethod
+    def get_freeze_spec(dist, name):
         try:
-            result = subprocess.check_output(make_pip_cmd(['list']), universal_newlines=True)
+            direct_url = dist.read_text('direct_url.json')
+        except Exception:
+            direct_url = None
+
+        if direct_url:
+            try:
+                info = json.loads(direct_url)
+                url = info['url']
+                if 'vcs_info' in info:
+                    vcs = info['vcs_info']
+                    return f"{name} @ {vcs['vcs']}+{url}@{vcs.get('commit_id', '')}".rstrip('@')
+                if info.get('dir_info', {}).get('editable'):
+                    return f"-e {url}"
+                return f"{name} @ {url}"
+            except (ValueError, KeyError, TypeError):
+                pass
+
+        return f"{name}=={dist.version}"
+
+    def _scan(self, paths):
+        from importlib import metadata
+
+        versions = {}
+        freeze = []
+        seen = set()
+        for dist in metadata.distributions(path=paths):
+            name = dist.metadata['Name']
+            if not name:
+                continue
+
+            canonical = self.canonical_name(name)
+            if canonical in seen:
+                continue  # shadowed by the distribution which comes first in sys.path
+            seen.add(canonical)
+
+            versions[name.lower().replace('-', '_')] = dist.version
 
-            pip_map = {}
-            for line in result.split('\n'):
-                x = line.strip()
-                if x:
-                    y = line.split()
-                    if y[0] == 'Package' or y[0].startswith('-'):
-                        continue
+            if canonical not in self.freeze_excludes:
+                freeze.append(self.get_freeze_spec(dist, name))
 
-                    normalized_name = y[0].lower().replace('-', '_')
-                    pip_map[normalized_name] = y[1]
-        except subprocess.CalledProcessError:
-            logging.error("[ComfyUI-Manager] Failed to retrieve the information of installed pip packages.")
-            return set()
+        freeze.sort(key=lambda x: x.lower())
+        return versions, freeze
 
-    return pip_map
+    def _pip_list(self):
+        # fallback for environments which importlib.metadata cannot scan
+        result = subprocess.check_output(make_pip_cmd(['list']), universal_newlines=True)
+
+        versions = {}
+        for line in result.split('\n'):
+            x = line.strip()
+            if x:
+                y = line.split()
+                if y[0] == 'Package' or y[0].startswith('-'):
+                    continue
+
+                normalized_name = y[0].lower().replace('-', '_')
+                versions[normalized_name] = y[1]
+
+        return versions, [f"{k}=={v}" for k, v in versions.items()]
+
+    def refresh(self, force=False):
+        with self.lock:
+            paths = self.get_paths()
+            state = self.get_state(paths)
+            if not force and state == self.state:
+                return
+
+            try:
+                self.versions, self.freeze = self._scan(paths)
+            except Exception as e:
+                logging.warning(f"[ComfyUI-Manager] Failed to scan installed distributions, fallback to `pip list`: {e}")
+                self.versions, self.freeze = self._pip_list()
+
+            self.state = state
+
+    def get_versions(self, force=False):
+        self.refresh(force)
+        return self.versions
+
+    def get_freeze_specs(self, force=False):
+        self.refresh(force)
+        return self.freeze
+
+    def invalidate(self):
+        with self.lock:
+            self.state = None
+
+
+installed_distributions = InstalledDistributions()
+
+
+def get_installed_packages(renew=False):
+    """
+    :return: normalized package name -> version
+    """
+    try:
+        return installed_distributions.get_versions(renew)
+    except subprocess.CalledProcessError:
+        logging.error("[ComfyUI-Manager] Failed to retrieve the information of installed pip packages.")
+        return {}
+
+
+def get_installed_freeze_specs(renew=False):
+    """
+    :return: `pip freeze` style specs of the installed packages
+    """
+    return installed_distributions.get_freeze_specs(renew)
 
 
 def clear_pip_cache():
-    global pip_map
-    pip_map = None
+    # the index is revalidated against site-packages on every access: this only forces a rescan on the next access
+    installed_distributions.invalidate()
 
 
 def parse_requirement_line(line):
@@ -306,6 +888,167 @@ def parse_requirement_line(line):
     return res
 
 
+index_options = {'--index-url', '-i', '--extra-index-url', '--find-links', '-f', '--no-index'}
+index_options_with_value = {'--index-url', '-i', '--extra-index-url', '--find-links', '-f'}
+
+
+def parse_requirements(lines, remap=None, skip=None):
+    """
+    Parse the lines of `requirements.txt` into install batches.
+
+    Requirements are grouped by their index options (e.g. `torch --index-url <url>`).
+    Option-only lines (e.g. `--extra-index-url <url>`) apply to every batch.
+
+    :param remap: callable(spec) -> spec (e.g. pip overrides)
+    :param skip: callable(spec) -> True if the requirement is already satisfied
+    :return: list of (index options, [spec, ...])
+    """
+    global_options = []
+    groups = OrderedDict()
+
+    for line in lines:
+        line = re.sub(r'(^|\s)#.*$', '', line).strip()  # comments
+        if not line:
+            continue
+
+        spec = []
+        options = []
+        tokens = line.split()
+        i = 0
+        while i < len(tokens):
+            x = tokens[i]
+            name = x.split('=', 1)[0] if x.startswith('--') else x
+            if name in index_options:
+                if name in index_options_with_value and name != x:
+                    options += [name, x.split('=', 1)[1]]   # --index-url=<url>
+                elif name in index_options_with_value and i + 1 < len(tokens):
+                    options += [name, tokens[i+1]]
+                    i += 1
+                else:
+                    options.append(x)
+            else:
+                spec.append(x)
+            i += 1
+
+        if not spec:
+            global_options += options
+            continue
+
+        spec = ' '.join(spec)
+        if remap is not None:
+            spec = remap(spec)
+
+        if not spec or (skip is not None and skip(spec)):
+            continue
+
+        groups.setdefault(tuple(options), []).append(spec)
+
+    return [(tuple(global_options) + k, v) for k, v in groups.items()]
+
+
+def find_constraint_conflicts(specs):
+    """
+    Find the requirements which cannot be satisfied together with the constraints.
+    Only the conflicts against exact pins (`==`) are detected here. Other conflicts are reported by the resolver.
+
+    :return: list of (spec, constraint)
+    """
+    if not use_pip_constraints or not pip_constraints:
+        return []
+
+    from packaging.requirements import Requirement, InvalidRequirement
+    from packaging.specifiers import SpecifierSet, InvalidSpecifier
+
+    res = []
+    for spec in specs:
+        try:
+            req = Requirement(spec)
+        except InvalidRequirement:
+            continue  # urls, editable, ...
+
+        for constraint in pip_constraints.get(InstalledDistributions.canonical_name(req.name), []):
+            try:
+                cons = Requirement(constraint).specifier
+            except (InvalidRequirement, InvalidSpecifier):
+                continue
+
+            pins = [x.version for x in cons if x.operator == '=='] + [x.version for x in req.specifier if x.operator == '==']
+            for v in pins:
+                if not (SpecifierSet(str(cons)).contains(v, prereleases=True) and req.specifier.contains(v, prereleases=True)):
+                    res.append((spec, constraint))
+                    break
+            else:
+                continue
+            break
+
+    return res
+
+
+def make_pip_install_cmd(specs, options=(), args=('install',)):
+    # a requirement is a single argument even if it contains spaces (e.g. `torch; sys_platform != "darwin"`)
+    return make_pip_cmd(list(args) + list(specs) + list(options))
+
+
+def install_requirements(batches, run):
+    """
+    Install the batches of `parse_requirements` with one pip invocation per batch.
+    If a batch fails, its requirements are installed one by one, so that a single broken requirement
+    doesn't prevent the others from being installed.
+
+    :param run: callable(cmd) -> True on success
+    :return: True if every requirement is installed
+    """
+    res = True
+    for options, specs in batches:
+        check_cancelled()
+        conflicts = find_constraint_conflicts(specs)
+        for spec, constraint in conflicts:
+            logging.error(f"[ComfyUI-Manager] '{spec}' is skipped: it conflicts with the protected package '{constraint}'")
+
+        if conflicts:
+            res = False
+            specs = [x for x in specs if x not in dict(conflicts)]
+            if not specs:
+                continue
+
+        if run(make_pip_install_cmd(specs, options)):
+            continue
+
+        if len(specs) == 1:
+            res = False
+            continue
+
+        logging.warning(f"[ComfyUI-Manager] Batch installation of {len(specs)} pip packages failed. Retry one by one.")
+        for x in specs:
+            check_cancelled()
+            if not run(make_pip_install_cmd([x], options)):
+                logging.error(f"[ComfyUI-Manager] Failed to install pip package: '{x}'")
+                res = False
+
+    return res
+
+
+def prefetch_wheels(batches, wheelhouse):
+    """
+    Download the batches of `parse_requirements` into `wheelhouse` with `pip download`,
+    so that the installation doesn't wait for the network. (not supported by uv)
+
+    :return: True if every batch is downloaded
+    """
+    if use_uv:
+        return False
+
+    os.makedirs(wheelhouse, exist_ok=True)
+
+    res = True
+    for options, specs in batches:
+        cmd = make_pip_install_cmd(specs, options, args=('download', '--quiet', '-d', wheelhouse))
+        if subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE).returncode != 0:
+            res = False
+
+    return res
+
+
 torch_torchvision_torchaudio_version_map = {
     '2.6.0': ('0.21.0', '2.6.0'),
     '2.5.1': ('0.20.0', '2.5.0'),
@@ -326,12 +1069,109 @@ torch_torchvision_torchaudio_version_map = {
 
 
 
+def refresh_pip_constraints(manager_files_path):
+    """
+    Write the constraints file which is passed to every `pip install` invocation,
+    so that the resolver never replaces the protected packages. (see PIPFixer.get_constraints)
+
+    Called once at the entry points (startup, task batch, cm-cli command), not for every node pack.
+    """
+    global pip_constraints_path, pip_constraints
+
+    if not use_pip_constraints:
+        return
+
+    constraints = PIPFixer(get_installed_packages(), None, manager_files_path).get_constraints()
+
+    path = os.path.join(manager_files_path, "pip_constraints.txt")
+    try:
+        os.makedirs(manager_files_path, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("# generated by ComfyUI-Manager from the installed packages. (don't edit)\n")
+            for x in constraints:
+                f.write(x + '\n')
+    except OSError as e:
+        logging.error(f"[ComfyUI-Manager] Failed to write pip constraints: {e}")
+        pip_constraints_path = None
+        pip_constraints = {}
+        return
+
+    parsed = {}
+    for x in constraints:
+        name = re.split(r'[<>=!~]', x, 1)[0]
+        parsed.setdefault(InstalledDistributions.canonical_name(name), []).append(x)
+
+    pip_constraints_path = path
+    pip_constraints = parsed
+
+
 class PIPFixer:
+    torch_packages = ['torch', 'torchvision', 'torchaudio']
+    opencv_packages = ['opencv-python', 'opencv-python-headless', 'opencv-contrib-python', 'opencv-contrib-python-headless']
+
     def __init__(self, prev_pip_versions, comfyui_path, manager_files_path):
         self.prev_pip_versions = { **prev_pip_versions }
         self.comfyui_path = comfyui_path
         self.manager_files_path = manager_files_path
 
+    def get_prev_version(self, name):
+        return self.prev_pip_versions.get(name.lower().replace('-', '_'))
+
+    def get_constraints(self):
+        """
+        Constraints which keep the current state of the packages that `fix_broken` would otherwise repair.
+        """
+        res = []
+
+        # torch: keep the installed build
+        for x in self.torch_packages:
+            ver = self.get_prev_version(x)
+            if ver is not None:
+                res.append(f"{x}=={ver}")
+
+        # numpy
+        np = self.get_prev_version('numpy')
+        if np is not None:
+            try:
+                if StrictVersion(np) < StrictVersion('2'):
+                    res.append("numpy<2")
+            except Exception:
+                pass
+
+        # opencv: all variants must have the same version
+        try:
+            versions = [self.get_prev_version(x) for x in self.opencv_packages]
+            versions = sorted([StrictVersion(x) for x in versions if x is not None], reverse=True)
+            if versions:
+                res += [f"{x}=={versions[0].version_string}" for x in self.opencv_packages]
+        except Exception:
+            pass
+
+        # downgrade blacklist
+        try:
+            import cm_global
+            for x in cm_global.pip_downgrade_blacklist:
+                x = x.strip()
+                ver = self.get_prev_version(x) if x else None
+                if ver is not None and x not in self.torch_packages:
+                    res.append(f"{x}>={ver}")
+        except ImportError:
+            pass
+
+        # pip_auto_fix.list
+        pip_auto_fix_path = os.path.join(self.manager_files_path, "pip_auto_fix.list")
+        if os.path.exists(pip_auto_fix_path):
+            with open(pip_auto_fix_path, 'r', encoding="UTF-8", errors="ignore") as f:
+                for x in f.readlines():
+                    try:
+                        parsed = parse_requirement_line(x)
+                        if parsed is not None and 'version' in parsed and 'operator' in parsed:
+                            res.append(parsed['package']+parsed['operator']+parsed['version'].version_string)
+                    except Exception:
+                        pass
+
+        return res
+
     def torch_rollback(self):
         spec = self.prev_pip_versions['torch'].split('+')
         if len(spec) > 0:
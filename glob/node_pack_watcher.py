@@ -0,0 +1,186 @@
+"""
+Keeps the installed node pack index of UnifiedManager up to date by watching `custom_nodes/*` and `custom_nodes/.disabled/*`.
+
+watchdog is used if it is installed, otherwise the directories are polled.
+Only the top level of the directories is watched. Changes inside of a node pack (e.g. git pull, version switch)
+are reported through `UnifiedManager.invalidate`.
+"""
+
+import logging
+import os
+import threading
+import time
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    watchdog_available = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    watchdog_available = False
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if os.path.basename(event.src_path) == '__pycache__':
+            return
+        self.watcher.mark_dirty()
+
+
+class NodePackWatcher:
+    def __init__(self, rescan, get_paths, poll_interval=2.0, debounce=0.5):
+        """
+        :param rescan: callable which rebuilds the index. (called from the watcher thread)
+        :param get_paths: callable which returns the list of `custom_nodes` paths
+        """
+        self.rescan = rescan
+        self.get_paths = get_paths
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.dirty = True
+        self.rescanning = False  # events during the rescan mark it dirty again
+        self.lost_sync = False
+        self.stopped = False
+        self.thread = None
+        self.observer = None
+        self.watched_dirs = None
+        self.poll_state = None
+
+    @property
+    def mode(self):
+        return 'watchdog' if watchdog_available else 'polling'
+
+    def is_in_sync(self):
+        """
+        True if the index reflects the current state of the filesystem.
+        """
+        with self.lock:
+            if self.thread is None or self.stopped or self.dirty or self.rescanning or self.lost_sync:
+                return False
+
+        return self.observer is None or self.observer.is_alive()
+
+    def mark_dirty(self):
+        with self.lock:
+            self.dirty = True
+        self.wakeup.set()
+
+    def get_watch_dirs(self):
+        res = []
+        for x in self.get_paths():
+            res.append(os.path.normpath(x))
+            disabled_dir = os.path.join(x, '.disabled')
+            if os.path.isdir(disabled_dir):
+                res.append(os.path.normpath(disabled_dir))
+        return res
+
+    def start(self):
+        if self.thread is not None:
+            return
+
+        self.thread = threading.Thread(target=self._run, name='NodePackWatcher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+        self.wakeup.set()
+        self._stop_observer()
+
+    def _stop_observer(self):
+        if self.observer is not None:
+            try:
+                self.observer.stop()
+            except Exception:
+                pass
+            self.observer = None
+
+    def _start_observer(self, dirs):
+        self._stop_observer()
+
+        if not watchdog_available:
+            return
+
+        try:
+            observer = Observer()
+            handler = _EventHandler(self)
+            for x in dirs:
+                observer.schedule(handler, x, recursive=False)
+            observer.daemon = True
+            observer.start()
+            self.observer = observer
+        except Exception as e:
+            logging.warning(f"[ComfyUI-Manager] Failed to start watchdog observer, fallback to polling: {e}")
+            self.observer = None
+
+    def _poll(self, dirs):
+        """
+        snapshot of the top level entries (name -> mtime) of the watched directories
+        """
+        res = {}
+        for d in dirs:
+            try:
+                res[d] = os.stat(d).st_mtime_ns
+                with os.scandir(d) as it:
+                    for x in it:
+                        if x.name != '__pycache__':
+                            res[x.path] = x.stat(follow_symlinks=False).st_mtime_ns
+            except OSError:
+                res[d] = None
+        return res
+
+    def _run(self):
+        while True:
+            with self.lock:
+                if self.stopped:
+                    return
+
+            dirs = self.get_watch_dirs()
+
+            # `.disabled` can be created later: re-schedule the observer
+            if dirs != self.watched_dirs or (self.observer is not None and not self.observer.is_alive()):
+                self.watched_dirs = dirs
+                self._start_observer(dirs)
+                self.poll_state = None
+                self.mark_dirty()
+
+            if self.observer is None:
+                state = self._poll(dirs)
+                if state != self.poll_state:
+                    self.poll_state = state
+                    self.mark_dirty()
+
+            with self.lock:
+                dirty = self.dirty
+
+            if dirty:
+                time.sleep(self.debounce)  # coalesce bursts of events (e.g. extracting an archive)
+
+                with self.lock:
+                    self.dirty = False
+                    self.rescanning = True
+                self.wakeup.clear()
+
+                try:
+                    self.rescan()
+                    with self.lock:
+                        self.lost_sync = False
+                except Exception as e:
+                    logging.error(f"[ComfyUI-Manager] Failed to update the node pack index: {e}")
+                    with self.lock:
+                        self.lost_sync = True
+                finally:
+                    with self.lock:
+                        self.rescanning = False
+
+                continue
+
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
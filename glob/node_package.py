@@ -2,11 +2,12 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import os
+from typing import Optional
 
 from git_utils import get_commit_hash
 
 
-@dataclass
+@dataclass(frozen=True)
 class InstalledNodePackage:
     """Information about an installed node package."""
 
@@ -70,3 +71,14 @@ class InstalledNodePackage:
         return InstalledNodePackage(
             id=node_id, fullpath=fullpath, disabled=disabled, version=version
         )
+
+
+@dataclass(frozen=True)
+class NodePackResolution:
+    """Immutable result of resolving a node pack directory."""
+
+    fullpath: str
+    fingerprint: tuple
+    package: InstalledNodePackage
+    resolved: bool              # False if the node pack couldn't be identified
+    url: Optional[str] = None   # normalized git url (unknown node pack only)
@@ -0,0 +1,242 @@
+"""
+Resolved pip lockfile of the whole environment.
+
+`generate_lock` resolves ComfyUI's requirements, the requirements of every enabled node pack and
+the installed torch build into one lockfile (`uv pip compile` if `use_uv`, otherwise `pip install --dry-run --report`).
+`sync_lock` installs exactly the locked versions with `--no-deps`, so no resolver runs at deploy time.
+"""
+
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+
+import manager_util
+
+
+LOCK_HEADER = "# generated by ComfyUI-Manager (cm-cli lock). Install with `cm-cli sync-lock <file>`"
+TORCH_INDEX_URL = "https://download.pytorch.org/whl"
+torch_packages = ['torch', 'torchvision', 'torchaudio']
+
+
+def collect_requirements(requirement_files, remap=None):
+    """
+    Merge requirement files into one input.
+
+    Index options of a requirement file are global in a merged input, so `--index-url` of a single requirement
+    becomes `--extra-index-url`.
+
+    :return: (options, specs)
+    """
+    options = []
+    specs = []
+
+    def add_options(x):
+        x = list(x)
+        i = 0
+        while i < len(x):
+            opt = x[i]
+            value = x[i+1] if opt in manager_util.index_options_with_value and i + 1 < len(x) else None
+            if opt in ['--index-url', '-i']:
+                opt = '--extra-index-url'
+            elif opt == '-f':
+                opt = '--find-links'
+
+            item = f"{opt} {value}" if value is not None else opt
+            if item not in options:
+                options.append(item)
+
+            i += 2 if value is not None else 1
+
+    for path in requirement_files:
+        if not os.path.exists(path):
+            continue
+
+        lines = manager_util.robust_readlines(path)
+        for group_options, group_specs in manager_util.parse_requirements(lines, remap=remap):
+            add_options(group_options)
+            for x in group_specs:
+                if x not in specs:
+                    specs.append(x)
+
+    return options, specs
+
+
+def get_spec_name(spec):
+    """ canonical package name of a requirement spec (None for urls and options) """
+    m = re.match(r'^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[|[<>=!~;@ ]|$)', spec.strip())
+    return manager_util.InstalledDistributions.canonical_name(m.group(1)) if m else None
+
+
+def get_torch_pins(versions):
+    """
+    Pins of the installed torch build. (e.g. torch==2.5.1+cu121 and the index of the `cu121` build)
+
+    :return: (options, specs)
+    """
+    specs = []
+    options = []
+    for x in torch_packages:
+        ver = versions.get(x)
+        if ver is not None:
+            specs.append(f"{x}=={ver}")
+
+            if '+' in ver:
+                item = f"--extra-index-url {TORCH_INDEX_URL}/{ver.split('+', 1)[1]}"
+                if item not in options:
+                    options.append(item)
+
+    return options, specs
+
+
+def write_requirements(path, options, specs, header=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        if header is not None:
+            f.write(header + '\n')
+        for x in options:
+            f.write(x + '\n')
+        for x in specs:
+            f.write(x + '\n')
+
+
+def read_lock(path):
+    """
+    :return: (options, specs)
+    """
+    options = []
+    specs = []
+    for line in manager_util.robust_readlines(path):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        if line.startswith('-'):
+            options.append(line)
+        else:
+            specs.append(line.split(' ; ')[0].split('  #')[0].strip())
+
+    return options, specs
+
+
+def _compile_with_uv(input_path, lock_path):
+    # `unsafe-best-match`: the torch index also hosts common packages (e.g. numpy) with only a few versions
+    cmd = manager_util.make_pip_cmd(['compile', input_path, '-o', lock_path, '--quiet', '--no-header',
+                                     '--index-strategy', 'unsafe-best-match'])
+    subprocess.check_call(cmd)
+
+    # `uv pip compile` doesn't keep the index options of the input
+    _, specs = read_lock(lock_path)
+    return specs
+
+
+def _compile_with_pip(input_path, report_path):
+    cmd = manager_util.make_pip_cmd(['install', '--dry-run', '--ignore-installed', '--quiet',
+                                     '--report', report_path, '-r', input_path], use_constraints=False)
+    subprocess.check_call(cmd)
+
+    with open(report_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+
+    specs = []
+    for x in report.get('install', []):
+        metadata = x['metadata']
+        download_info = x.get('download_info', {})
+
+        if 'vcs_info' in download_info:
+            vcs = download_info['vcs_info']
+            specs.append(f"{metadata['name']} @ {vcs['vcs']}+{download_info['url']}@{vcs['commit_id']}")
+        elif 'dir_info' in download_info or x.get('is_direct'):
+            specs.append(f"{metadata['name']} @ {download_info['url']}")
+        else:
+            specs.append(f"{metadata['name']}=={metadata['version']}")
+
+    return sorted(specs, key=lambda s: s.lower())
+
+
+def generate_lock(requirement_files, lock_path, remap=None):
+    """
+    Resolve `requirement_files` together with the installed torch build into `lock_path`.
+
+    :return: True on success
+    """
+    options, specs = collect_requirements(requirement_files, remap=remap)
+
+    torch_options, torch_specs = get_torch_pins(manager_util.get_installed_packages())
+    options = torch_options + [x for x in options if x not in torch_options]
+
+    # the installed torch build wins over the requirements of node packs
+    specs = torch_specs + [x for x in specs if get_spec_name(x) not in torch_packages]
+
+    # protected packages are kept as they are now (see manager_util.refresh_pip_constraints)
+    if manager_util.use_pip_constraints and manager_util.pip_constraints_path and os.path.exists(manager_util.pip_constraints_path):
+        options.append(f"--constraint {manager_util.pip_constraints_path}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, 'requirements.in')
+        write_requirements(input_path, options, specs)
+
+        try:
+            if manager_util.use_uv:
+                locked = _compile_with_uv(input_path, os.path.join(tmp, 'lock.txt'))
+            else:
+                locked = _compile_with_pip(input_path, os.path.join(tmp, 'report.json'))
+        except subprocess.CalledProcessError as e:
+            logging.error(f"[ComfyUI-Manager] Failed to resolve the requirements: {e}")
+            return False
+
+    lock_options = [x for x in options if not x.startswith('--constraint ')]
+    write_requirements(lock_path, lock_options, locked, header=LOCK_HEADER)
+    print(f"Lockfile is generated: {lock_path} ({len(locked)} packages)")
+    return True
+
+
+def get_unsatisfied(specs):
+    """
+    exclude the exact pins which are already installed
+    """
+    canonical_name = manager_util.InstalledDistributions.canonical_name
+    versions = {canonical_name(k): v for k, v in manager_util.get_installed_packages().items()}
+
+    res = []
+    for x in specs:
+        name = get_spec_name(x)
+        if name is not None and '==' in x and ' @ ' not in x:
+            ver = x.split('==', 1)[1].strip()
+            if versions.get(name) == ver:
+                continue
+        res.append(x)
+
+    return res
+
+
+def sync_lock(lock_path):
+    """
+    Install the locked versions in one pass without resolving dependencies.
+
+    :return: True on success
+    """
+    options, specs = read_lock(lock_path)
+    specs = get_unsatisfied(specs)
+
+    if not specs:
+        print("All packages of the lockfile are already installed.")
+        return True
+
+    print(f"Install {len(specs)} packages from the lockfile: {lock_path}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'lock.txt')
+        write_requirements(path, options, specs)
+
+        # the lockfile is the authority: the constraints of the current environment aren't applied
+        cmd = manager_util.make_pip_cmd(['install', '--no-deps', '-r', path], use_constraints=False)
+        try:
+            subprocess.check_call(cmd)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"[ComfyUI-Manager] Failed to install the lockfile: {e}")
+            return False
+
+    manager_util.clear_pip_cache()
+    return True
@@ -1,5 +1,6 @@
 import mimetypes
 import manager_core as core
+import manager_util
 import os
 from aiohttp import web
 import aiohttp
@@ -263,33 +264,32 @@ async def share_art(request):
         share_website_host = "https://comfyworkflows.com"
         share_endpoint = f"{share_website_host}/api"
 
+        session = manager_util.get_session()
+
         # get presigned urls
-        async with aiohttp.ClientSession(trust_env=True, connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
-            async with session.post(
-                    f"{share_endpoint}/get_presigned_urls",
-                    json={
-                        "assetFileName": asset_filename,
-                        "assetFileType": assetFileType,
-                        "workflowJsonFileName": 'workflow.json',
-                        "workflowJsonFileType": 'application/json',
-                    },
-            ) as resp:
-                assert resp.status == 200
-                presigned_urls_json = await resp.json()
-                assetFilePresignedUrl = presigned_urls_json["assetFilePresignedUrl"]
-                assetFileKey = presigned_urls_json["assetFileKey"]
-                workflowJsonFilePresignedUrl = presigned_urls_json["workflowJsonFilePresignedUrl"]
-                workflowJsonFileKey = presigned_urls_json["workflowJsonFileKey"]
+        async with session.post(
+                f"{share_endpoint}/get_presigned_urls",
+                json={
+                    "assetFileName": asset_filename,
+                    "assetFileType": assetFileType,
+                    "workflowJsonFileName": 'workflow.json',
+                    "workflowJsonFileType": 'application/json',
+                },
+        ) as resp:
+            assert resp.status == 200
+            presigned_urls_json = await resp.json()
+            assetFilePresignedUrl = presigned_urls_json["assetFilePresignedUrl"]
+            assetFileKey = presigned_urls_json["assetFileKey"]
+            workflowJsonFilePresignedUrl = presigned_urls_json["workflowJsonFilePresignedUrl"]
+            workflowJsonFileKey = presigned_urls_json["workflowJsonFileKey"]
 
         # upload asset
-        async with aiohttp.ClientSession(trust_env=True, connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
-            async with session.put(assetFilePresignedUrl, data=open(asset_filepath, "rb")) as resp:
-                assert resp.status == 200
+        async with session.put(assetFilePresignedUrl, data=open(asset_filepath, "rb")) as resp:
+            assert resp.status == 200
 
         # upload workflow json
-        async with aiohttp.ClientSession(trust_env=True, connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
-            async with session.put(workflowJsonFilePresignedUrl, data=json.dumps(prompt['workflow']).encode('utf-8')) as resp:
-                assert resp.status == 200
+        async with session.put(workflowJsonFilePresignedUrl, data=json.dumps(prompt['workflow']).encode('utf-8')) as resp:
+            assert resp.status == 200
 
         model_filenames = extract_model_file_names(prompt['workflow'])
         model_file_paths = find_file_paths(folder_paths.base_path, model_filenames)
@@ -303,30 +303,29 @@ async def share_art(request):
             }
 
         # make a POST request to /api/upload_workflow with form data key values
-        async with aiohttp.ClientSession(trust_env=True, connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
-            form = aiohttp.FormData()
-            if comfyworkflows_sharekey:
-                form.add_field("shareKey", comfyworkflows_sharekey)
-            form.add_field("source", "comfyui_manager")
-            form.add_field("assetFileKey", assetFileKey)
-            form.add_field("assetFileType", assetFileType)
-            form.add_field("workflowJsonFileKey", workflowJsonFileKey)
-            form.add_field("sharedWorkflowWorkflowJsonString", json.dumps(prompt['workflow']))
-            form.add_field("sharedWorkflowPromptJsonString", json.dumps(prompt['output']))
-            form.add_field("shareWorkflowCredits", credits)
-            form.add_field("shareWorkflowTitle", title)
-            form.add_field("shareWorkflowDescription", description)
-            form.add_field("shareWorkflowIsNSFW", str(is_nsfw).lower())
-            form.add_field("currentSnapshot", json.dumps(await core.get_current_snapshot()))
-            form.add_field("modelsInfo", json.dumps(models_info))
-
-            async with session.post(
-                    f"{share_endpoint}/upload_workflow",
-                    data=form,
-            ) as resp:
-                assert resp.status == 200
-                upload_workflow_json = await resp.json()
-                workflowId = upload_workflow_json["workflowId"]
+        form = aiohttp.FormData()
+        if comfyworkflows_sharekey:
+            form.add_field("shareKey", comfyworkflows_sharekey)
+        form.add_field("source", "comfyui_manager")
+        form.add_field("assetFileKey", assetFileKey)
+        form.add_field("assetFileType", assetFileType)
+        form.add_field("workflowJsonFileKey", workflowJsonFileKey)
+        form.add_field("sharedWorkflowWorkflowJsonString", json.dumps(prompt['workflow']))
+        form.add_field("sharedWorkflowPromptJsonString", json.dumps(prompt['output']))
+        form.add_field("shareWorkflowCredits", credits)
+        form.add_field("shareWorkflowTitle", title)
+        form.add_field("shareWorkflowDescription", description)
+        form.add_field("shareWorkflowIsNSFW", str(is_nsfw).lower())
+        form.add_field("currentSnapshot", json.dumps(await core.get_current_snapshot()))
+        form.add_field("modelsInfo", json.dumps(models_info))
+
+        async with session.post(
+                f"{share_endpoint}/upload_workflow",
+                data=form,
+        ) as resp:
+            assert resp.status == 200
+            upload_workflow_json = await resp.json()
+            workflowId = upload_workflow_json["workflowId"]
 
     # check if the user has provided Matrix credentials
     if "matrix" in share_destinations:
@@ -0,0 +1,53 @@
+"""
+Operations of a queued batch: (kind, item) pairs as they are built by the `make_*_task` functions of manager_server.
+"""
+
+
+def get_task_target(kind, item):
+    """
+    node pack (or model) which is the target of a task. None if the task has no specific target
+    """
+    if kind == 'install':
+        return item[1].split('@')[0]
+    elif kind == 'install-model':
+        json_data = item[1]
+        return f"model:{json_data.get('save_path')}/{json_data.get('filename')}"
+    elif kind == 'update-comfyui':
+        return 'comfyui'
+    elif kind in ['update', 'update-main', 'fix', 'uninstall', 'disable', 'enable']:
+        return item[1]
+
+    return None
+
+
+def dedupe_tasks(tasks, is_installed=None):
+    """
+    Drop the operations which are superseded by a later operation on the same target:
+    * the same kind of operation (e.g. a duplicated request, install of another version)
+    * install/update/fix/enable followed by uninstall
+
+    An uninstall which only superseded the install of a node pack that isn't installed is dropped as well.
+
+    :param is_installed: callable(target) -> True if the node pack is installed
+    :return: (tasks to queue, dropped tasks)
+    """
+    res = []
+    dropped = []
+    for kind, item in tasks:
+        target = get_task_target(kind, item)
+        if target is not None:
+            superseded = [x for x in res if get_task_target(*x) == target
+                          and (x[0] == kind or (kind == 'uninstall' and x[0] in ['install', 'update', 'fix', 'enable']))]
+            for x in superseded:
+                res.remove(x)
+                dropped.append(x)
+
+            if kind == 'uninstall' and superseded and all(x[0] == 'install' for x in superseded) \
+                    and not any(get_task_target(*x) == target for x in res) \
+                    and is_installed is not None and not is_installed(target):
+                dropped.append((kind, item))
+                continue
+
+        res.append((kind, item))
+
+    return res, dropped
@@ -0,0 +1,142 @@
+"""
+Durable journal of the manager task queue.
+
+Every queued task is recorded in `<manager_files_path>/task-queue.db` with its state:
+
+* queued  - enqueued, not started yet
+* running - started (a task left in this state was interrupted by a restart)
+* done    - finished, `result` holds the message reported to the UI
+
+Finished tasks are kept until the results of the batch are delivered (`purge_done`),
+so the results survive a restart as well. On startup, the incomplete tasks are queued again (see `get_incomplete`).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+SCHEMA_VERSION = 1
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+
+
+class TaskJournal:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is not None:
+            return self.conn
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass  # e.g. network filesystem
+
+        ver = conn.execute("PRAGMA user_version").fetchone()[0]
+        if ver != SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS tasks")
+
+        conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                item TEXT NOT NULL,
+                state TEXT NOT NULL,
+                result TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                priority INTEGER NOT NULL DEFAULT 1,
+                queued_at REAL,
+                started_at REAL,
+                finished_at REAL
+            );
+            PRAGMA user_version={SCHEMA_VERSION};
+        """)
+        conn.commit()
+
+        self.conn = conn
+        return conn
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def _execute(self, sql, params=()):
+        """
+        NOTE: the queue keeps working without the journal. (e.g. read-only user directory)
+
+        :return: (lastrowid, rows)
+        """
+        with self.lock:
+            try:
+                conn = self._connect()
+                with conn:
+                    cur = conn.execute(sql, params)
+                    return cur.lastrowid, cur.fetchall()
+            except (sqlite3.Error, OSError) as e:
+                logging.warning(f"[ComfyUI-Manager] task journal is not available: {e}")
+                return None, []
+
+    def enqueue(self, kind, item, priority=1):
+        """
+        :return: task id (None if the task isn't recorded)
+        """
+        task_id, _ = self._execute("INSERT INTO tasks(kind, item, state, priority, queued_at) VALUES (?, ?, ?, ?, ?)",
+                                   (kind, json.dumps(item), QUEUED, priority, time.time()))
+        return task_id
+
+    def start(self, task_id):
+        self._execute("UPDATE tasks SET state=?, attempts=attempts+1, started_at=? WHERE id=?",
+                      (RUNNING, time.time(), task_id))
+
+    def finish(self, task_id, result):
+        self._execute("UPDATE tasks SET state=?, result=?, finished_at=? WHERE id=?",
+                      (DONE, json.dumps(result), time.time(), task_id))
+
+    def discard(self, task_id):
+        self._execute("DELETE FROM tasks WHERE id=?", (task_id,))
+
+    def clear_queued(self):
+        self._execute("DELETE FROM tasks WHERE state=?", (QUEUED,))
+
+    def purge_done(self):
+        self._execute("DELETE FROM tasks WHERE state=?", (DONE,))
+
+    def get_incomplete(self):
+        """
+        :return: list of (task id, kind, item, priority, interrupted) in the queued order.
+                 `interrupted` is True if the task was started but not finished.
+        """
+        _, rows = self._execute("SELECT id, kind, item, priority, state FROM tasks WHERE state!=? ORDER BY id", (DONE,))
+
+        res = []
+        for task_id, kind, item, priority, state in rows:
+            try:
+                item = json.loads(item)
+            except ValueError:
+                logging.warning(f"[ComfyUI-Manager] Drop the broken task record: {task_id}")
+                self._execute("DELETE FROM tasks WHERE id=?", (task_id,))
+                continue
+
+            res.append((task_id, kind, tuple(item) if isinstance(item, list) else item, priority, state == RUNNING))
+
+        return res
+
+    def get_done(self):
+        """
+        :return: list of (kind, item, result) of the finished tasks which are not reported yet
+        """
+        _, rows = self._execute("SELECT kind, item, result FROM tasks WHERE state=? ORDER BY id", (DONE,))
+        return [(kind, json.loads(item), json.loads(result)) for kind, item, result in rows]
@@ -0,0 +1,311 @@
+"""
+Resource-aware scheduler of the manager task queue.
+
+Tasks are executed by a pool of worker threads (each with its own event loop). Every task has a resource class:
+
+* network     - fetch/clone/download. run in parallel (per-host limits are applied by git_engine)
+* environment - pip/uv and `install.py`. at most one at a time
+* filesystem  - renames/removals of a node pack
+* exclusive   - runs alone (e.g. updating ComfyUI)
+
+Tasks with the same key (node pack id) never run concurrently and keep their queued order.
+
+Pending tasks are picked by priority lane (interactive > normal > background), in queued order within a lane.
+A task is cancelled by `task.context.cancel()`: a pending task is just dropped by the caller,
+a running task is interrupted. (see `manager_util.TaskContext`)
+Steps of a task which run in `asyncio.to_thread` cannot be interrupted, so the key of a cancelled task stays
+reserved until those threads are finished.
+
+NOTE: pip/uv and `install.py` executed as a part of a network task are serialized by `manager_core.env_lock`.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import manager_util
+
+
+NETWORK = 'network'
+ENVIRONMENT = 'environment'
+FILESYSTEM = 'filesystem'
+EXCLUSIVE = 'exclusive'
+
+INTERACTIVE = 0     # single operations requested from the UI
+NORMAL = 1
+BACKGROUND = 2      # e.g. update all
+
+PRIORITIES = {'interactive': INTERACTIVE, 'normal': NORMAL, 'background': BACKGROUND}
+
+# moving average of the elapsed time per kind of task (seconds). used for the ETA
+durations = {}
+
+
+@dataclass(eq=False)
+class Task:
+    kind: str
+    item: Any
+    resource: str = NETWORK
+    key: Optional[str] = None
+    task_id: Optional[int] = None   # id in the task journal
+    resumed: bool = False           # interrupted by a restart and queued again
+    priority: int = NORMAL
+    context: manager_util.TaskContext = field(default_factory=manager_util.TaskContext)
+    queued_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+
+
+def get_priority(name, default=NORMAL):
+    """
+    :param name: name of a lane ('interactive', 'normal', 'background')
+    """
+    return PRIORITIES.get(name, default)
+
+
+def get_priority_name(priority):
+    for k, v in PRIORITIES.items():
+        if v == priority:
+            return k
+    return None
+
+
+def record_duration(kind, elapsed):
+    avg = durations.get(kind)
+    durations[kind] = elapsed if avg is None else avg * 0.7 + elapsed * 0.3
+
+
+def get_remaining_time(task, now):
+    """
+    :return: estimated remaining seconds of a running task, None if unknown
+    """
+    elapsed = now - task.started_at
+    progress = task.context.progress
+    if progress is not None:
+        done, total = progress
+        if total and done:
+            return max(0.0, elapsed * (total - done) / done)
+
+    avg = durations.get(task.kind)
+    if avg is not None:
+        return max(0.0, avg - elapsed)
+
+    return None
+
+
+class TaskScheduler:
+    def __init__(self, fetch, execute, workers=4):
+        """
+        :param fetch: callable() -> list of new Tasks. (called under the scheduler lock)
+        :param execute: async callable(task) executed in a worker thread
+        """
+        self.fetch = fetch
+        self.execute = execute
+        self.workers = max(1, workers)
+
+        self.cond = threading.Condition()
+        self.pending = deque()
+        self.running = []
+
+    def _refill(self):
+        self.pending.extend(self.fetch())
+
+    def _can_run(self, task):
+        if any(x.resource == EXCLUSIVE for x in self.running):
+            return False
+
+        if task.resource == EXCLUSIVE:
+            return not self.running
+
+        if task.key is not None and any(x.key == task.key for x in self.running):
+            return False
+
+        if task.resource == ENVIRONMENT and any(x.resource == ENVIRONMENT for x in self.running):
+            return False
+
+        return True
+
+    def _ordered(self):
+        """
+        :return: pending tasks in the order of execution (by priority, queued order within a priority)
+        """
+        # a task waits for the earlier tasks of the same node pack, so it is delayed to their lane
+        lanes = {}
+        effective = {}
+        for task in self.pending:
+            priority = task.priority
+            if task.key is not None:
+                priority = max(priority, lanes.get(task.key, priority))
+                lanes[task.key] = priority
+            effective[task] = priority
+
+        return sorted(self.pending, key=lambda x: effective[x])
+
+    def _pick(self):
+        """
+        :return: next runnable task, None if nothing is runnable now
+        """
+        # only the first queued task of a node pack is a candidate, regardless of the priority
+        heads = {}
+        for task in self.pending:
+            if task.key is not None:
+                heads.setdefault(task.key, task)
+
+        for task in self._ordered():
+            if task.key is not None and heads[task.key] is not task:
+                continue  # keep the order of the tasks of a node pack
+
+            if self._can_run(task):
+                self.pending.remove(task)
+                self.running.append(task)
+                task.started_at = time.time()
+                return task
+
+            if task.resource == EXCLUSIVE:
+                break  # later tasks must not overtake an exclusive task
+
+        return None
+
+    def remove_pending(self, predicate):
+        """
+        :return: removed tasks
+        """
+        with self.cond:
+            removed = [x for x in self.pending if predicate(x)]
+            for x in removed:
+                self.pending.remove(x)
+            self.cond.notify_all()
+            return removed
+
+    def clear_pending(self):
+        with self.cond:
+            self.pending.clear()
+            self.cond.notify_all()
+
+    def counts(self):
+        with self.cond:
+            return len(self.pending), len(self.running)
+
+    def find(self, predicate):
+        """
+        :return: (pending tasks, running tasks) which match the predicate
+        """
+        with self.cond:
+            return [x for x in self.pending if predicate(x)], [x for x in self.running if predicate(x)]
+
+    def snapshot(self):
+        """
+        :return: list of (task, state, eta) of the running and pending tasks.
+                 `eta` is the estimated seconds until the task is completed (None if unknown)
+        """
+        with self.cond:
+            now = time.time()
+            res = []
+
+            # the workers are assumed to be busy for the remaining time of the running tasks
+            backlog = 0.0
+            known = True
+            for task in self.running:
+                eta = get_remaining_time(task, now)
+                res.append((task, 'running', eta))
+                if eta is None:
+                    known = False
+                else:
+                    backlog += eta
+
+            for task in self._ordered():
+                avg = durations.get(task.kind)
+                if avg is None:
+                    known = False
+                else:
+                    backlog += avg
+                res.append((task, 'queued', backlog / self.workers if known else None))
+
+            return res
+
+    def next_task(self):
+        """
+        Block until a task is runnable.
+
+        :return: task, or None if all tasks are completed
+        """
+        with self.cond:
+            while True:
+                self._refill()
+
+                task = self._pick()
+                if task is not None:
+                    return task
+
+                if not self.pending and not self.running:
+                    self.cond.notify_all()
+                    return None
+
+                # woken up by a finished task, re-check for new tasks periodically
+                self.cond.wait(0.5)
+
+    def task_done(self, task):
+        with self.cond:
+            self.running.remove(task)
+            if not task.context.cancelled:
+                record_duration(task.kind, time.time() - task.started_at)
+            self.cond.notify_all()
+
+    async def _run_task(self, task, executor):
+        # the context is visible from the task and the threads of `asyncio.to_thread`
+        manager_util.task_context.set(task.context)
+
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(executor)
+        atask = asyncio.ensure_future(self.execute(task))
+
+        def cancel():
+            try:
+                loop.call_soon_threadsafe(atask.cancel)
+            except RuntimeError:
+                pass  # the worker is already finished
+
+        task.context.on_cancel(cancel)
+        await atask
+
+    async def _worker(self):
+        while True:
+            task = self.next_task()
+            if task is None:
+                return
+
+            # `asyncio.to_thread` of the task runs in its own executor
+            executor = ThreadPoolExecutor(thread_name_prefix='ManagerTaskStep')
+            try:
+                # run in a copied context, so the context of a task isn't leaked into the next task
+                await asyncio.ensure_future(self._run_task(task, executor))
+            except asyncio.CancelledError:
+                logging.info(f"[ComfyUI-Manager] The task is cancelled: {task.kind} {task.key}")
+            except Exception:
+                traceback.print_exc()
+            finally:
+                # a cancelled task may leave a step running in a thread, which still writes into the node pack
+                executor.shutdown(wait=True)
+                self.task_done(task)
+
+    def run(self):
+        """
+        Run the tasks until the queue is drained. (blocking)
+        """
+        def worker():
+            try:
+                manager_util.run_async(self._worker())
+            except Exception:
+                logging.error("[ComfyUI-Manager] task worker is terminated unexpectedly")
+                traceback.print_exc()
+
+        threads = [threading.Thread(target=worker, name=f'ManagerTaskWorker-{i}', daemon=True) for i in range(self.workers)]
+        for x in threads:
+            x.start()
+        for x in threads:
+            x.join()
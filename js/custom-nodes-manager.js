@@ -1475,6 +1475,7 @@ export class CustomNodesManager {
 		await api.fetchApi('/manager/queue/reset');
 
 		let target_items = [];
+		let operations = [];
 
 		for (const hash of list) {
 			const item = this.grid.getRowItemBy("hash", hash);
@@ -1517,23 +1518,37 @@ export class CustomNodesManager {
 				api_mode = 'reinstall';
 			}
 
-			const res = await api.fetchApi(`/manager/queue/${api_mode}`, {
+			operations.push({ op: api_mode, data: data });
+		}
+
+		if(!errorMsg && operations.length) {
+			// validated and queued at once: nothing is queued if any operation is rejected
+			const res = await api.fetchApi('/manager/queue/batch', {
 				method: 'POST',
-				body: JSON.stringify(data)
+				body: JSON.stringify({ operations: operations })
 			});
 
 			if (res.status != 200) {
-				errorMsg = `'${item.title}': `;
-
-				if(res.status == 403) {
-					errorMsg += `This action is not allowed with this security level configuration.\n`;
-				} else if(res.status == 404) {
-					errorMsg += `With the current security level configuration, only custom nodes from the <B>"default channel"</B> can be installed.\n`;
-				} else {
-					errorMsg += await res.text() + '\n';
+				let errors = [];
+				try {
+					errors = (await res.json()).errors || [];
+				}
+				catch {
+					errors = [{ index: 0, status: res.status, text: '' }];
 				}
 
-				break;
+				for(const error of errors) {
+					const item = target_items[error.index];
+					errorMsg += `'${item ? item.title : error.ui_id}': `;
+
+					if(error.status == 403) {
+						errorMsg += `This action is not allowed with this security level configuration.\n`;
+					} else if(error.status == 404) {
+						errorMsg += `With the current security level configuration, only custom nodes from the <B>"default channel"</B> can be installed.\n`;
+					} else {
+						errorMsg += (error.text || '') + '\n';
+					}
+				}
 			}
 		}
 
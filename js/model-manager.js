@@ -430,6 +430,7 @@ export class ModelManager {
 		await api.fetchApi('/manager/queue/reset');
 
 		let target_items = [];
+		let operations = [];
 
 		for (const item of list) {
 			this.grid.scrollRowIntoView(item);
@@ -446,21 +447,35 @@ export class ModelManager {
 			const data = item.originalData;
 			data.ui_id = item.hash;
 
-			const res = await api.fetchApi(`/manager/queue/install_model`, {
+			operations.push({ op: 'install_model', data: data });
+		}
+
+		if(operations.length) {
+			// validated and queued at once: nothing is queued if any model is rejected
+			const res = await api.fetchApi('/manager/queue/batch', {
 				method: 'POST',
-				body: JSON.stringify(data)
+				body: JSON.stringify({ operations: operations })
 			});
 
 			if (res.status != 200) {
-				errorMsg = `'${item.name}': `;
-
-				if(res.status == 403) {
-					errorMsg += `This action is not allowed with this security level configuration.\n`;
-				} else {
-					errorMsg += await res.text() + '\n';
+				let errors = [];
+				try {
+					errors = (await res.json()).errors || [];
+				}
+				catch {
+					errors = [{ index: 0, status: res.status, text: '' }];
 				}
 
-				break;
+				for(const error of errors) {
+					const item = target_items[error.index];
+					errorMsg += `'${item ? item.name : error.ui_id}': `;
+
+					if(error.status == 403) {
+						errorMsg += `This action is not allowed with this security level configuration.\n`;
+					} else {
+						errorMsg += (error.text || '') + '\n';
+					}
+				}
 			}
 		}
 
@@ -111,6 +111,10 @@ def read_uv_mode():
     if 'use_uv' in default_conf:
         manager_util.use_uv = default_conf['use_uv'].lower() == 'true'
 
+def read_pip_constraints_mode():
+    if 'pip_constraints' in default_conf:
+        manager_util.use_pip_constraints = default_conf['pip_constraints'].lower() == 'true'
+
 def check_file_logging():
     global enable_file_logging
     if 'file_logging' in default_conf and default_conf['file_logging'].lower() == 'false':
@@ -119,6 +123,7 @@ def check_file_logging():
 
 read_config()
 read_uv_mode()
+read_pip_constraints_mode()
 check_file_logging()
 
 cm_global.pip_overrides = {'numpy': 'numpy<2', 'ultralytics': 'ultralytics==8.3.40'}
@@ -510,6 +515,7 @@ check_bypass_ssl()
 # Perform install
 processed_install = set()
 script_list_path = os.path.join(folder_paths.user_directory, "default", "ComfyUI-Manager", "startup-scripts", "install-scripts.txt")
+manager_util.refresh_pip_constraints(manager_files_path)
 pip_fixer = manager_util.PIPFixer(manager_util.get_installed_packages(), comfy_path, manager_files_path)
 
 
@@ -619,16 +625,8 @@ def execute_lazy_install_script(repo_path, executable):
         print(f"Install: pip packages for '{repo_path}'")
 
         lines = manager_util.robust_readlines(requirements_path)
-        for line in lines:
-            package_name = remap_pip_package(line.strip())
-            if package_name and not is_installed(package_name):
-                if '--index-url' in package_name:
-                    s = package_name.split('--index-url')
-                    install_cmd = manager_util.make_pip_cmd(["install", s[0].strip(), '--index-url', s[1].strip()])
-                else:
-                    install_cmd = manager_util.make_pip_cmd(["install", package_name])
-
-                process_wrap(install_cmd, repo_path)
+        batches = manager_util.parse_requirements(lines, remap=remap_pip_package, skip=is_installed)
+        manager_util.install_requirements(batches, lambda cmd: process_wrap(cmd, repo_path) == 0)
 
     if os.path.exists(install_script_path) and f'{repo_path}/install.py' not in processed_install:
         processed_install.add(f'{repo_path}/install.py')
@@ -784,6 +782,31 @@ def execute_startup_script():
     print("#######################################################################\n")
 
 
+def remove_interrupted_installs():
+    """
+    Remove the node packs whose installation was interrupted. (marked by `.<name>.cm-installing`)
+    The interrupted tasks are queued again by the task journal of ComfyUI-Manager.
+    """
+    for base in folder_paths.get_folder_paths('custom_nodes'):
+        if not os.path.isdir(base):
+            continue
+
+        for x in os.listdir(base):
+            if not (x.startswith('.') and x.endswith('.cm-installing')):
+                continue
+
+            path = os.path.join(base, x[1:-len('.cm-installing')])
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                    logging.info(f"## ComfyUI-Manager: DELETE => '{path}' (interrupted installation)")
+                os.remove(os.path.join(base, x))
+            except Exception as e:
+                logging.error(f"## ComfyUI-Manager: Failed to delete '{path}' ({e})")
+
+
+remove_interrupted_installs()
+
 # Check if script_list_path exists
 if os.path.exists(script_list_path):
     execute_startup_script()
@@ -0,0 +1,139 @@
+"""
+Concurrent paginated fetch of ComfyRegistry `/nodes` against a local mock registry server.
+"""
+
+import asyncio
+
+import pytest
+from aiohttp import web
+
+import cnr_utils
+import manager_util
+
+
+class MockRegistry:
+    """
+    `/nodes` split into pages of `page_size`. A failure plan per page is consumed one response at a time.
+    """
+    def __init__(self, nodes, page_size, failures=None, delays=None):
+        self.nodes = nodes
+        self.page_size = page_size
+        self.failures = {k: list(v) for k, v in (failures or {}).items()}   # page -> [status, ...]
+        self.delays = delays or {}                                          # page -> seconds
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def total_pages(self):
+        return (len(self.nodes) + self.page_size - 1) // self.page_size
+
+    async def handle_nodes(self, request):
+        page = int(request.query['page'])
+        self.requests.append(page)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(page, 0))
+
+            plan = self.failures.get(page)
+            if plan:
+                return web.Response(status=plan.pop(0), headers={'Retry-After': '0'})
+
+            start = (page - 1) * self.page_size
+            return web.json_response({'nodes': self.nodes[start:start + self.page_size],
+                                      'totalPages': self.total_pages, 'page': page})
+        finally:
+            self.in_flight -= 1
+
+
+def fetch_from(registry, monkeypatch, **options):
+    async def run():
+        app = web.Application()
+        app.router.add_get('/nodes', registry.handle_nodes)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        monkeypatch.setattr(cnr_utils, 'base_url', f'http://127.0.0.1:{port}')
+        try:
+            return await cnr_utils.fetch_all_nodes()
+        finally:
+            await manager_util.close_session()
+            await runner.cleanup()
+
+    monkeypatch.setattr(cnr_utils, 'get_registry_query_params', lambda: ('v0.3.0', 'git-linux'))
+    monkeypatch.setattr(cnr_utils, 'page_size', registry.page_size)
+    monkeypatch.setattr(cnr_utils, 'retry_backoff', 0.01)
+    for k, v in options.items():
+        monkeypatch.setattr(cnr_utils, k, v)
+
+    return asyncio.run(run())
+
+
+def make_nodes(count):
+    return [{'id': f'node-{i:03}', 'latest_version': {'version': '1.0.0'}} for i in range(count)]
+
+
+def test_pages_are_merged_in_order(monkeypatch):
+    nodes = make_nodes(23)
+    # later pages respond first
+    registry = MockRegistry(nodes, page_size=5, delays={2: 0.2, 3: 0.1})
+
+    res = fetch_from(registry, monkeypatch, max_concurrent_pages=8)
+
+    assert [x['id'] for x in res['nodes']] == [x['id'] for x in nodes]
+    assert sorted(registry.requests) == [1, 2, 3, 4, 5]
+
+
+def test_concurrency_is_bounded(monkeypatch):
+    registry = MockRegistry(make_nodes(40), page_size=2, delays={i: 0.05 for i in range(2, 21)})
+
+    res = fetch_from(registry, monkeypatch, max_concurrent_pages=3)
+
+    assert len(res['nodes']) == 40
+    assert 1 < registry.max_in_flight <= 3
+
+
+def test_duplicated_node_keeps_the_later_page(monkeypatch):
+    nodes = make_nodes(4) + [{'id': 'node-001', 'latest_version': {'version': '2.0.0'}}, {'id': 'no-version'}]
+    registry = MockRegistry(nodes, page_size=2)
+
+    res = fetch_from(registry, monkeypatch)
+
+    by_id = {x['id']: x for x in res['nodes']}
+    assert len(res['nodes']) == 5
+    assert by_id['node-001']['latest_version']['version'] == '2.0.0'
+    assert by_id['no-version']['latest_version'] == {'version': 'nightly'}
+
+
+def test_retry_on_429_and_server_errors(monkeypatch):
+    registry = MockRegistry(make_nodes(6), page_size=2, failures={1: [429], 2: [429, 503], 3: [500]})
+
+    res = fetch_from(registry, monkeypatch, max_page_retries=4)
+
+    assert len(res['nodes']) == 6
+    assert registry.requests.count(1) == 2
+    assert registry.requests.count(2) == 3
+    assert registry.requests.count(3) == 2
+
+
+def test_retries_are_exhausted(monkeypatch):
+    registry = MockRegistry(make_nodes(6), page_size=2, failures={2: [503] * 10})
+
+    with pytest.raises(cnr_utils.RetryablePageError):
+        fetch_from(registry, monkeypatch, max_page_retries=2)
+
+    assert registry.requests.count(2) == 3
+
+
+def test_client_error_is_not_retried(monkeypatch):
+    registry = MockRegistry(make_nodes(6), page_size=2, failures={2: [404]})
+
+    with pytest.raises(Exception):
+        fetch_from(registry, monkeypatch)
+
+    assert registry.requests.count(2) == 1
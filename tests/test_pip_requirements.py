@@ -0,0 +1,105 @@
+"""
+Parsing of `requirements.txt` into pip install batches.
+"""
+
+import sys
+
+import pytest
+
+import cm_global
+import manager_util
+
+
+@pytest.fixture(autouse=True)
+def plain_pip(monkeypatch):
+    monkeypatch.setattr(manager_util, 'use_uv', False)
+    monkeypatch.setattr(manager_util, 'use_pip_constraints', False)
+    monkeypatch.setattr(manager_util, 'pip_wheelhouse', None)
+
+
+def pip_args(cmd):
+    assert cmd[:3] == [sys.executable, '-m', 'pip']
+    return cmd[3:]
+
+
+def test_marker_line_is_one_argument():
+    batches = manager_util.parse_requirements(['torch; sys_platform != "darwin"'])
+    assert batches == [((), ['torch; sys_platform != "darwin"'])]
+
+    options, specs = batches[0]
+    assert pip_args(manager_util.make_pip_install_cmd(specs, options)) == ['install', 'torch; sys_platform != "darwin"']
+
+
+def test_comma_separated_specifiers_are_one_argument():
+    batches = manager_util.parse_requirements(['numpy>=1.2, <2', 'scipy'])
+    assert batches == [((), ['numpy>=1.2, <2', 'scipy'])]
+
+    options, specs = batches[0]
+    assert pip_args(manager_util.make_pip_install_cmd(specs, options)) == ['install', 'numpy>=1.2, <2', 'scipy']
+
+
+def test_index_options_are_split():
+    lines = [
+        '# comment',
+        '--extra-index-url https://extra.example/simple',
+        'torch>=2.0; sys_platform != "darwin" --index-url https://torch.example/cu121',
+        'pillow  # trailing comment',
+    ]
+    batches = manager_util.parse_requirements(lines)
+    assert batches == [
+        (('--extra-index-url', 'https://extra.example/simple', '--index-url', 'https://torch.example/cu121'),
+         ['torch>=2.0; sys_platform != "darwin"']),
+        (('--extra-index-url', 'https://extra.example/simple'), ['pillow']),
+    ]
+
+    options, specs = batches[0]
+    assert pip_args(manager_util.make_pip_install_cmd(specs, options)) == \
+        ['install', 'torch>=2.0; sys_platform != "darwin"',
+         '--extra-index-url', 'https://extra.example/simple', '--index-url', 'https://torch.example/cu121']
+
+
+def test_failed_batch_retries_each_requirement_as_one_argument():
+    calls = []
+
+    def run(cmd):
+        calls.append(pip_args(cmd))
+        return len(calls) > 1 and 'broken' not in cmd
+
+    batches = manager_util.parse_requirements(['numpy>=1.2, <2', 'broken', 'torch; sys_platform != "darwin"'])
+    assert not manager_util.install_requirements(batches, run)
+    assert calls == [
+        ['install', 'numpy>=1.2, <2', 'broken', 'torch; sys_platform != "darwin"'],
+        ['install', 'numpy>=1.2, <2'],
+        ['install', 'broken'],
+        ['install', 'torch; sys_platform != "darwin"'],
+    ]
+
+
+def test_prefetch_passes_each_requirement_as_one_argument(monkeypatch, tmp_path):
+    calls = []
+
+    class Result:
+        returncode = 0
+
+    monkeypatch.setattr(manager_util.subprocess, 'run', lambda cmd, **kwargs: calls.append(pip_args(cmd)) or Result())
+
+    batches = manager_util.parse_requirements(['numpy>=1.2, <2', 'torch; sys_platform != "darwin"'])
+    assert manager_util.prefetch_wheels(batches, str(tmp_path))
+    assert calls == [['download', '--quiet', '-d', str(tmp_path), 'numpy>=1.2, <2', 'torch; sys_platform != "darwin"']]
+
+
+def test_constraints_are_written_only_by_refresh(monkeypatch, tmp_path):
+    monkeypatch.setattr(manager_util, 'use_pip_constraints', True)
+    monkeypatch.setattr(manager_util, 'pip_constraints_path', None)
+    monkeypatch.setattr(manager_util, 'pip_constraints', {})
+    monkeypatch.setattr(manager_util, 'get_installed_packages', lambda *args, **kwargs: {'torch': '2.5.1', 'numpy': '1.26.4'})
+    monkeypatch.setattr(cm_global, 'pip_downgrade_blacklist', [], raising=False)
+
+    manager_util.PIPFixer(manager_util.get_installed_packages(), None, str(tmp_path))
+    assert manager_util.pip_constraints_path is None
+    assert not (tmp_path / 'pip_constraints.txt').exists()
+
+    manager_util.refresh_pip_constraints(str(tmp_path))
+    assert manager_util.pip_constraints_path == str(tmp_path / 'pip_constraints.txt')
+    assert manager_util.pip_constraints == {'torch': ['torch==2.5.1'], 'numpy': ['numpy<2']}
+    assert pip_args(manager_util.make_pip_install_cmd(['scipy'])) == ['install', 'scipy', '-c', str(tmp_path / 'pip_constraints.txt')]
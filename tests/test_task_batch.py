@@ -0,0 +1,59 @@
+"""
+Deduplication of the operations of a queued batch.
+"""
+
+import task_batch
+
+
+def install(pack, version='latest'):
+    return 'install', (f'ui-{pack}', f'{pack}@{version}', None, None, False)
+
+
+def uninstall(pack):
+    return 'uninstall', (f'ui-{pack}', pack, False)
+
+
+def update(pack):
+    return 'update', (f'ui-{pack}', pack, 'nightly')
+
+
+def enable(pack):
+    return 'enable', (f'ui-{pack}', pack)
+
+
+def installed(*packs):
+    return lambda target: target in packs
+
+
+def test_duplicated_operation_keeps_the_later_one():
+    tasks, dropped = task_batch.dedupe_tasks([install('a', '1.0'), install('b'), install('a', '2.0')], installed())
+    assert tasks == [install('b'), install('a', '2.0')]
+    assert dropped == [install('a', '1.0')]
+
+
+def test_install_then_uninstall_of_a_pack_which_isnt_installed_drops_both():
+    tasks, dropped = task_batch.dedupe_tasks([install('a'), uninstall('a'), install('b')], installed())
+    assert tasks == [install('b')]
+    assert dropped == [install('a'), uninstall('a')]
+
+
+def test_install_then_uninstall_of_an_installed_pack_keeps_the_uninstall():
+    tasks, dropped = task_batch.dedupe_tasks([install('a', '2.0'), uninstall('a')], installed('a'))
+    assert tasks == [uninstall('a')]
+    assert dropped == [install('a', '2.0')]
+
+
+def test_uninstall_after_other_operations_is_kept():
+    tasks, dropped = task_batch.dedupe_tasks([update('a'), uninstall('a')], installed())
+    assert tasks == [uninstall('a')]
+    assert dropped == [update('a')]
+
+    tasks, dropped = task_batch.dedupe_tasks([enable('a'), install('a'), uninstall('a')], installed())
+    assert tasks == [uninstall('a')]
+    assert dropped == [enable('a'), install('a')]
+
+
+def test_reinstall_is_kept():
+    tasks, dropped = task_batch.dedupe_tasks([uninstall('a'), install('a')], installed('a'))
+    assert tasks == [uninstall('a'), install('a')]
+    assert dropped == []
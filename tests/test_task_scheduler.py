@@ -0,0 +1,88 @@
+"""
+Cancellation of running tasks in the task scheduler.
+"""
+
+import asyncio
+import threading
+import time
+
+import manager_util
+import task_scheduler
+
+
+def test_cancelled_task_keeps_its_key_until_the_thread_returns():
+    events = []
+    step_started = threading.Event()
+    release_step = threading.Event()
+
+    def step():
+        step_started.set()
+        release_step.wait(5)
+        events.append('step finished')
+
+    async def execute(task):
+        if task.kind == 'install':
+            await asyncio.to_thread(step)
+        else:
+            events.append('uninstall started')
+
+    install = task_scheduler.Task('install', ('pack',), key='pack')
+    uninstall = task_scheduler.Task('uninstall', ('pack',), key='pack')
+    queue = [install, uninstall]
+
+    def fetch():
+        res = list(queue)
+        queue.clear()
+        return res
+
+    scheduler = task_scheduler.TaskScheduler(fetch, execute, workers=2)
+    runner = threading.Thread(target=scheduler.run)
+    runner.start()
+
+    assert step_started.wait(5)
+    install.context.cancel()
+
+    # the coroutine of the install is cancelled, but its thread still runs
+    time.sleep(0.3)
+    assert events == []
+
+    release_step.set()
+    runner.join(5)
+    assert not runner.is_alive()
+    assert events == ['step finished', 'uninstall started']
+
+
+def test_cancelled_step_stops_at_the_next_check():
+    checks = []
+
+    def step():
+        for _ in range(50):
+            try:
+                manager_util.check_cancelled()
+            except manager_util.TaskCancelled:
+                checks.append('cancelled')
+                raise
+            time.sleep(0.05)
+        checks.append('completed')
+
+    async def execute(task):
+        await asyncio.to_thread(step)
+
+    task = task_scheduler.Task('fix', ('pack',), key='pack')
+    queue = [task]
+
+    def fetch():
+        res = list(queue)
+        queue.clear()
+        return res
+
+    scheduler = task_scheduler.TaskScheduler(fetch, execute, workers=1)
+    runner = threading.Thread(target=scheduler.run)
+    runner.start()
+
+    time.sleep(0.2)
+    task.context.cancel()
+    runner.join(5)
+
+    assert not runner.is_alive()
+    assert checks == ['cancelled']